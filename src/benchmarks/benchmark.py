@@ -0,0 +1,216 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.benchmarks.songgenerator import SongSpec, write_song
+from src.loading.serialization import (
+    MidiSerializer,
+    Music21Serializer,
+    PyGuitarProSerializer,
+)
+from src.transforming.convertor import CONVERTOR_VERSION
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+
+ENGINES = ("music21", "music21_fast", "midi")
+STAGES = ("parse", "convert", "serialize")
+DEFAULT_REPEAT = 3
+# A stage is reported as a regression when it gets this much slower
+DEFAULT_TOLERANCE = 0.25
+
+BENCHMARK_SPECS = {
+    "small": SongSpec(n_tracks=1, n_measures=16),
+    "medium": SongSpec(n_tracks=4, n_measures=64, n_voices=2, notes_per_beat=2),
+    "large": SongSpec(n_tracks=8, n_measures=256, beats_per_measure=16),
+    "ties_and_tuplets": SongSpec(
+        n_tracks=2, n_measures=64, notes_per_beat=3, tie_density=0.5, tuplet_density=0.3
+    ),
+    "tempo_and_meter": SongSpec(
+        n_tracks=2, n_measures=128, n_tempo_changes=32, n_time_signature_changes=32
+    ),
+}
+
+
+def _run_pipeline(gp_path: Path, output_path: Path, engine: str) -> Dict[str, float]:
+    """Parses, converts and serializes one file, returning the stage timings."""
+    timings = {}
+    start = time.perf_counter()
+    gp_stream = PyGuitarProSerializer().load(gp_path)
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if engine == "midi":
+        converted_stream = GuitarProToMidiConvertor(gp_stream).apply()
+        serializer = MidiSerializer()
+    else:
+        converted_stream = GuitarProToMusic21Convertor(gp_stream).apply()
+        midi_backend = "fast" if engine == "music21_fast" else "music21"
+        serializer = Music21Serializer("midi", midi_backend=midi_backend)
+    timings["convert"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    serializer.dump(converted_stream, output_path)
+    timings["serialize"] = time.perf_counter() - start
+    return timings
+
+
+def _peak_memory(function: Callable[[], object]) -> int:
+    """Returns the peak memory in bytes allocated by Python while running function."""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return peak - baseline
+
+
+def run_benchmark(
+    name: str,
+    spec: SongSpec,
+    folder: Path,
+    engine: str = "music21",
+    repeat: int = DEFAULT_REPEAT,
+) -> dict:
+    """Benchmarks the pipeline on the song described by spec.
+
+    Timings are the median of repeat runs. Peak memory comes from an extra
+    run, as tracing allocations slows everything down.
+    """
+    gp_path = write_song(spec, folder / f"{name}.gp5")
+    output_path = folder / f"{name}.{engine}.mid"
+    runs = [_run_pipeline(gp_path, output_path, engine) for _ in range(repeat)]
+    peak_memory = _peak_memory(lambda: _run_pipeline(gp_path, output_path, engine))
+    return {
+        "name": name,
+        "engine": engine,
+        "spec": spec._asdict(),
+        "file_size": gp_path.stat().st_size,
+        "repeat": repeat,
+        "timings": {
+            stage: statistics.median(run[stage] for run in runs) for stage in STAGES
+        },
+        "total": statistics.median(sum(run.values()) for run in runs),
+        "peak_memory": peak_memory,
+    }
+
+
+def run_suite(
+    specs: Dict[str, SongSpec],
+    engines: List[str] = ENGINES,
+    repeat: int = DEFAULT_REPEAT,
+) -> dict:
+    """Runs every benchmark with every engine and returns the report."""
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for name, spec in specs.items():
+            for engine in engines:
+                results.append(run_benchmark(name, spec, Path(folder), engine, repeat))
+    return {
+        "convertor_version": CONVERTOR_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare_to_baseline(
+    report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE
+) -> List[dict]:
+    """Returns the stages and peak memories that grew by more than tolerance.
+
+    Benchmarks missing from the baseline are skipped.
+    """
+    baseline_results = {
+        (result["name"], result["engine"]): result for result in baseline["results"]
+    }
+    regressions = []
+    for result in report["results"]:
+        baseline_result = baseline_results.get((result["name"], result["engine"]))
+        if baseline_result is None:
+            continue
+        measures = [
+            (stage, result["timings"][stage], baseline_result["timings"][stage])
+            for stage in STAGES
+        ]
+        measures.append(
+            ("peak_memory", result["peak_memory"], baseline_result["peak_memory"])
+        )
+        for measure, value, baseline_value in measures:
+            if baseline_value > 0 and value > baseline_value * (1 + tolerance):
+                regressions.append(
+                    {
+                        "name": result["name"],
+                        "engine": result["engine"],
+                        "measure": measure,
+                        "value": value,
+                        "baseline": baseline_value,
+                        "ratio": value / baseline_value,
+                    }
+                )
+    return regressions
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the conversion pipeline on synthetic songs."
+    )
+    parser.add_argument("-o", "--output", type=Path, default=Path("benchmark.json"))
+    parser.add_argument(
+        "-b",
+        "--benchmarks",
+        nargs="+",
+        default=list(BENCHMARK_SPECS),
+        choices=BENCHMARK_SPECS,
+    )
+    parser.add_argument(
+        "-e", "--engines", nargs="+", default=list(ENGINES), choices=ENGINES
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="Report regressions against it"
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parsed_args = parser.parse_args(args)
+
+    specs = {name: BENCHMARK_SPECS[name] for name in parsed_args.benchmarks}
+    report = run_suite(specs, parsed_args.engines, parsed_args.repeat)
+    with open(parsed_args.output, "w") as fp:
+        json.dump(report, fp, indent=2)
+    for result in report["results"]:
+        timings = ", ".join(
+            f"{stage} {result['timings'][stage]:.3f}s" for stage in STAGES
+        )
+        print(
+            f"{result['name']} [{result['engine']}]: {timings}, "
+            f"peak {result['peak_memory'] / 2**20:.1f} MiB"
+        )
+
+    if parsed_args.baseline is None:
+        return 0
+    with open(parsed_args.baseline) as fp:
+        baseline = json.load(fp)
+    regressions = compare_to_baseline(report, baseline, parsed_args.tolerance)
+    for regression in regressions:
+        print(
+            f"Regression in {regression['name']} [{regression['engine']}] "
+            f"{regression['measure']}: {regression['ratio']:.2f}x the baseline"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import random
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+import guitarpro as gm
+
+from src.loading.serialization import PyGuitarProSerializer
+
+QUARTER_TIME_IN_TICKS = 960
+# Time signatures used, in turn, by songs with time signature changes
+TIME_SIGNATURES = ((4, 4), (3, 4), (7, 8), (5, 4), (6, 8), (2, 4))
+TEMPOS = (120, 90, 140, 100, 160, 75)
+STANDARD_TUNING = (64, 59, 55, 50, 45, 40)
+
+
+class SongSpec(NamedTuple):
+    """Size and features of a synthetic song."""
+
+    n_tracks: int = 2
+    n_measures: int = 32
+    n_voices: int = 1
+    beats_per_measure: int = 8
+    notes_per_beat: int = 1
+    # Probability for a note to be tied to the previous note of its string
+    tie_density: float = 0.1
+    # Probability for a beat to be split into a triplet
+    tuplet_density: float = 0.0
+    n_tempo_changes: int = 0
+    n_time_signature_changes: int = 0
+    seed: int = 0
+
+
+class SongGenerator:
+    """Builds PyGuitarPro songs of a given size, reproducible from a seed.
+
+    Every measure is filled exactly: beats are the largest power of two
+    subdivision of the time signature giving at least beats_per_measure
+    beats, and a triplet replaces a beat by three beats of half its length.
+    """
+
+    def __init__(self, spec: SongSpec) -> None:
+        self.spec = spec
+        self._random = random.Random(spec.seed)
+
+    def generate(self) -> gm.models.Song:
+        spec = self.spec
+        gp_stream = gm.models.Song(
+            title=f"Synthetic song {spec.seed}",
+            artist="SongGenerator",
+            tempo=TEMPOS[0],
+        )
+        gp_stream.measureHeaders = self._create_measure_headers()
+        gp_stream.tracks = [
+            self._create_track(gp_stream, idx_track)
+            for idx_track in range(spec.n_tracks)
+        ]
+        self._add_tempo_changes(gp_stream)
+        return gp_stream
+
+    def _spread(self, n_changes: int) -> List[int]:
+        """Returns the indexes of n_changes measures spread over the song."""
+        n_measures = self.spec.n_measures
+        n_changes = min(n_changes, n_measures - 1)
+        return [
+            (idx_change + 1) * n_measures // (n_changes + 1)
+            for idx_change in range(n_changes)
+        ]
+
+    def _create_measure_headers(self) -> List[gm.models.MeasureHeader]:
+        time_signature_changes = self._spread(self.spec.n_time_signature_changes)
+        idx_time_signature = 0
+        start = QUARTER_TIME_IN_TICKS
+        measure_headers = []
+        for idx_measure in range(self.spec.n_measures):
+            if idx_measure in time_signature_changes:
+                idx_time_signature = (idx_time_signature + 1) % len(TIME_SIGNATURES)
+            numerator, denominator = TIME_SIGNATURES[idx_time_signature]
+            header = gm.models.MeasureHeader(
+                number=idx_measure + 1,
+                start=start,
+                timeSignature=gm.models.TimeSignature(
+                    numerator, gm.models.Duration(denominator)
+                ),
+            )
+            measure_headers.append(header)
+            start += header.length
+        return measure_headers
+
+    def _create_track(
+        self, gp_stream: gm.models.Song, idx_track: int
+    ) -> gm.models.Track:
+        channel = idx_track if idx_track < 9 else idx_track + 1
+        track = gm.models.Track(
+            gp_stream,
+            number=idx_track + 1,
+            name=f"Track {idx_track + 1}",
+            strings=[
+                gm.models.GuitarString(number, value)
+                for number, value in enumerate(STANDARD_TUNING, start=1)
+            ],
+            channel=gm.models.MidiChannel(
+                channel=channel % 16, effectChannel=channel % 16, instrument=25
+            ),
+        )
+        track.measures = [
+            gm.models.Measure(track, header) for header in gp_stream.measureHeaders
+        ]
+        # Last fret played on each (voice, string), to tie notes to it
+        last_frets: Dict[Tuple[int, int], int] = {}
+        for gp_measure in track.measures:
+            for idx_voice in range(self.spec.n_voices):
+                self._fill_voice(gp_measure.voices[idx_voice], idx_voice, last_frets)
+        return track
+
+    def _beat_durations(
+        self, header: gm.models.MeasureHeader
+    ) -> List[gm.models.Duration]:
+        numerator = header.timeSignature.numerator
+        value = header.timeSignature.denominator.value
+        n_beats = numerator
+        while n_beats < self.spec.beats_per_measure and value < 32:
+            n_beats *= 2
+            value *= 2
+        durations = []
+        for _ in range(n_beats):
+            if value < 64 and self._random.random() < self.spec.tuplet_density:
+                triplet = gm.models.Tuplet(enters=3, times=2)
+                durations.extend(
+                    gm.models.Duration(value * 2, tuplet=triplet) for _ in range(3)
+                )
+            else:
+                durations.append(gm.models.Duration(value))
+        return durations
+
+    def _fill_voice(
+        self,
+        gp_voice: gm.models.Voice,
+        idx_voice: int,
+        last_frets: Dict[Tuple[int, int], int],
+    ) -> None:
+        header = gp_voice.measure.header
+        # Voices play on separate strings so their ties stay apart
+        strings = [
+            string
+            for string in range(1, len(STANDARD_TUNING) + 1)
+            if (string - 1) % self.spec.n_voices == idx_voice
+        ]
+        start = header.start
+        for duration in self._beat_durations(header):
+            gp_beat = gm.models.Beat(
+                gp_voice,
+                duration=duration,
+                start=start,
+                status=gm.models.BeatStatus.normal,
+            )
+            n_notes = min(self.spec.notes_per_beat, len(strings))
+            for string in sorted(self._random.sample(strings, n_notes)):
+                key = (idx_voice, string)
+                if key in last_frets and self._random.random() < self.spec.tie_density:
+                    note_type = gm.models.NoteType.tie
+                    fret = last_frets[key]
+                else:
+                    note_type = gm.models.NoteType.normal
+                    fret = self._random.randrange(0, 13)
+                    last_frets[key] = fret
+                gp_beat.notes.append(
+                    gm.models.Note(
+                        gp_beat,
+                        value=fret,
+                        string=string,
+                        velocity=self._random.choice((79, 95, 111)),
+                        type=note_type,
+                    )
+                )
+            gp_voice.beats.append(gp_beat)
+            start += duration.time
+
+    def _add_tempo_changes(self, gp_stream: gm.models.Song) -> None:
+        if not gp_stream.tracks:
+            return
+        first_track = gp_stream.tracks[0]
+        for idx_change, idx_measure in enumerate(
+            self._spread(self.spec.n_tempo_changes)
+        ):
+            gp_beat = first_track.measures[idx_measure].voices[0].beats[0]
+            gp_beat.effect.mixTableChange = gm.models.MixTableChange(
+                tempo=gm.models.MixTableItem(
+                    value=TEMPOS[(idx_change + 1) % len(TEMPOS)]
+                ),
+                hideTempo=False,
+            )
+
+
+def generate_song(spec: SongSpec) -> gm.models.Song:
+    return SongGenerator(spec).generate()
+
+
+def write_song(spec: SongSpec, save_path: Path) -> Path:
+    """Generates a song and saves it as a GuitarPro file."""
+    PyGuitarProSerializer().dump(generate_song(spec), save_path)
+    return save_path
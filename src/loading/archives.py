@@ -0,0 +1,84 @@
+import io
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+# Tar compression picked from the suffix of the archive written
+TAR_MODES = {
+    ".tar": "w",
+    ".tgz": "w:gz",
+    ".gz": "w:gz",
+    ".bz2": "w:bz2",
+    ".xz": "w:xz",
+}
+
+
+def is_archive(path: Path) -> bool:
+    path = Path(path)
+    return path.is_file() and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def iter_archive(
+    path: Path, extensions: Optional[Sequence[str]] = None
+) -> Iterator[Tuple[str, bytes]]:
+    """Yields the name and contents of the files of a zip or tar archive.
+
+    Members are read one at a time, in archive order, so only one is held
+    in memory. With extensions, only the members ending with one of them
+    are read.
+    """
+
+    def is_wanted(name: str) -> bool:
+        return extensions is None or name.lower().endswith(tuple(extensions))
+
+    path = Path(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_wanted(info.filename):
+                    yield info.filename, archive.read(info)
+        return
+    with tarfile.open(path, "r:*") as archive:
+        for info in archive:
+            if info.isfile() and is_wanted(info.name):
+                yield info.name, archive.extractfile(info).read()
+
+
+class ArchiveWriter:
+    """Writes files from memory into a zip or tar archive.
+
+    The kind of archive comes from the suffix of path: .zip, or .tar,
+    optionally compressed as .tar.gz, .tgz, .tar.bz2 or .tar.xz.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        suffix = self.path.suffix.lower()
+        if suffix == ".zip":
+            self._archive: Union[zipfile.ZipFile, tarfile.TarFile] = zipfile.ZipFile(
+                self.path, "w", compression=zipfile.ZIP_DEFLATED
+            )
+        elif suffix in TAR_MODES:
+            self._archive = tarfile.open(self.path, TAR_MODES[suffix])
+        else:
+            raise ValueError(f"Unsupported archive: {self.path}")
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, name: str, data: bytes) -> None:
+        if isinstance(self._archive, zipfile.ZipFile):
+            self._archive.writestr(name, data)
+            return
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        self._archive.close()
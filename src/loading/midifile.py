@@ -0,0 +1,279 @@
+import struct
+from typing import BinaryIO, List, NamedTuple, Tuple
+
+QUARTER_TIME_IN_TICKS = 960
+DEFAULT_PERCUSSION_CHANNEL = 9
+
+# Events sharing a tick are written in this order, so that a note ending
+# on a tick is released before a note starting on the same tick. Pitch
+# bends come in between, to bend the starting note and not the ending one.
+META_PRIORITY = 0
+PROGRAM_PRIORITY = 1
+NOTE_OFF_PRIORITY = 2
+PITCH_BEND_PRIORITY = 3
+NOTE_ON_PRIORITY = 4
+
+END_OF_TRACK = b"\xff\x2f\x00"
+
+
+class MidiEvent(NamedTuple):
+    """A raw MIDI event placed at an absolute tick.
+
+    Events are sorted by tick, priority and order, then by insertion.
+    """
+
+    tick: int
+    priority: int
+    data: bytes
+    order: int = 0
+
+
+class MidiNote(NamedTuple):
+    """A note rebuilt from a pair of note on/off events."""
+
+    start: int
+    duration: int
+    pitch: int
+    velocity: int
+    channel: int
+
+
+def encode_variable_length(value: int) -> bytes:
+    """Encodes a non negative integer as a MIDI variable length quantity."""
+    buffer = [value & 0x7F]
+    value >>= 7
+    while value:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(buffer))
+
+
+def _meta_event(meta_type: int, payload: bytes) -> bytes:
+    return bytes([0xFF, meta_type]) + encode_variable_length(len(payload)) + payload
+
+
+class MidiTrack:
+    """Holds the events of a single MIDI track chunk."""
+
+    def __init__(self) -> None:
+        self.events: List[MidiEvent] = []
+        # Ticks between the last event and the end of track
+        self.end_delay = 0
+
+    def add_event(self, tick: int, priority: int, data: bytes, order: int = 0) -> None:
+        self.events.append(MidiEvent(int(tick), priority, data, order))
+
+    def add_track_name(
+        self, name: str, encoding: str = "latin-1", errors: str = "replace"
+    ) -> None:
+        payload = name.encode(encoding, errors=errors)
+        self.add_event(0, META_PRIORITY, _meta_event(0x03, payload))
+
+    def add_tempo(self, tick: int, bpm: float) -> None:
+        microseconds_per_quarter = int(round(60_000_000 / bpm))
+        payload = microseconds_per_quarter.to_bytes(3, "big")
+        self.add_event(tick, META_PRIORITY, _meta_event(0x51, payload))
+
+    def add_time_signature(self, tick: int, numerator: int, denominator: int) -> None:
+        # MIDI stores the denominator as a power of two
+        denominator_power = max(denominator.bit_length() - 1, 0)
+        payload = bytes([numerator, denominator_power, 24, 8])
+        self.add_event(tick, META_PRIORITY, _meta_event(0x58, payload))
+
+    def add_program_change(self, tick: int, channel: int, program: int) -> None:
+        self.add_event(tick, PROGRAM_PRIORITY, bytes([0xC0 | channel, program & 0x7F]))
+
+    def add_controller(
+        self, tick: int, channel: int, controller: int, value: int
+    ) -> None:
+        data = bytes([0xB0 | channel, controller & 0x7F, value & 0x7F])
+        self.add_event(tick, PROGRAM_PRIORITY, data)
+
+    def add_bend_range(self, tick: int, channel: int, semitones: int) -> None:
+        """Sets the pitch bend range of the channel with RPN 0."""
+        for controller, value in ((101, 0), (100, 0), (6, semitones), (38, 0)):
+            self.add_controller(tick, channel, controller, value)
+
+    def add_pitch_bend(self, tick: int, channel: int, value: int) -> None:
+        """Adds a pitch bend, value going from 0 to 16383 with 8192 at center."""
+        value = min(max(int(value), 0), 16383)
+        data = bytes([0xE0 | channel, value & 0x7F, value >> 7])
+        self.add_event(tick, PITCH_BEND_PRIORITY, data)
+
+    def add_note(
+        self, start: int, duration: int, pitch: int, velocity: int, channel: int
+    ) -> None:
+        self.add_note_on(start, pitch, velocity, channel)
+        self.add_note_off(start + max(int(duration), 0), pitch, channel)
+
+    def add_note_on(
+        self, tick: int, pitch: int, velocity: int, channel: int, order: int = 0
+    ) -> None:
+        pitch = min(max(int(pitch), 0), 127)
+        velocity = min(max(int(velocity), 1), 127)
+        data = bytes([0x90 | channel, pitch, velocity])
+        self.add_event(tick, NOTE_ON_PRIORITY, data, order)
+
+    def add_note_off(self, tick: int, pitch: int, channel: int, order: int = 0) -> None:
+        pitch = min(max(int(pitch), 0), 127)
+        data = bytes([0x80 | channel, pitch, 0])
+        self.add_event(tick, NOTE_OFF_PRIORITY, data, order)
+
+    def sorted_events(self) -> List[MidiEvent]:
+        return sorted(
+            self.events, key=lambda event: (event.tick, event.priority, event.order)
+        )
+
+    def to_bytes(self) -> bytes:
+        """Returns the track chunk, header included."""
+        chunk = bytearray()
+        last_tick = 0
+        for event in self.sorted_events():
+            chunk += encode_variable_length(event.tick - last_tick)
+            chunk += event.data
+            last_tick = event.tick
+        chunk += encode_variable_length(self.end_delay) + END_OF_TRACK
+        return b"MTrk" + struct.pack(">I", len(chunk)) + bytes(chunk)
+
+    def notes(self) -> List[MidiNote]:
+        """Pairs note on/off events and returns the notes sorted by start."""
+        pending = {}
+        notes = []
+        for tick, _, data, _ in self.sorted_events():
+            status = data[0] & 0xF0
+            if status not in (0x80, 0x90):
+                continue
+            channel = data[0] & 0x0F
+            pitch, velocity = data[1], data[2]
+            key = (channel, pitch)
+            if status == 0x90 and velocity > 0:
+                pending.setdefault(key, []).append((tick, velocity))
+            elif pending.get(key):
+                start, start_velocity = pending[key].pop(0)
+                notes.append(
+                    MidiNote(start, tick - start, pitch, start_velocity, channel)
+                )
+        notes.sort()
+        return notes
+
+    def pitch_bends(self) -> List[Tuple[int, int, int]]:
+        """Returns (tick, channel, value) of the pitch bend events."""
+        return [
+            (tick, data[0] & 0x0F, data[1] | data[2] << 7)
+            for tick, _, data, _ in self.sorted_events()
+            if data[0] & 0xF0 == 0xE0
+        ]
+
+    def tempos(self) -> List[Tuple[int, float]]:
+        """Returns (tick, bpm) pairs of the tempo events of the track."""
+        return [
+            (tick, 60_000_000 / int.from_bytes(data[3:6], "big"))
+            for tick, _, data, _ in self.sorted_events()
+            if data[:2] == b"\xff\x51"
+        ]
+
+    def time_signatures(self) -> List[Tuple[int, int, int]]:
+        """Returns (tick, numerator, denominator) of the time signature events."""
+        return [
+            (tick, data[3], 2 ** data[4])
+            for tick, _, data, _ in self.sorted_events()
+            if data[:2] == b"\xff\x58"
+        ]
+
+
+class MidiFile:
+    """A format 1 Standard MIDI File made of MidiTracks."""
+
+    def __init__(self, ticks_per_quarter: int = QUARTER_TIME_IN_TICKS) -> None:
+        self.ticks_per_quarter = ticks_per_quarter
+        self.tracks: List[MidiTrack] = []
+
+    def add_track(self) -> MidiTrack:
+        track = MidiTrack()
+        self.tracks.append(track)
+        return track
+
+    def to_bytes(self) -> bytes:
+        header = struct.pack(">HHH", 1, len(self.tracks), self.ticks_per_quarter)
+        chunks = [b"MThd", struct.pack(">I", len(header)), header]
+        chunks.extend(track.to_bytes() for track in self.tracks)
+        return b"".join(chunks)
+
+    def write(self, fp: BinaryIO) -> None:
+        fp.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MidiFile":
+        if data[:4] != b"MThd":
+            raise ValueError("Not a Standard MIDI File")
+        header_length = struct.unpack(">I", data[4:8])[0]
+        _, n_tracks, division = struct.unpack(">HHH", data[8:14])
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        midi_file = cls(ticks_per_quarter=division)
+        position = 8 + header_length
+        while position < len(data) and len(midi_file.tracks) < n_tracks:
+            chunk_type = data[position : position + 4]
+            chunk_length = struct.unpack(">I", data[position + 4 : position + 8])[0]
+            chunk = data[position + 8 : position + 8 + chunk_length]
+            position += 8 + chunk_length
+            if chunk_type == b"MTrk":
+                midi_file.tracks.append(_parse_track_chunk(chunk))
+        return midi_file
+
+    @classmethod
+    def read(cls, fp: BinaryIO) -> "MidiFile":
+        return cls.from_bytes(fp.read())
+
+
+def _read_variable_length(chunk: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    while True:
+        byte = chunk[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, position
+
+
+def _parse_track_chunk(chunk: bytes) -> MidiTrack:
+    track = MidiTrack()
+    position = 0
+    tick = 0
+    running_status = 0
+    while position < len(chunk):
+        delta, position = _read_variable_length(chunk, position)
+        tick += delta
+        status = chunk[position]
+        if status == 0xFF:
+            meta_type = chunk[position + 1]
+            length, data_start = _read_variable_length(chunk, position + 2)
+            data = chunk[position : data_start + length]
+            position = data_start + length
+            if meta_type == 0x2F:
+                break
+            track.add_event(tick, META_PRIORITY, data)
+            continue
+        if status in (0xF0, 0xF7):
+            length, data_start = _read_variable_length(chunk, position + 1)
+            position = data_start + length
+            continue
+        if status & 0x80:
+            running_status = status
+            position += 1
+        else:
+            status = running_status
+        n_data_bytes = 1 if status & 0xF0 in (0xC0, 0xD0) else 2
+        data = bytes([status]) + chunk[position : position + n_data_bytes]
+        position += n_data_bytes
+        kind = status & 0xF0
+        if kind == 0x90 and data[2] > 0:
+            priority = NOTE_ON_PRIORITY
+        elif kind in (0x80, 0x90):
+            priority = NOTE_OFF_PRIORITY
+        elif kind == 0xE0:
+            priority = PITCH_BEND_PRIORITY
+        else:
+            priority = PROGRAM_PRIORITY
+        track.add_event(tick, priority, data)
+    return track
@@ -0,0 +1,145 @@
+import heapq
+import struct
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+from src.loading.midifile import (
+    END_OF_TRACK,
+    QUARTER_TIME_IN_TICKS,
+    MidiTrack,
+    encode_variable_length,
+)
+
+
+class StreamingMidiTrack(MidiTrack):
+    """A MidiTrack that writes its events as soon as they are final.
+
+    Events wait in a heap until flush(until_tick) declares that no event
+    will be added before until_tick; they are then encoded and passed to
+    write, so memory only holds the events that are not final yet.
+    """
+
+    def __init__(self, write: Callable[[bytes], None]) -> None:
+        super().__init__()
+        self._write = write
+        self._heap: List[Tuple[int, int, int, int, bytes]] = []
+        self._n_events = 0
+        self._last_tick = 0
+        self._flushed_until = 0
+
+    def add_event(self, tick: int, priority: int, data: bytes, order: int = 0) -> None:
+        tick = int(tick)
+        if tick < self._flushed_until:
+            raise ValueError(
+                f"Event at tick {tick} added after flushing until {self._flushed_until}"
+            )
+        heapq.heappush(self._heap, (tick, priority, order, self._n_events, data))
+        self._n_events += 1
+
+    def flush(self, until_tick: Optional[int] = None) -> None:
+        """Writes every pending event placed before until_tick, or all of them."""
+        chunk = bytearray()
+        while self._heap and (until_tick is None or self._heap[0][0] < until_tick):
+            tick, _, _, _, data = heapq.heappop(self._heap)
+            chunk += encode_variable_length(tick - self._last_tick)
+            chunk += data
+            self._last_tick = tick
+        if until_tick is not None:
+            self._flushed_until = max(self._flushed_until, until_tick)
+        if chunk:
+            self._write(bytes(chunk))
+
+    def close(self) -> None:
+        self.flush()
+        self._write(b"\x00" + END_OF_TRACK)
+
+
+class StreamingMidiWriter:
+    """Writes a format 1 MIDI file to a file-like object one track at a time.
+
+    On a seekable file, track chunks are written as their events become
+    final and the chunk lengths, and the number of tracks, are patched when
+    the track ends. Otherwise each chunk is buffered until its track ends,
+    and n_tracks must be given up front.
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        ticks_per_quarter: int = QUARTER_TIME_IN_TICKS,
+        n_tracks: Optional[int] = None,
+    ) -> None:
+        self.fp = fp
+        self.n_tracks = n_tracks
+        self.n_written_tracks = 0
+        self._seekable = _is_seekable(fp)
+        if not self._seekable and n_tracks is None:
+            raise ValueError("n_tracks is needed to write to a non seekable file")
+        self._header_position = fp.tell() if self._seekable else None
+        header = struct.pack(">HHH", 1, n_tracks or 0, ticks_per_quarter)
+        fp.write(b"MThd" + struct.pack(">I", len(header)) + header)
+        self._track: Optional[StreamingMidiTrack] = None
+        self._chunk_length = 0
+        self._chunk_position = 0
+        self._buffer = bytearray()
+
+    def __enter__(self) -> "StreamingMidiWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+
+    def begin_track(self) -> StreamingMidiTrack:
+        if self._track is not None:
+            raise RuntimeError("The previous track has not ended")
+        self._chunk_length = 0
+        if self._seekable:
+            self._chunk_position = self.fp.tell()
+            self.fp.write(b"MTrk\x00\x00\x00\x00")
+        else:
+            self._buffer = bytearray()
+        self._track = StreamingMidiTrack(self._write_chunk_data)
+        return self._track
+
+    def _write_chunk_data(self, data: bytes) -> None:
+        self._chunk_length += len(data)
+        if self._seekable:
+            self.fp.write(data)
+        else:
+            self._buffer += data
+
+    def end_track(self) -> None:
+        self._track.close()
+        self._track = None
+        length = struct.pack(">I", self._chunk_length)
+        if self._seekable:
+            self._patch(self._chunk_position + 4, length)
+        else:
+            self.fp.write(b"MTrk" + length + bytes(self._buffer))
+            self._buffer = bytearray()
+        self.n_written_tracks += 1
+
+    def close(self) -> None:
+        if self._track is not None:
+            self.end_track()
+        if self.n_tracks is None:
+            self._patch(
+                self._header_position + 10, struct.pack(">H", self.n_written_tracks)
+            )
+        elif self.n_tracks != self.n_written_tracks:
+            raise ValueError(
+                f"Expected {self.n_tracks} tracks, wrote {self.n_written_tracks}"
+            )
+
+    def _patch(self, position: int, data: bytes) -> None:
+        end_position = self.fp.tell()
+        self.fp.seek(position)
+        self.fp.write(data)
+        self.fp.seek(end_position)
+
+
+def _is_seekable(fp: BinaryIO) -> bool:
+    try:
+        return fp.seekable()
+    except AttributeError:
+        return False
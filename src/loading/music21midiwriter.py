@@ -0,0 +1,610 @@
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+import music21 as m21
+from music21.common.numberTools import opFrac
+
+from src.loading.midifile import MidiFile, MidiTrack
+from src.transforming.effectrenderer import PitchBendWriter
+
+# Resolution, and delay before the end of each track, of music21 MIDI files
+TICKS_PER_QUARTER = m21.defaults.ticksPerQuarter
+END_DELAY = m21.defaults.ticksAtStart
+# music21 channels, 1-indexed; channel 10 is kept for percussion
+ACCEPTABLE_CHANNELS = tuple(range(1, 10)) + tuple(range(11, 17))
+PERCUSSION_CHANNEL = 10
+# music21 stops expanding repeats after this many passes
+MAX_REPEAT_PASSES = 100
+# Order of the events music21 writes on the same tick
+NOTE_OFF_SORT_ORDER = -20
+PITCH_BEND_SORT_ORDER = -10
+DEFAULT_SORT_ORDER = 0
+DEFAULT_BPM = 120
+DEFAULT_TIME_SIGNATURE = (4, 4)
+# Conductor track marks, in the order music21 collects them, and their defaults
+MARK_CLASSES = (m21.tempo.MetronomeMark, m21.meter.TimeSignature)
+MARK_DEFAULTS = (DEFAULT_BPM, DEFAULT_TIME_SIGNATURE)
+# Channel of the parts written before every instrument is known
+PLACEHOLDER_CHANNEL = 1
+# Velocity of a note without volume, articulations or dynamics
+DEFAULT_VELOCITY = int(
+    round(m21.volume.Volume().getRealized(useDynamicContext=False) * 127)
+)
+
+MEASURE_ELEMENT_CLASSES = (
+    m21.stream.Voice,
+    m21.meter.TimeSignature,
+    m21.tempo.MetronomeMark,
+    m21.bar.Barline,
+)
+
+# (measure, offset in the expanded part)
+ExpandedMeasure = Tuple[m21.stream.Measure, float]
+# (offset, priority, class sort order, tempo or time signature)
+Mark = Tuple[float, int, int, Any]
+# (tick, sort order, event data)
+Packet = Tuple[int, int, bytes]
+
+
+class UnsupportedScoreError(ValueError):
+    """Raised for scores Music21MidiWriter cannot write the way music21 does."""
+
+
+class Music21MidiWriter:
+    """Writes the MIDI file music21 writes for a score with quantizePost=False.
+
+    It understands the scores GuitarProToMusic21Convertor produces: Parts
+    holding an instrument at offset 0 and Measures, Measures holding Voices,
+    time signatures, metronome marks and repeat barlines, Voices holding
+    Notes and Rests. Repeats are expanded, ties stripped and channels
+    assigned as music21 does, then the events of each part are written in
+    one pass over its sorted elements. Anything else raises
+    UnsupportedScoreError, so that callers can fall back to music21.
+
+    Parts can also be added one at a time with add_part, each written as
+    soon as it is added, so that a score never needs to be held whole.
+    """
+
+    def __init__(self, m21_score: Optional[m21.stream.Score] = None) -> None:
+        self.m21_score = m21_score
+        # Instrument and track of each part added, on a placeholder channel
+        # until every instrument is known
+        self._instruments: List[m21.instrument.Instrument] = []
+        self._part_tracks: List[MidiTrack] = []
+        # Conductor marks of the parts added and offset of the last one, by class
+        self._marks: Dict[type, List[Mark]] = {
+            mark_class: [] for mark_class in MARK_CLASSES
+        }
+        self._last_mark_offsets = {mark_class: -1 for mark_class in MARK_CLASSES}
+
+    def add_part(self, m21_part: m21.stream.Part) -> None:
+        """Writes the track of a part, so that the part can be dropped.
+
+        Only its instrument and conductor marks are kept until the file is
+        built, so parts can be added as they are converted.
+        """
+        m21_instrument = self._part_instrument(m21_part)
+        measures = self._expand_repeats(m21_part)
+        self._add_marks(measures)
+        bend_range = (
+            m21_part.editorial.get("pitchBendRange")
+            if m21_part.hasEditorialInformation
+            else None
+        )
+        track = MidiTrack()
+        self._write_part_track(
+            track, m21_instrument, PLACEHOLDER_CHANNEL, measures, bend_range
+        )
+        self._instruments.append(m21_instrument)
+        self._part_tracks.append(track)
+
+    def to_midi_file(self) -> MidiFile:
+        """Builds the file of the score, or of the parts added."""
+        if self.m21_score is not None and not self._part_tracks:
+            for m21_part in self._parts():
+                self.add_part(m21_part)
+        if not self._part_tracks:
+            raise UnsupportedScoreError("The score has no parts")
+        channels = self._assign_channels(self._instruments)
+
+        midi_file = MidiFile(TICKS_PER_QUARTER)
+        self._write_conductor_track(midi_file.add_track())
+        for track, channel in zip(self._part_tracks, channels):
+            _set_channel(track, channel)
+            midi_file.tracks.append(track)
+        return midi_file
+
+    def to_bytes(self) -> bytes:
+        return self.to_midi_file().to_bytes()
+
+    def _parts(self) -> List[m21.stream.Part]:
+        parts = []
+        for element in self.m21_score.elements:
+            if isinstance(element, m21.stream.Part):
+                parts.append(element)
+            elif not isinstance(element, m21.metadata.Metadata):
+                raise UnsupportedScoreError(f"Unsupported score element {element}")
+        if not parts:
+            raise UnsupportedScoreError("The score has no parts")
+        return parts
+
+    @staticmethod
+    def _part_instrument(m21_part: m21.stream.Part) -> m21.instrument.Instrument:
+        instruments = []
+        n_measures = 0
+        for element in m21_part.elements:
+            if isinstance(element, m21.stream.Measure):
+                n_measures += 1
+            elif isinstance(element, m21.instrument.Instrument):
+                instruments.append(element)
+            else:
+                raise UnsupportedScoreError(f"Unsupported part element {element}")
+        if len(instruments) != 1 or m21_part.elementOffset(instruments[0]) != 0:
+            raise UnsupportedScoreError("A part needs a single instrument at 0")
+        if isinstance(instruments[0], m21.instrument.Conductor):
+            raise UnsupportedScoreError("Conductor parts are not supported")
+        if n_measures == 0:
+            raise UnsupportedScoreError("A part needs measures")
+        return instruments[0]
+
+    @staticmethod
+    def _expand_repeats(m21_part: m21.stream.Part) -> List[ExpandedMeasure]:
+        """Returns the measures of the part once music21 expands its repeats.
+
+        Each innermost repeat is copied as many times as its end barline
+        says, and measures are appended one after the other, as
+        music21.repeat.Expander does. Without repeats, offsets are kept.
+        """
+        measures = list(m21_part.getElementsByClass(m21.stream.Measure))
+        # (measure, starts a repeat, ends a repeat, times played)
+        entries = []
+        for m21_measure in measures:
+            left_barline = m21_measure.leftBarline
+            right_barline = m21_measure.rightBarline
+            is_start = isinstance(left_barline, m21.bar.Repeat)
+            is_end = isinstance(right_barline, m21.bar.Repeat)
+            if is_start and left_barline.direction != "start":
+                raise UnsupportedScoreError("Repeat ends on left barlines")
+            if is_end and right_barline.direction != "end":
+                raise UnsupportedScoreError("Repeat starts on right barlines")
+            times = right_barline.times if is_end else None
+            entries.append(
+                (m21_measure, is_start, is_end, 2 if times is None else times)
+            )
+        if not any(is_start or is_end for _, is_start, is_end, _ in entries):
+            return [
+                (m21_measure, m21_part.elementOffset(m21_measure))
+                for m21_measure in measures
+            ]
+        _check_repeats_are_coherent(entries)
+
+        for _ in range(MAX_REPEAT_PASSES):
+            indices = _innermost_repeat(entries)
+            if not indices:
+                # music21 drops every measure when a start repeat is never closed
+                raise UnsupportedScoreError("A start repeat is never closed")
+            first, last = indices[0], indices[-1]
+            body = [
+                (
+                    (m21_measure, False, False, times)
+                    if idx_entry in (first, last)
+                    else (m21_measure, is_start, is_end, times)
+                )
+                for idx_entry, (m21_measure, is_start, is_end, times) in zip(
+                    indices, entries[first : last + 1]
+                )
+            ]
+            entries = entries[:first] + body * entries[last][3] + entries[last + 1 :]
+            if not any(is_start or is_end for _, is_start, is_end, _ in entries):
+                break
+        else:
+            raise UnsupportedScoreError("Too many nested repeats")
+
+        expanded_measures = []
+        highest_time = 0.0
+        for m21_measure, _, _, _ in entries:
+            expanded_measures.append((m21_measure, highest_time))
+            highest_time = max(
+                highest_time,
+                opFrac(highest_time + m21_measure.duration.quarterLength),
+            )
+        return expanded_measures
+
+    @staticmethod
+    def _assign_channels(
+        instruments: List[m21.instrument.Instrument],
+    ) -> List[int]:
+        """Returns the channel of each part, as music21.midi.translate does.
+
+        Instruments with a midiChannel keep it, other programs get the
+        acceptable channels in turn, and parts sharing a program share
+        their channel.
+        """
+        acceptable_channels = list(ACCEPTABLE_CHANNELS)
+        channel_by_program = {}
+        programs = []
+        for m21_instrument in instruments:
+            program = m21_instrument.midiProgram
+            if (
+                m21_instrument.midiChannel is not None
+                and program not in channel_by_program
+            ):
+                channel = m21_instrument.midiChannel + 1
+                if channel in acceptable_channels:
+                    acceptable_channels.remove(channel)
+                elif channel != PERCUSSION_CHANNEL:
+                    # music21 warns and moves the instrument to channel 1
+                    raise UnsupportedScoreError(f"Channel {channel} is not available")
+                channel_by_program[program] = channel
+            if program not in programs:
+                programs.append(program)
+        programs_still_needed = [
+            program for program in programs if program not in channel_by_program
+        ]
+        for idx_program, program in enumerate(programs_still_needed):
+            # The last acceptable channel is kept for microtones
+            if idx_program < len(acceptable_channels) - 1:
+                channel_by_program[program] = acceptable_channels[idx_program]
+            else:
+                channel_by_program[program] = acceptable_channels[0]
+        return [
+            (
+                PERCUSSION_CHANNEL
+                if isinstance(m21_instrument, m21.instrument.UnpitchedPercussion)
+                else channel_by_program[m21_instrument.midiProgram]
+            )
+            for m21_instrument in instruments
+        ]
+
+    def _add_marks(self, measures: List[ExpandedMeasure]) -> None:
+        """Reads the tempos and time signatures of a part.
+
+        Like music21, a mark is skipped when it does not come after the
+        previous mark of its class, in this part or the ones before.
+        """
+        for mark_class in MARK_CLASSES:
+            marks = self._marks[mark_class]
+            last_offset = self._last_mark_offsets[mark_class]
+            for m21_measure, measure_offset in measures:
+                for element in m21_measure.elements:
+                    if not isinstance(element, mark_class):
+                        continue
+                    offset = opFrac(measure_offset + m21_measure.elementOffset(element))
+                    if offset > last_offset:
+                        marks.append(
+                            (
+                                offset,
+                                element.priority,
+                                element.classSortOrder,
+                                _mark_value(element),
+                            )
+                        )
+                    last_offset = offset
+            self._last_mark_offsets[mark_class] = last_offset
+
+    def _write_conductor_track(self, track: MidiTrack) -> None:
+        """Writes the tempos and time signatures of every part.
+
+        Defaults fill in the classes without marks.
+        """
+        # (offset, priority, class sort order, insertion index, class, value)
+        marks = []
+        for mark_class, default in zip(MARK_CLASSES, MARK_DEFAULTS):
+            n_marks = len(marks)
+            for offset, priority, class_sort_order, value in self._marks[mark_class]:
+                marks.append(
+                    (offset, priority, class_sort_order, len(marks), mark_class, value)
+                )
+            if len(marks) == n_marks:
+                marks.append(
+                    (
+                        0.0,
+                        0,
+                        mark_class.classSortOrder,
+                        len(marks),
+                        mark_class,
+                        default,
+                    )
+                )
+        marks.sort(key=itemgetter(0, 1, 2, 3))
+
+        for offset, _, _, _, mark_class, value in marks:
+            if value is None:
+                continue
+            tick = _offset_to_ticks(offset)
+            if mark_class is m21.tempo.MetronomeMark:
+                track.add_tempo(tick, value)
+            else:
+                track.add_time_signature(tick, *value)
+        track.end_delay = END_DELAY
+
+    def _write_part_track(
+        self,
+        track: MidiTrack,
+        m21_instrument: m21.instrument.Instrument,
+        channel: int,
+        measures: List[ExpandedMeasure],
+        bend_range: Optional[int] = None,
+    ) -> None:
+        """Writes the events of a part.
+
+        With a bend_range, the pitch bend curves the convertor keeps in the
+        editorial of the measures are written too, after setting the bend
+        range of the channel.
+        """
+        elements = self._sorted_elements(m21_instrument, measures)
+        # Measures repeated share their notes, so ties are merged by position
+        tied_positions = [
+            idx_element
+            for idx_element, (_, element) in enumerate(elements)
+            if isinstance(element, m21.note.GeneralNote) and element.quarterLength > 0
+        ]
+        quarter_lengths = dict(
+            zip(
+                tied_positions,
+                _strip_ties([elements[position][1] for position in tied_positions]),
+            )
+        )
+
+        status_channel = channel - 1
+        packets: List[Packet] = []
+        for idx_element, (offset, element) in enumerate(elements):
+            tick = _offset_to_ticks(offset)
+            if isinstance(element, m21.instrument.Instrument):
+                program = element.midiProgram or 0
+                packets.append(
+                    (tick, DEFAULT_SORT_ORDER, bytes([0xC0 | status_channel, program]))
+                )
+                continue
+            if isinstance(element, m21.note.Rest):
+                continue
+            quarter_length = quarter_lengths.get(idx_element, element.quarterLength)
+            if quarter_length is None:
+                # Merged into the note it is tied to
+                continue
+            pitch = element.pitch.midi
+            packets.append(
+                (
+                    tick,
+                    DEFAULT_SORT_ORDER,
+                    bytes([0x90 | status_channel, pitch, _velocity(element)]),
+                )
+            )
+            packets.append(
+                (
+                    tick + _offset_to_ticks(quarter_length),
+                    NOTE_OFF_SORT_ORDER,
+                    bytes([0x80 | status_channel, pitch, 0]),
+                )
+            )
+        packets.sort(key=itemgetter(0, 1))
+        # Resets the pitch bend of the channel
+        packets.append(
+            (0, PITCH_BEND_SORT_ORDER, bytes([0xE0 | status_channel, 0x00, 0x40]))
+        )
+        bend_track = MidiTrack()
+        if bend_range is not None:
+            bend_track.add_bend_range(0, status_channel, bend_range)
+            self._write_pitch_bends(bend_track, status_channel, measures)
+        # After the reset, so that a curve can start on tick 0
+        packets.extend(
+            (event.tick, PITCH_BEND_SORT_ORDER, event.data)
+            for event in bend_track.events
+            if event.data[0] & 0xF0 == 0xE0
+        )
+        packets.sort(key=itemgetter(0, 1))
+
+        # Events are added in their final order; equal priorities keep it
+        track.add_track_name(m21_instrument.bestName() or "", "utf-8", "ignore")
+        if m21_instrument.midiProgram is not None:
+            track.add_event(
+                0, 0, bytes([0xC0 | status_channel, m21_instrument.midiProgram])
+            )
+        for event in bend_track.events:
+            if event.data[0] & 0xF0 == 0xB0:
+                track.add_event(0, 0, event.data)
+        for tick, _, data in packets:
+            track.add_event(tick, 0, data)
+        track.end_delay = END_DELAY
+
+    @staticmethod
+    def _write_pitch_bends(
+        bend_track: MidiTrack, status_channel: int, measures: List[ExpandedMeasure]
+    ) -> None:
+        """Writes the pitch bend curves of the measures, repeats included."""
+        bends = PitchBendWriter(bend_track, status_channel)
+        for m21_measure, measure_offset in measures:
+            if not m21_measure.hasEditorialInformation:
+                continue
+            for _, end, events in m21_measure.editorial.get("pitchBends", ()):
+                bends.add_curve(
+                    [
+                        (_offset_to_ticks(measure_offset + offset), value)
+                        for offset, value in events
+                    ],
+                    _offset_to_ticks(measure_offset + end),
+                )
+        bends.flush()
+
+    @staticmethod
+    def _sorted_elements(
+        m21_instrument: m21.instrument.Instrument, measures: List[ExpandedMeasure]
+    ) -> List[Tuple[float, m21.base.Music21Object]]:
+        """Returns (offset, element) of the flattened part, sorted as music21 does."""
+        # (offset, priority, class sort order, index in the part, element)
+        elements = [
+            (
+                0.0,
+                m21_instrument.priority,
+                m21_instrument.classSortOrder,
+                0,
+                m21_instrument,
+            )
+        ]
+        for m21_measure, measure_offset in measures:
+            for measure_element in m21_measure.elements:
+                if not isinstance(measure_element, MEASURE_ELEMENT_CLASSES):
+                    raise UnsupportedScoreError(
+                        f"Unsupported measure element {measure_element}"
+                    )
+                if not isinstance(measure_element, m21.stream.Voice):
+                    continue
+                voice_offset = opFrac(
+                    measure_offset + m21_measure.elementOffset(measure_element)
+                )
+                for element in measure_element.elements:
+                    _check_voice_element(element)
+                    elements.append(
+                        (
+                            opFrac(
+                                voice_offset + measure_element.elementOffset(element)
+                            ),
+                            element.priority,
+                            element.classSortOrder,
+                            len(elements),
+                            element,
+                        )
+                    )
+        elements.sort(key=itemgetter(0, 1, 2, 3))
+        return [(element[0], element[4]) for element in elements]
+
+
+def _mark_value(mark: m21.base.Music21Object) -> Any:
+    """Returns the tempo in BPM or the (numerator, denominator) of a mark."""
+    if isinstance(mark, m21.tempo.MetronomeMark):
+        if mark.number is None and mark.numberSounding is None:
+            # Counts as a mark, but writes nothing
+            return None
+        return mark.getSoundingMetronomeMark().getQuarterBPM()
+    if mark.numerator > 255:
+        raise UnsupportedScoreError(f"{mark} cannot be stored in MIDI")
+    return mark.numerator, mark.denominator
+
+
+def _set_channel(track: MidiTrack, channel: int) -> None:
+    """Moves the channel events of a track to a 1-indexed channel."""
+    status_channel = channel - 1
+    track.events = [
+        (
+            event._replace(
+                data=bytes([event.data[0] & 0xF0 | status_channel]) + event.data[1:]
+            )
+            if 0x80 <= event.data[0] < 0xF0
+            else event
+        )
+        for event in track.events
+    ]
+
+
+def _offset_to_ticks(offset: float) -> int:
+    return int(round(offset * TICKS_PER_QUARTER))
+
+
+def _velocity(m21_note: m21.note.Note) -> int:
+    if not m21_note.articulations and not m21_note.hasVolumeInformation():
+        return DEFAULT_VELOCITY
+    realized = m21_note.volume.getRealized(useDynamicContext=False)
+    return int(round(realized * 127))
+
+
+def _check_voice_element(element: m21.base.Music21Object) -> None:
+    if isinstance(element, m21.note.Note):
+        if not element.pitch.isTwelveTone():
+            raise UnsupportedScoreError(f"Microtones are not supported: {element}")
+        if element.lyric:
+            raise UnsupportedScoreError(f"Lyrics are not supported: {element}")
+    elif isinstance(element, m21.note.Rest):
+        if element.tie is not None:
+            raise UnsupportedScoreError(f"Tied rests are not supported: {element}")
+    else:
+        raise UnsupportedScoreError(f"Unsupported voice element {element}")
+    if element.duration.isGrace:
+        raise UnsupportedScoreError(f"Grace notes are not supported: {element}")
+
+
+def _check_repeats_are_coherent(entries: list) -> None:
+    """Raises when music21 would refuse to expand the repeats."""
+    n_starts = n_ends = balance = 0
+    for _, is_start, is_end, _ in entries:
+        if is_start:
+            n_starts += 1
+            balance += 1
+        if is_end:
+            # The first start repeat may be omitted
+            if balance == 0:
+                n_starts += 1
+                balance += 1
+            n_ends += 1
+            balance -= 1
+    if balance not in (0, 1) or n_starts not in (n_ends, n_ends - 1):
+        raise UnsupportedScoreError("Repeats are not coherent")
+
+
+def _innermost_repeat(entries: list) -> List[int]:
+    """Returns the entry indices of the first repeat closed, from its start."""
+    start_indices = []
+    for idx_entry, (_, is_start, is_end, _) in enumerate(entries):
+        if is_start:
+            start_indices.append(idx_entry)
+        if is_end:
+            first = start_indices[-1] if start_indices else 0
+            return list(range(first, idx_entry + 1))
+    return []
+
+
+def _strip_ties(
+    notes_and_rests: List[m21.note.GeneralNote],
+) -> List[Optional[float]]:
+    """Merges tied notes as music21 stripTies(matchByPitch=True) does.
+
+    Returns the quarter length of each note or rest once the first note of
+    each tie lasts the whole tie, and None for the notes merged into it.
+    """
+    quarter_lengths = [element.quarterLength for element in notes_and_rests]
+    connected: List[int] = []
+    for idx_element, element in enumerate(notes_and_rests):
+        tie_type = element.tie.type if element.tie is not None else None
+        if tie_type == "start":
+            if idx_element - 1 in connected:
+                connected.append(idx_element)
+            else:
+                connected = [idx_element]
+            continue
+        if tie_type == "continue":
+            if connected and not _continues_tie(
+                notes_and_rests, connected, idx_element
+            ):
+                connected = []
+            connected.append(idx_element)
+            continue
+        if tie_type != "stop" and not _continues_tie(
+            notes_and_rests, connected, idx_element
+        ):
+            continue
+        connected.append(idx_element)
+        if len(connected) < 2:
+            connected = []
+            continue
+        tied_length = 0
+        for idx_tied in connected[1:]:
+            tied_length += notes_and_rests[idx_tied].quarterLength
+            quarter_lengths[idx_tied] = None
+        idx_first = connected[0]
+        quarter_lengths[idx_first] = opFrac(quarter_lengths[idx_first] + tied_length)
+        connected = []
+    return quarter_lengths
+
+
+def _continues_tie(
+    notes_and_rests: List[m21.note.GeneralNote], connected: List[int], idx_element: int
+) -> bool:
+    """Tells if a note continues the tie of the previous note, by pitch."""
+    if idx_element == 0 or idx_element - 1 not in connected:
+        return False
+    previous_element = notes_and_rests[idx_element - 1]
+    element = notes_and_rests[idx_element]
+    return (
+        isinstance(previous_element, m21.note.Note)
+        and isinstance(element, m21.note.Note)
+        and previous_element.pitch == element.pitch
+    )
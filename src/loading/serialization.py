@@ -1,47 +1,207 @@
+import io
+import os
 from abc import ABC, abstractmethod
-from pathlib import Path
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Union
 
 import guitarpro as gm
 from guitarpro.models import Song
 from music21 import converter
-from music21.stream.base import Score
+from music21.midi.translate import music21ObjectToMidiFile
+from music21.musicxml.m21ToXml import GeneralObjectExporter
+from music21.stream.base import Part, Score
+
+from src.loading.midifile import MidiFile
+from src.loading.music21midiwriter import Music21MidiWriter, UnsupportedScoreError
+from src.profiling.conversionstats import ConversionStats, timer
+
+# A path, the contents of a file, or a binary file object such as an mmap
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+# A path or a binary file object
+Target = Union[str, os.PathLike, BinaryIO]
+
+
+def is_path(obj: Any) -> bool:
+    return isinstance(obj, (str, os.PathLike))
+
+
+@contextmanager
+def open_source(source: Source) -> Iterator[BinaryIO]:
+    """Gives a binary file object reading source.
+
+    Paths are opened and closed, bytes-like contents are wrapped without
+    touching the filesystem, and file objects are used as they are.
+    """
+    if is_path(source):
+        with open(source, "rb") as fp:
+            yield fp
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    else:
+        yield source
+
+
+@contextmanager
+def open_target(target: Target) -> Iterator[BinaryIO]:
+    """Gives a binary file object writing to target, opening it if it is a path."""
+    if is_path(target):
+        with open(target, "wb") as fp:
+            yield fp
+    else:
+        yield target
 
 
 class Serializer(ABC):
-    """Interface for concrete Seralization methods."""
+    """Interface for concrete Seralization methods.
+
+    Given stats, the time spent in load and dump is recorded into it.
+    load() reads a path, bytes or a binary file object, and dump() writes
+    to a path or a binary file object.
+    """
+
+    def __init__(self, stats: Optional[ConversionStats] = None) -> None:
+        self.stats = stats
 
     @abstractmethod
-    def dump(self, obj: Any, save_path: Path) -> None:
+    def dump(self, obj: Any, save_path: Target) -> None:
         pass
 
     @abstractmethod
-    def load(self, load_path: Path) -> Any:
+    def load(self, load_path: Source) -> Any:
         pass
 
+    def dumps(self, obj: Any) -> bytes:
+        """Returns the bytes dump() would write."""
+        fp = io.BytesIO()
+        self.dump(obj, fp)
+        return fp.getvalue()
 
-class PyGuitarProSerializer(Serializer):
 
+class PyGuitarProSerializer(Serializer):
     """Saves and loads a GuitarPro file. It's a concrete serializer."""
 
-    def dump(self, gp_stream: Song, save_path: Path) -> None:
-        gm.write(gp_stream, save_path)
+    def dump(self, gp_stream: Song, save_path: Target) -> None:
+        with timer(self.stats, "dump"):
+            gm.write(gp_stream, save_path)
 
-    def load(self, load_path: Path) -> Song:
-        stream = gm.parse(load_path)
+    def load(self, load_path: Source) -> Song:
+        with timer(self.stats, "load"), open_source(load_path) as fp:
+            stream = gm.parse(fp)
         return stream
 
 
-class Music21Serializer(Serializer):
+MIDI_BACKENDS = ("music21", "fast")
+MIDI_FORMATS = ("midi", "mid")
 
-    """Saves and loads a Music21 file. It's a concrete serializer."""
 
-    def __init__(self, save_format: str = "midi") -> None:
+class Music21Serializer(Serializer):
+    """Saves and loads a Music21 file. It's a concrete serializer.
+
+    With the "fast" midi_backend, MIDI files without quantization are
+    written by Music21MidiWriter, falling back to music21 for the scores
+    it does not support. Only Music21MidiWriter writes the pitch bends of
+    effects.
+    """
+
+    def __init__(
+        self,
+        save_format: str = "midi",
+        quantize_post: bool = False,
+        stats: Optional[ConversionStats] = None,
+        midi_backend: str = "music21",
+    ) -> None:
+        super().__init__(stats)
+        if midi_backend not in MIDI_BACKENDS:
+            raise ValueError(
+                f"Unknown MIDI backend {midi_backend}, expected one of {MIDI_BACKENDS}"
+            )
         self.save_format = save_format
-
-    def dump(self, m21_stream: Score, save_path: Path) -> None:
-        m21_stream.write(fmt=self.save_format, fp=save_path, quantizePost=False)
-
-    def load(self, load_path: Path) -> Score:
-        stream = converter.parse(load_path)
-        return stream
+        self.quantize_post = quantize_post
+        self.midi_backend = midi_backend
+
+    def dump(self, m21_stream: Score, save_path: Target) -> None:
+        with timer(self.stats, "dump"):
+            if self._uses_fast_midi_backend():
+                data = self._fast_midi_bytes(m21_stream)
+                if data is not None:
+                    with open_target(save_path) as fp:
+                        fp.write(data)
+                    return
+            if is_path(save_path):
+                m21_stream.write(
+                    fmt=self.save_format, fp=save_path, quantizePost=self.quantize_post
+                )
+                return
+            save_path.write(self._music21_bytes(m21_stream))
+
+    def dump_parts(
+        self, m21_stream: Score, m21_parts: Iterable[Part], save_path: Target
+    ) -> None:
+        """Saves a score whose parts are given one at a time.
+
+        With the fast MIDI backend each part is written as it comes and
+        dropped, so the whole score is never held. There is no falling back
+        to music21 then: the parts are gone once an UnsupportedScoreError is
+        raised. Other formats append the parts to the score and save it.
+        """
+        if not self._uses_fast_midi_backend():
+            for m21_part in m21_parts:
+                m21_stream.append(m21_part)
+            self.dump(m21_stream, save_path)
+            return
+        midi_writer = Music21MidiWriter()
+        for m21_part in m21_parts:
+            with timer(self.stats, "dump"):
+                midi_writer.add_part(m21_part)
+            # Not held while the next part is converted
+            del m21_part
+        with timer(self.stats, "dump"):
+            data = midi_writer.to_bytes()
+            with open_target(save_path) as fp:
+                fp.write(data)
+
+    def _uses_fast_midi_backend(self) -> bool:
+        return (
+            self.midi_backend == "fast"
+            and self.save_format.lower() in MIDI_FORMATS
+            and not self.quantize_post
+        )
+
+    def _fast_midi_bytes(self, m21_stream: Score) -> Optional[bytes]:
+        """Returns the MIDI file, or None if the score is not supported."""
+        try:
+            return Music21MidiWriter(m21_stream).to_bytes()
+        except UnsupportedScoreError:
+            if self.stats is not None:
+                self.stats.count("midi_fallbacks")
+            return None
+
+    def _music21_bytes(self, m21_stream: Score) -> bytes:
+        """Writes with music21 in memory, as its writers only take paths."""
+        save_format = self.save_format.lower()
+        if save_format in MIDI_FORMATS:
+            return music21ObjectToMidiFile(m21_stream).writestr()
+        if save_format == "musicxml":
+            return GeneralObjectExporter(m21_stream).parse()
+        raise ValueError(f"Format {self.save_format} can only be saved to a path")
+
+    def load(self, load_path: Source) -> Score:
+        with timer(self.stats, "load"):
+            if is_path(load_path):
+                return converter.parse(load_path)
+            with open_source(load_path) as fp:
+                data = fp.read()
+            return converter.parseData(data, format=self.save_format)
+
+
+class MidiSerializer(Serializer):
+    """Saves and loads a MidiFile. It's a concrete serializer."""
+
+    def dump(self, midi_file: MidiFile, save_path: Target) -> None:
+        with timer(self.stats, "dump"), open_target(save_path) as fp:
+            midi_file.write(fp)
+
+    def load(self, load_path: Source) -> MidiFile:
+        with timer(self.stats, "load"), open_source(load_path) as fp:
+            midi_file = MidiFile.read(fp)
+        return midi_file
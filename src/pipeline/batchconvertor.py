@@ -0,0 +1,760 @@
+import argparse
+import hashlib
+import io
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from src.loading.archives import ArchiveWriter, iter_archive
+from src.loading.music21midiwriter import UnsupportedScoreError
+from src.loading.serialization import (
+    MIDI_BACKENDS,
+    Music21Serializer,
+    PyGuitarProSerializer,
+    Source,
+    Target,
+    is_path,
+    open_target,
+)
+from src.pipeline.conversioncache import DEFAULT_MAX_SIZE, open_cache
+from src.pipeline.workerpool import TaskResult, WorkerPool
+from src.profiling.conversionstats import ConversionStats, track_memory
+from src.transforming.conversionspec import ConversionSpec
+from src.transforming.effectrenderer import (
+    DEFAULT_RESOLUTION,
+    DEFAULT_TOLERANCE,
+    EffectRenderer,
+)
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+from src.transforming.incrementalconvertor import (
+    STATE_SUFFIX,
+    IncrementalMidiConvertor,
+    load_state,
+    save_state,
+)
+
+GUITARPRO_EXTENSIONS = (".gp3", ".gp4", ".gp5")
+FORMAT_EXTENSIONS = {"midi": ".mid", "musicxml": ".musicxml"}
+ENGINES = ("music21", "midi")
+MANIFEST_NAME = "manifest.jsonl"
+SUMMARY_NAME = "summary.json"
+
+
+class ConversionJob(NamedTuple):
+    """A single file to convert, with everything a worker needs."""
+
+    input_path: Path
+    output_path: Path
+    save_format: str = "midi"
+    engine: str = "music21"
+    quantize_post: bool = False
+    cache_folder: Optional[Path] = None
+    cache_size: int = DEFAULT_MAX_SIZE
+    # Records the stage timers and counters of the conversion in the result
+    collect_stats: bool = False
+    # Both backends write the same bytes, so it is not part of the options
+    midi_backend: str = "music21"
+    # Plays repeats and alternate endings out instead of writing repeat marks
+    unroll_repeats: bool = False
+    # Reuses the measures unchanged since the state saved next to the output
+    incremental: bool = False
+    # Tracks and measures to convert, everything when None
+    spec: Optional[ConversionSpec] = None
+    # Renders bends, slides and vibrato as pitch bends, with the midi engine
+    # or the fast MIDI backend of the music21 engine
+    effects: Optional[EffectRenderer] = None
+    # Writes each part as soon as it is converted and releases its track;
+    # the output is the same, so it is not part of the options either
+    low_memory: bool = False
+    # Records the peak memory traced by tracemalloc, slowing the stages down
+    trace_memory: bool = False
+    # Digest of the source the existing output was converted from, the file
+    # is skipped while its contents still have it
+    done_source_digest: Optional[str] = None
+
+    @property
+    def options(self) -> dict:
+        """Options that change the converted output, used for cache keys."""
+        options = {
+            "save_format": self.save_format,
+            "engine": self.engine,
+            "quantize_post": self.quantize_post,
+        }
+        # Only keyed when set, so files cached before the option stay valid
+        if self.unroll_repeats:
+            options["unroll_repeats"] = True
+        if self.spec is not None and not self.spec.is_everything:
+            options["spec"] = self.spec.to_dict()
+        if self.effects is not None:
+            options["effects"] = self.effects.to_dict()
+        return options
+
+
+def convert_changed_file(job: ConversionJob) -> Tuple[Optional[dict], str]:
+    """Converts a file unless its contents are the ones its output was
+    converted from.
+
+    Returns the stage timings, None when the file is skipped, and the
+    digest of the contents, read once for both.
+    """
+    with open(job.input_path, "rb") as fp:
+        gp_bytes = fp.read()
+    source_digest = _source_digest(gp_bytes)
+    if source_digest == job.done_source_digest:
+        return None, source_digest
+    return convert_file(job, gp_bytes), source_digest
+
+
+def convert_file(job: ConversionJob, gp_bytes: Optional[bytes] = None) -> dict:
+    """Runs load, apply and dump for one file and returns the stage timings.
+
+    gp_bytes are the contents of the file when they were already read.
+    When the job has a cache folder, a file converted before with the same
+    contents and options is copied from the cache without being parsed.
+    """
+    if job.cache_folder is None:
+        return _convert_file(job, gp_bytes)
+
+    start = time.perf_counter()
+    cache = open_cache(job.cache_folder, max_size=job.cache_size)
+    if gp_bytes is None:
+        with open(job.input_path, "rb") as fp:
+            gp_bytes = fp.read()
+    key = cache.make_key(gp_bytes, job.options)
+    data = cache.get(key)
+    if data is not None:
+        job.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(job.output_path, "wb") as fp:
+            fp.write(data)
+        return {"cache_hit": True, "cache": time.perf_counter() - start}
+
+    timings = _convert_file(job, gp_bytes)
+    with open(job.output_path, "rb") as fp:
+        cache.put(key, fp.read())
+    timings["cache"] = (
+        time.perf_counter()
+        - start
+        - sum(value for name, value in timings.items() if name != "stats")
+    )
+    timings["cache_hit"] = False
+    return timings
+
+
+def convert_member(task: Tuple[ConversionJob, bytes]) -> Tuple[bytes, dict]:
+    """Converts the contents of an archive member in memory.
+
+    Returns the converted file and the stage timings. The cache works as
+    for convert_file, keyed on the contents of the member.
+    """
+    job, data = task
+    if job.cache_folder is None:
+        output = io.BytesIO()
+        timings = _convert(job, data, output)
+        return output.getvalue(), timings
+
+    start = time.perf_counter()
+    cache = open_cache(job.cache_folder, max_size=job.cache_size)
+    key = cache.make_key(data, job.options)
+    cached_data = cache.get(key)
+    if cached_data is not None:
+        return cached_data, {"cache_hit": True, "cache": time.perf_counter() - start}
+
+    output = io.BytesIO()
+    timings = _convert(job, data, output)
+    cache.put(key, output.getvalue())
+    timings["cache"] = (
+        time.perf_counter()
+        - start
+        - sum(value for name, value in timings.items() if name != "stats")
+    )
+    timings["cache_hit"] = False
+    return output.getvalue(), timings
+
+
+def _convert_file(job: ConversionJob, gp_bytes: Optional[bytes] = None) -> dict:
+    job.output_path.parent.mkdir(parents=True, exist_ok=True)
+    source = job.input_path if gp_bytes is None else gp_bytes
+    return _convert(job, source, job.output_path)
+
+
+def _convert(job: ConversionJob, source: Source, target: Target) -> dict:
+    """Loads source, converts it with the options of job and dumps it to target.
+
+    With stats, the peak memory of the whole conversion is recorded too.
+    """
+    timings = {}
+    stats = (
+        ConversionStats(str(job.input_path), per_track=True)
+        if job.collect_stats
+        else None
+    )
+    with track_memory(stats, "conversion", trace=job.trace_memory):
+        _run_stages(job, source, target, stats, timings)
+    if stats is not None:
+        timings["stats"] = stats.to_dict()
+    return timings
+
+
+def _run_stages(
+    job: ConversionJob,
+    source: Source,
+    target: Target,
+    stats: Optional[ConversionStats],
+    timings: dict,
+) -> None:
+    start = time.perf_counter()
+    gp_stream = PyGuitarProSerializer(stats).load(source)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if job.engine == "midi" and job.incremental and is_path(target):
+        state_path = Path(str(target) + STATE_SUFFIX)
+        convertor = IncrementalMidiConvertor(
+            gp_stream, load_state(state_path), unroll_repeats=job.unroll_repeats
+        )
+        midi_file = convertor.apply()
+        with open_target(target) as fp:
+            midi_file.write(fp)
+        save_state(convertor.state, state_path)
+        timings["convert"] = time.perf_counter() - start
+        if stats is not None:
+            stats.count("measures_converted", convertor.n_converted_measures)
+            stats.count("measures_reused", convertor.n_reused_measures)
+        return
+    if job.engine == "midi":
+        # Converted and written in one streaming pass
+        with open_target(target) as fp:
+            GuitarProToMidiConvertor(
+                gp_stream, unroll_repeats=job.unroll_repeats, effects=job.effects
+            ).write(fp)
+        timings["convert"] = time.perf_counter() - start
+        return
+
+    convertor = GuitarProToMusic21Convertor(
+        gp_stream,
+        stats=stats,
+        unroll_repeats=job.unroll_repeats,
+        spec=job.spec,
+        low_memory=job.low_memory,
+        effects=job.effects,
+    )
+    serializer = Music21Serializer(
+        save_format=job.save_format,
+        quantize_post=job.quantize_post,
+        stats=stats,
+        midi_backend=job.midi_backend,
+    )
+    if job.low_memory:
+        try:
+            # Parts are converted and written one after the other
+            serializer.dump_parts(convertor.m21_score, convertor.iter_parts(), target)
+            timings["convert"] = time.perf_counter() - start
+            return
+        except UnsupportedScoreError:
+            # The tracks written are released, so the song is loaded again
+            # and converted whole, for music21 to write it
+            if stats is not None:
+                stats.count("low_memory_fallbacks")
+            gp_stream = PyGuitarProSerializer().load(source)
+            convertor = GuitarProToMusic21Convertor(
+                gp_stream,
+                unroll_repeats=job.unroll_repeats,
+                spec=job.spec,
+                effects=job.effects,
+            )
+    m21_stream = convertor.apply()
+    timings["convert"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    serializer.dump(m21_stream, target)
+    timings["dump"] = time.perf_counter() - start
+
+
+def find_guitarpro_files(inputs: Iterable[Path]) -> List[Path]:
+    """Expands folders into the GuitarPro files they contain."""
+    gp_paths = []
+    for input_path in map(Path, inputs):
+        if input_path.is_dir():
+            gp_paths.extend(
+                sorted(
+                    path
+                    for path in input_path.rglob("*")
+                    if path.suffix.lower() in GUITARPRO_EXTENSIONS
+                )
+            )
+        else:
+            gp_paths.append(input_path)
+    return gp_paths
+
+
+class BatchConvertor:
+    """Converts many GuitarPro files in parallel, one process per song.
+
+    Every finished file is appended to a JSON-lines manifest in the output
+    folder. Files already converted successfully, from the same contents
+    and with the same options, are skipped when the batch runs again, so an
+    interrupted batch can be resumed. In incremental mode
+    nothing is skipped, as files may have been edited since, but only the
+    measures that changed are converted again.
+    """
+
+    def __init__(
+        self,
+        output_folder: Path,
+        save_format: str = "midi",
+        engine: str = "music21",
+        n_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        quantize_post: bool = False,
+        cache_folder: Optional[Path] = None,
+        cache_size: int = DEFAULT_MAX_SIZE,
+        collect_stats: bool = False,
+        midi_backend: str = "music21",
+        unroll_repeats: bool = False,
+        incremental: bool = False,
+        spec: Optional[ConversionSpec] = None,
+        effects: Optional[EffectRenderer] = None,
+        low_memory: bool = False,
+        trace_memory: bool = False,
+    ) -> None:
+        if save_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported save format: {save_format}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}")
+        if engine == "midi" and save_format != "midi":
+            raise ValueError("The midi engine can only save midi files")
+        if midi_backend not in MIDI_BACKENDS:
+            raise ValueError(f"Unsupported MIDI backend: {midi_backend}")
+        if incremental and engine != "midi":
+            raise ValueError("Incremental conversion needs the midi engine")
+        if spec is not None and not spec.is_everything and engine != "music21":
+            raise ValueError("Selective conversion needs the music21 engine")
+        if effects is not None and (
+            incremental
+            or (
+                engine == "music21"
+                and (save_format != "midi" or midi_backend != "fast" or quantize_post)
+            )
+        ):
+            # music21 has no pitch bend curves, only the fast backend writes them
+            raise ValueError(
+                "Effects need the midi engine without incremental runs, or the "
+                "fast MIDI backend without quantization"
+            )
+        if low_memory and (
+            engine != "music21"
+            or save_format != "midi"
+            or midi_backend != "fast"
+            or quantize_post
+        ):
+            # The midi engine already writes each track as it converts it, and
+            # the other writers need the whole score
+            raise ValueError(
+                "Low memory conversion needs the music21 engine and the fast "
+                "MIDI backend, without quantization"
+            )
+        if trace_memory and not collect_stats:
+            raise ValueError("Tracing memory needs stats to be collected")
+        self.output_folder = Path(output_folder)
+        self.save_format = save_format
+        self.engine = engine
+        self.n_workers = n_workers
+        self.timeout = timeout
+        self.quantize_post = quantize_post
+        self.cache_folder = cache_folder
+        self.cache_size = cache_size
+        self.collect_stats = collect_stats
+        self.midi_backend = midi_backend
+        self.unroll_repeats = unroll_repeats
+        self.incremental = incremental
+        self.spec = spec
+        self.effects = effects
+        self.low_memory = low_memory
+        self.trace_memory = trace_memory
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.output_folder / MANIFEST_NAME
+
+    @property
+    def summary_path(self) -> Path:
+        return self.output_folder / SUMMARY_NAME
+
+    def _create_jobs(self, inputs: Iterable[Path]) -> List[ConversionJob]:
+        jobs = []
+        extension = FORMAT_EXTENSIONS[self.save_format]
+        for input_path in map(Path, inputs):
+            if input_path.is_dir():
+                for gp_path in find_guitarpro_files([input_path]):
+                    relative_path = gp_path.relative_to(input_path)
+                    output_path = self.output_folder / relative_path
+                    jobs.append(self._create_job(gp_path, output_path, extension))
+            else:
+                output_path = self.output_folder / input_path.name
+                jobs.append(self._create_job(input_path, output_path, extension))
+        return jobs
+
+    def _create_job(
+        self, input_path: Path, output_path: Path, extension: str
+    ) -> ConversionJob:
+        output_path = output_path.with_name(output_path.name + extension)
+        return ConversionJob(
+            input_path,
+            output_path,
+            self.save_format,
+            self.engine,
+            self.quantize_post,
+            self.cache_folder,
+            self.cache_size,
+            self.collect_stats,
+            self.midi_backend,
+            self.unroll_repeats,
+            self.incremental,
+            self.spec,
+            self.effects,
+            self.low_memory,
+            self.trace_memory,
+        )
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        """Returns the latest manifest entry of every input already processed."""
+        entries = {}
+        if not self.manifest_path.is_file():
+            return entries
+        with open(self.manifest_path) as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by an interrupted run
+                    continue
+                entries[entry["input"]] = entry
+        return entries
+
+    @staticmethod
+    def _with_done_digest(
+        job: ConversionJob, entries: Dict[str, dict]
+    ) -> ConversionJob:
+        """Gives the job the source digest of its output when the file was
+        converted before with the same options, for the worker to skip it if
+        the contents did not change.
+
+        Options are compared once through JSON, as they are in the manifest.
+        """
+        entry = entries.get(str(job.input_path))
+        if (
+            job.incremental
+            or entry is None
+            or entry["status"] != "success"
+            or entry.get("options") != json.loads(json.dumps(job.options))
+            or not job.output_path.is_file()
+        ):
+            return job
+        return job._replace(done_source_digest=entry.get("source_digest"))
+
+    def run(self, inputs: Iterable[Path]) -> dict:
+        """Converts every file found in inputs and returns the batch summary."""
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        entries = self._load_manifest()
+        jobs = self._create_jobs(inputs)
+        # Sources are read and hashed by the workers, as they convert them
+        pending_jobs = [self._with_done_digest(job, entries) for job in jobs]
+
+        start = time.perf_counter()
+        with WorkerPool(
+            convert_changed_file, n_workers=self.n_workers, timeout=self.timeout
+        ) as pool, open(self.manifest_path, "a") as manifest:
+            for result in pool.imap_unordered(pending_jobs):
+                timings, source_digest = result.value if result.ok else (None, None)
+                if result.ok and timings is None:
+                    # Unchanged since its last conversion, its entry stays
+                    continue
+                self._record(
+                    manifest,
+                    entries,
+                    result.task,
+                    str(result.task.output_path),
+                    result,
+                    timings,
+                    source_digest,
+                )
+
+        summary = self._summarize(jobs, entries, time.perf_counter() - start)
+        with open(self.summary_path, "w") as fp:
+            json.dump(summary, fp, indent=2)
+        return summary
+
+    def run_archive(self, input_archive: Path, output_archive: Path) -> dict:
+        """Converts the GuitarPro files of a zip or tar archive into another one.
+
+        Members are read, converted and written to output_archive in memory,
+        without temporary files, and only the ones being converted are held
+        at once. Members go in the manifest like files, as paths inside
+        input_archive. The output archive is written from scratch, so
+        interrupted runs start over.
+        """
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        input_archive = Path(input_archive)
+        extension = FORMAT_EXTENSIONS[self.save_format]
+        entries: Dict[str, dict] = {}
+        jobs: List[ConversionJob] = []
+        source_digests: Dict[Path, str] = {}
+
+        def tasks() -> Iterator[Tuple[ConversionJob, bytes]]:
+            for name, data in iter_archive(input_archive, GUITARPRO_EXTENSIONS):
+                job = self._create_job(input_archive / name, Path(name), extension)
+                jobs.append(job)
+                source_digests[job.input_path] = _source_digest(data)
+                yield job, data
+
+        start = time.perf_counter()
+        with WorkerPool(
+            convert_member, n_workers=self.n_workers, timeout=self.timeout
+        ) as pool, open(self.manifest_path, "a") as manifest, ArchiveWriter(
+            output_archive
+        ) as archive:
+            for result in pool.imap_unordered(tasks()):
+                job, _ = result.task
+                timings = None
+                if result.ok:
+                    data, timings = result.value
+                    archive.write(job.output_path.as_posix(), data)
+                output = f"{output_archive}/{job.output_path.as_posix()}"
+                self._record(
+                    manifest,
+                    entries,
+                    job,
+                    output,
+                    result,
+                    timings,
+                    source_digests[job.input_path],
+                )
+
+        summary = self._summarize(jobs, entries, time.perf_counter() - start)
+        with open(self.summary_path, "w") as fp:
+            json.dump(summary, fp, indent=2)
+        return summary
+
+    @staticmethod
+    def _record(
+        manifest,
+        entries: Dict[str, dict],
+        job: ConversionJob,
+        output: str,
+        result: TaskResult,
+        timings: Optional[dict],
+        source_digest: Optional[str],
+    ) -> None:
+        entry = {
+            "input": str(job.input_path),
+            "output": output,
+            "status": "success" if result.ok else "failure",
+            "elapsed": result.elapsed,
+            "timings": timings,
+            "error": result.error,
+            # Resuming only skips the file while both stay the same
+            "options": job.options,
+            "source_digest": source_digest,
+        }
+        entries[entry["input"]] = entry
+        manifest.write(json.dumps(entry) + "\n")
+        manifest.flush()
+
+    @staticmethod
+    def _summarize(
+        jobs: List[ConversionJob], entries: Dict[str, dict], elapsed: float
+    ) -> dict:
+        batch_entries = [
+            entries[str(job.input_path)]
+            for job in jobs
+            if str(job.input_path) in entries
+        ]
+        successes = [entry for entry in batch_entries if entry["status"] == "success"]
+        failures = [entry for entry in batch_entries if entry["status"] != "success"]
+        return {
+            "total": len(jobs),
+            "succeeded": len(successes),
+            "failed": len(failures),
+            "elapsed": elapsed,
+            "conversion_time": sum(entry["elapsed"] for entry in batch_entries),
+            "cache_hits": sum(
+                bool((entry["timings"] or {}).get("cache_hit"))
+                for entry in batch_entries
+            ),
+            "successes": [entry["input"] for entry in successes],
+            "failures": {entry["input"]: entry["error"] for entry in failures},
+        }
+
+
+def _source_digest(gp_bytes: bytes) -> str:
+    return hashlib.sha256(gp_bytes).hexdigest()
+
+
+def _track_key(value: str) -> Union[int, str]:
+    """Reads a track index, or a track name when it is not a number."""
+    return int(value) if value.isdigit() else value
+
+
+def _optional_tuple(values: Optional[list]) -> Optional[tuple]:
+    return None if values is None else tuple(values)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert folders or lists of GuitarPro files in parallel."
+    )
+    parser.add_argument("inputs", nargs="+", type=Path)
+    parser.add_argument("-o", "--output-folder", type=Path, required=True)
+    parser.add_argument(
+        "--output-archive",
+        type=Path,
+        default=None,
+        help="Convert the single input zip or tar archive into this archive",
+    )
+    parser.add_argument("-f", "--format", default="midi", choices=FORMAT_EXTENSIONS)
+    parser.add_argument("-e", "--engine", default="music21", choices=ENGINES)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("-t", "--timeout", type=float, default=None)
+    parser.add_argument("--quantize-post", action="store_true")
+    parser.add_argument("--cache-folder", type=Path, default=None)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE)
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Record stage timers, counters and peak memory of every file",
+    )
+    parser.add_argument(
+        "--midi-backend",
+        default="music21",
+        choices=MIDI_BACKENDS,
+        help="Backend writing MIDI files of the music21 engine",
+    )
+    parser.add_argument(
+        "--unroll-repeats",
+        action="store_true",
+        help="Play repeats and alternate endings out in the converted files",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only convert again the measures edited since the last run",
+    )
+    parser.add_argument(
+        "--tracks",
+        nargs="+",
+        type=_track_key,
+        default=None,
+        help="Only convert these tracks, given by index or name",
+    )
+    parser.add_argument(
+        "--instruments",
+        nargs="+",
+        type=int,
+        default=None,
+        help="Only convert the tracks of these MIDI programs",
+    )
+    parser.add_argument("--exclude-percussion", action="store_true")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument(
+        "--measures",
+        nargs=2,
+        type=int,
+        default=None,
+        metavar=("FIRST", "STOP"),
+        help="Only convert measure indexes FIRST up to, not including, STOP",
+    )
+    selection.add_argument(
+        "--ticks",
+        nargs=2,
+        type=int,
+        default=None,
+        metavar=("START", "STOP"),
+        help="Only convert the measures overlapping these song ticks",
+    )
+    parser.add_argument(
+        "--effects",
+        action="store_true",
+        help=(
+            "Play bends, slides and vibrato as pitch bends. The music21 engine "
+            "needs the fast MIDI backend, and files music21 writes instead lose "
+            "their effects"
+        ),
+    )
+    parser.add_argument(
+        "--effect-resolution",
+        type=int,
+        default=DEFAULT_RESOLUTION,
+        help="Ticks between two pitch bends of an effect",
+    )
+    parser.add_argument(
+        "--effect-tolerance",
+        type=int,
+        default=DEFAULT_TOLERANCE,
+        help="Largest pitch bend error allowed when thinning effects",
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help=(
+            "Write each track as soon as it is converted, to hold less in memory. "
+            "Needs the fast MIDI backend; files it cannot write are loaded and "
+            "converted again without it"
+        ),
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Also record the peak memory traced by tracemalloc with --stats, "
+        "which makes the stage timings several times slower",
+    )
+    parsed_args = parser.parse_args(args)
+    if parsed_args.output_archive is not None and len(parsed_args.inputs) != 1:
+        parser.error("--output-archive takes a single input archive")
+
+    batch_convertor = BatchConvertor(
+        parsed_args.output_folder,
+        save_format=parsed_args.format,
+        engine=parsed_args.engine,
+        n_workers=parsed_args.workers,
+        timeout=parsed_args.timeout,
+        quantize_post=parsed_args.quantize_post,
+        cache_folder=parsed_args.cache_folder,
+        cache_size=parsed_args.cache_size,
+        collect_stats=parsed_args.stats,
+        midi_backend=parsed_args.midi_backend,
+        unroll_repeats=parsed_args.unroll_repeats,
+        incremental=parsed_args.incremental,
+        spec=ConversionSpec(
+            tracks=_optional_tuple(parsed_args.tracks),
+            instruments=_optional_tuple(parsed_args.instruments),
+            exclude_percussion=parsed_args.exclude_percussion,
+            measures=_optional_tuple(parsed_args.measures),
+            ticks=_optional_tuple(parsed_args.ticks),
+        ),
+        effects=(
+            EffectRenderer(parsed_args.effect_resolution, parsed_args.effect_tolerance)
+            if parsed_args.effects
+            else None
+        ),
+        low_memory=parsed_args.low_memory,
+        trace_memory=parsed_args.trace_memory,
+    )
+    if parsed_args.output_archive is None:
+        summary = batch_convertor.run(parsed_args.inputs)
+    else:
+        summary = batch_convertor.run_archive(
+            parsed_args.inputs[0], parsed_args.output_archive
+        )
+    print(
+        f"Converted {summary['succeeded']}/{summary['total']} files, "
+        f"{summary['failed']} failed. Manifest: {batch_convertor.manifest_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from src.transforming.convertor import CONVERTOR_VERSION
+
+DEFAULT_MAX_SIZE = 1024**3  # 1 GiB
+LOCK_NAME = ".lock"
+TEMP_PREFIX = ".tmp"
+
+
+class ConversionCache:
+    """On-disk store of converted files, addressed by the hash of the
+    GuitarPro bytes, the convertor version and the conversion options.
+
+    Entries are written atomically, so several workers can share the same
+    folder. A hit refreshes the entry modification time, and the least
+    recently used entries are evicted once the folder exceeds max_size.
+    """
+
+    def __init__(
+        self,
+        cache_folder: Path,
+        max_size: int = DEFAULT_MAX_SIZE,
+        convertor_version: str = CONVERTOR_VERSION,
+    ) -> None:
+        self.cache_folder = Path(cache_folder)
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.convertor_version = convertor_version
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._size: Optional[int] = None
+
+    def make_key(self, gp_bytes: bytes, options: Optional[Dict] = None) -> str:
+        """Returns the key of a conversion of gp_bytes with the given options."""
+        digest = hashlib.sha256(gp_bytes)
+        digest.update(self.convertor_version.encode())
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_folder / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as fp:
+                data = fp.read()
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Missing, or evicted by another worker while reading
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(exist_ok=True)
+        try:
+            replaced_size = entry_path.stat().st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=entry_path.parent, prefix=TEMP_PREFIX
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as fp:
+                fp.write(data)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.stats["stores"] += 1
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += len(data) - replaced_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for entry_path in self.cache_folder.glob("??/*"):
+            if entry_path.name.startswith(TEMP_PREFIX):
+                continue
+            try:
+                entry_stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+        return entries
+
+    def size(self) -> int:
+        """Returns the total size in bytes of the cached entries."""
+        return sum(entry_size for _, entry_size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits max_size."""
+        with open(self.cache_folder / LOCK_NAME, "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker is already evicting
+                    self._size = None
+                    return
+            entries = sorted(self._entries())
+            total_size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, entry_path in entries:
+                if total_size <= self.max_size:
+                    break
+                try:
+                    entry_path.unlink()
+                except FileNotFoundError:
+                    pass
+                total_size -= entry_size
+                self.stats["evictions"] += 1
+            self._size = total_size
+
+    def clear(self) -> None:
+        for _, _, entry_path in self._entries():
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+
+# Caches opened in this process, by folder and max size
+_open_caches: Dict[Tuple[Path, int], ConversionCache] = {}
+
+
+def open_cache(cache_folder: Path, max_size: int = DEFAULT_MAX_SIZE) -> ConversionCache:
+    """Returns the cache of cache_folder shared by the jobs of this process.
+
+    The folder is then scanned for its size once per process, rather than
+    once per converted file.
+    """
+    cache_key = (Path(cache_folder).resolve(), max_size)
+    cache = _open_caches.get(cache_key)
+    if cache is None:
+        cache = _open_caches[cache_key] = ConversionCache(cache_folder, max_size)
+    return cache
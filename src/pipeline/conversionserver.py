@@ -0,0 +1,349 @@
+import argparse
+import json
+import logging
+import os
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from src.pipeline.batchconvertor import ENGINES, ConversionJob, convert_member
+from src.pipeline.conversioncache import DEFAULT_MAX_SIZE
+from src.pipeline.workerpool import (
+    NO_WORKER_FREE,
+    THREAD_SAFE_START_METHOD,
+    TIMED_OUT,
+    WorkerPool,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Requests waiting for a worker before new ones are turned away
+DEFAULT_MAX_QUEUED = 32
+# Seconds a conversion may run before its worker is killed
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_TASKS_PER_WORKER = 500
+DEFAULT_MAX_REQUEST_SIZE = 16 * 1024 * 1024
+# Seconds a client turned away is told to wait before retrying
+RETRY_AFTER = 1
+
+Address = Union[Tuple[str, int], Path]
+
+
+class ServerMetrics:
+    """Counters of the requests served, safe to update from many threads."""
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.counts = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+        }
+        self.convert_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def count(self, name: str, convert_seconds: float = 0.0) -> None:
+        with self._lock:
+            self.counts[name] += 1
+            self.convert_seconds += convert_seconds
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = dict(self.counts)
+            metrics["convert_seconds"] = self.convert_seconds
+        metrics["uptime"] = time.time() - self.started_at
+        return metrics
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the ConversionServer the HTTP server belongs to."""
+
+    # Keeps connections open, so clients making many calls connect once
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        conversion_server = self.server.conversion_server
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, conversion_server.health())
+        elif path == "/metrics":
+            self._send_json(200, conversion_server.metrics())
+        else:
+            self._send_json(404, {"error": f"Unknown path: {path}"})
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != "/convert":
+            self._send_json(404, {"error": f"Unknown path: {url.path}"})
+            return
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self._send_json(411, {"error": "Content-Length is required"})
+            return
+        if not length.isdigit():
+            self.close_connection = True
+            self._send_json(400, {"error": f"Invalid Content-Length: {length}"})
+            return
+        conversion_server = self.server.conversion_server
+        if int(length) > conversion_server.max_request_size:
+            self.close_connection = True
+            self._send_json(413, {"error": "Request too large"})
+            return
+        data = self.rfile.read(int(length))
+        status, body = conversion_server.convert(data, parse_qs(url.query))
+        if isinstance(body, bytes):
+            self._send(status, body, "audio/midi")
+        else:
+            self._send_json(status, body)
+
+    def _send_json(self, status: int, body: dict) -> None:
+        self._send(status, json.dumps(body).encode(), "application/json")
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", str(RETRY_AFTER))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Unix socket clients have no address to log
+        self.server.conversion_server.logger.debug(format, *args)
+
+
+def _warm_up_worker() -> None:
+    """Imports the converters in a new worker, ahead of its first request."""
+    import guitarpro  # noqa: F401
+    import music21  # noqa: F401
+
+    import src.transforming.guitarprotomusic21convertor  # noqa: F401
+
+
+class ConversionServer:
+    """Converts GuitarPro files to MIDI for clients of a local HTTP server.
+
+    Worker processes are started up front, with music21 and guitarpro
+    already imported, so a request only pays for its own conversion. The
+    server listens on a (host, port) address or on a Unix socket path.
+
+    POST /convert takes the bytes of a GuitarPro file and returns the MIDI
+    file; the engine and unroll_repeats query parameters work as in the
+    batch convertor. GET /health and GET /metrics return JSON.
+
+    At most n_workers conversions run at once. Up to max_queued more wait
+    for a worker, at most queue_timeout seconds; past that, requests are
+    answered 503 right away. A conversion running longer than timeout is
+    answered 504 and its worker replaced. Workers are recycled after
+    max_tasks_per_worker conversions to contain memory growth.
+    """
+
+    def __init__(
+        self,
+        address: Address = (DEFAULT_HOST, DEFAULT_PORT),
+        n_workers: Optional[int] = None,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        queue_timeout: Optional[float] = DEFAULT_TIMEOUT,
+        max_tasks_per_worker: Optional[int] = DEFAULT_MAX_TASKS_PER_WORKER,
+        max_request_size: int = DEFAULT_MAX_REQUEST_SIZE,
+        cache_folder: Optional[Path] = None,
+        cache_size: int = DEFAULT_MAX_SIZE,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.requested_address = address
+        self.pool = WorkerPool(
+            convert_member,
+            n_workers=n_workers,
+            timeout=timeout,
+            max_tasks_per_worker=max_tasks_per_worker,
+            # Workers are started from request threads
+            start_method=THREAD_SAFE_START_METHOD,
+            initializer=_warm_up_worker,
+        )
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_request_size = max_request_size
+        self.cache_folder = cache_folder
+        self.cache_size = cache_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.server_metrics = ServerMetrics()
+        # Requests accepted and not answered yet, running or waiting
+        self._n_pending = 0
+        self._pending_lock = threading.Lock()
+        self._http_server: Optional[socketserver.BaseServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "ConversionServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def address(self) -> Address:
+        """The address listened on, with the port picked when 0 was asked."""
+        if isinstance(self.requested_address, tuple):
+            return self._http_server.server_address[:2]
+        return self.requested_address
+
+    def _bind(self) -> None:
+        self.pool.start()
+        if isinstance(self.requested_address, tuple):
+            self._http_server = ThreadingHTTPServer(
+                self.requested_address, _RequestHandler
+            )
+        else:
+            socket_path = Path(self.requested_address)
+            # Left behind by a server that did not close
+            if socket_path.exists() and stat.S_ISSOCK(socket_path.stat().st_mode):
+                socket_path.unlink()
+            self._http_server = _UnixHTTPServer(str(socket_path), _RequestHandler)
+        self._http_server.daemon_threads = True
+        self._http_server.conversion_server = self
+
+    def start(self) -> None:
+        """Starts the workers and serves requests from a background thread."""
+        self._bind()
+        self._thread = threading.Thread(
+            target=self._http_server.serve_forever, daemon=True
+        )
+        self._thread.start()
+
+    def serve_forever(self) -> None:
+        """Starts the workers and serves requests until interrupted."""
+        self._bind()
+        try:
+            self._http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._http_server is not None:
+            if self._thread is not None:
+                self._http_server.shutdown()
+                self._thread.join()
+                self._thread = None
+            self._http_server.server_close()
+            self._http_server = None
+            if not isinstance(self.requested_address, tuple):
+                Path(self.requested_address).unlink(missing_ok=True)
+        self.pool.close()
+
+    def health(self) -> dict:
+        return {"status": "ok", "workers": self.pool.n_workers}
+
+    def metrics(self) -> dict:
+        metrics = self.server_metrics.to_dict()
+        n_running = self.pool.n_running_tasks
+        metrics["running"] = n_running
+        metrics["queued"] = max(self._n_pending - n_running, 0)
+        metrics["workers"] = self.pool.n_workers
+        metrics["workers_started"] = self.pool.n_started_workers
+        return metrics
+
+    def _create_job(self, query: dict) -> ConversionJob:
+        engine = query.get("engine", ["midi"])[-1]
+        if engine not in ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}")
+        unroll_repeats = query.get("unroll_repeats", ["0"])[-1]
+        if unroll_repeats not in ("0", "1", "false", "true"):
+            raise ValueError(f"Invalid unroll_repeats: {unroll_repeats}")
+        return ConversionJob(
+            Path("request"),
+            Path("request.mid"),
+            engine=engine,
+            cache_folder=self.cache_folder,
+            cache_size=self.cache_size,
+            midi_backend="fast",
+            unroll_repeats=unroll_repeats in ("1", "true"),
+        )
+
+    def convert(self, data: bytes, query: dict) -> Tuple[int, Union[bytes, dict]]:
+        """Converts the bytes of a request and returns the status and body."""
+        metrics = self.server_metrics
+        metrics.count("requests")
+        try:
+            job = self._create_job(query)
+        except ValueError as error:
+            metrics.count("failed")
+            return 400, {"error": str(error)}
+
+        with self._pending_lock:
+            if self._n_pending >= self.pool.n_workers + self.max_queued:
+                metrics.count("rejected")
+                return 503, {"error": "Too many requests waiting"}
+            self._n_pending += 1
+        try:
+            result = self.pool.apply((job, data), wait_timeout=self.queue_timeout)
+        finally:
+            with self._pending_lock:
+                self._n_pending -= 1
+
+        if result.ok:
+            output, _ = result.value
+            metrics.count("succeeded", result.elapsed)
+            return 200, output
+        if result.error.startswith(NO_WORKER_FREE):
+            metrics.count("rejected")
+            return 503, {"error": result.error}
+        if result.error.startswith(TIMED_OUT):
+            metrics.count("timed_out", result.elapsed)
+            return 504, {"error": result.error}
+        metrics.count("failed", result.elapsed)
+        # The last line of the traceback names the exception
+        return 422, {"error": result.error.strip().splitlines()[-1]}
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve GuitarPro to MIDI conversions from warm workers."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--socket", type=Path, default=None, help="Listen on this Unix socket"
+    )
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("-t", "--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED)
+    parser.add_argument("--queue-timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument(
+        "--max-tasks-per-worker", type=int, default=DEFAULT_MAX_TASKS_PER_WORKER
+    )
+    parser.add_argument("--cache-folder", type=Path, default=None)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE)
+    parsed_args = parser.parse_args(args)
+
+    address = parsed_args.socket or (parsed_args.host, parsed_args.port)
+    server = ConversionServer(
+        address,
+        n_workers=parsed_args.workers,
+        timeout=parsed_args.timeout,
+        max_queued=parsed_args.max_queued,
+        queue_timeout=parsed_args.queue_timeout,
+        max_tasks_per_worker=parsed_args.max_tasks_per_worker,
+        cache_folder=parsed_args.cache_folder,
+        cache_size=parsed_args.cache_size,
+    )
+    print(f"Serving conversions on {address}, pid {os.getpid()}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
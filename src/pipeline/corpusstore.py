@@ -0,0 +1,343 @@
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import guitarpro as gm
+import numpy as np
+
+from src.pipeline.batchconvertor import find_guitarpro_files
+from src.pipeline.pipelinedloader import PipelinedLoader
+from src.transforming.measuremap import MeasureMap
+from src.transforming.noteeventtable import (
+    NOTE_EVENT_DTYPE,
+    QUARTER_TIME_IN_TICKS,
+    NoteEventTable,
+)
+from src.transforming.tempomap import TempoMap
+
+# Bump whenever the layout of the store changes
+CORPUS_VERSION = 1
+INDEX_NAME = "index.json"
+# Event rows gathered before a chunk is written
+DEFAULT_CHUNK_SIZE = 1_000_000
+ARRAY_KINDS = ("events", "measures", "tempos")
+
+MEASURE_DTYPE = np.dtype(
+    [
+        ("start", np.int64),
+        ("length", np.int32),
+        ("numerator", np.uint8),
+        ("denominator", np.uint8),
+        ("is_dotted_denominator", np.bool_),
+        ("is_repeat_open", np.bool_),
+        ("repeat_close", np.int8),
+        ("repeat_alternative", np.uint8),
+    ]
+)
+TEMPO_DTYPE = np.dtype([("tick", np.int64), ("bpm", np.float64)])
+
+SongKey = Union[int, str]
+
+
+class SongArrays(NamedTuple):
+    """Arrays of one song as kept in a corpus store.
+
+    events are the rows of its NoteEventTable, ordered by track then
+    measure. measures and tempos come from its MeasureMap and TempoMap.
+    """
+
+    events: np.ndarray
+    measures: np.ndarray
+    tempos: np.ndarray
+    metadata: dict
+
+    @classmethod
+    def from_song(cls, gp_stream: gm.models.Song) -> "SongArrays":
+        events = NoteEventTable.from_song(gp_stream).events
+        tempo_map = TempoMap.from_song(gp_stream)
+        measure_map = MeasureMap.from_song(gp_stream, tempo_map)
+        measures = np.array(
+            [
+                (
+                    measure.start,
+                    measure.length,
+                    measure.numerator,
+                    measure.denominator,
+                    measure.is_dotted_denominator,
+                    measure.is_repeat_open,
+                    measure.repeat_close,
+                    measure.repeat_alternative,
+                )
+                for measure in measure_map
+            ],
+            dtype=MEASURE_DTYPE,
+        )
+        tempos = np.array(list(tempo_map), dtype=TEMPO_DTYPE)
+        n_events = np.bincount(events["track"], minlength=len(gp_stream.tracks))
+        metadata = {
+            "title": str(gp_stream.title),
+            "artist": str(gp_stream.artist),
+            "tracks": [
+                {
+                    "name": track.name,
+                    "instrument": track.channel.instrument,
+                    "is_percussion": bool(track.isPercussionTrack),
+                    "n_events": int(n_events[idx_track]),
+                }
+                for idx_track, track in enumerate(gp_stream.tracks)
+            ],
+        }
+        return cls(events, measures, tempos, metadata)
+
+
+def _chunk_path(folder: Path, idx_chunk: int, kind: str) -> Path:
+    return folder / f"chunk_{idx_chunk:05d}.{kind}.npy"
+
+
+class CorpusWriter:
+    """Writes songs into a corpus store folder.
+
+    Songs are gathered in memory until chunk_size event rows, then written
+    as one .npy file per kind of array, which readers can memory-map. The
+    index, written on close, locates every song, track and table in the
+    chunks.
+    """
+
+    def __init__(self, folder: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.songs: List[dict] = []
+        self.failures: Dict[str, str] = {}
+        self.n_chunks = 0
+        self._pending: Dict[str, List[np.ndarray]] = {kind: [] for kind in ARRAY_KINDS}
+        self._offsets = {kind: 0 for kind in ARRAY_KINDS}
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, name: str, song_arrays: SongArrays) -> int:
+        """Adds a song and returns its index in the store."""
+        entry = {"name": name, "chunk": self.n_chunks}
+        entry.update(song_arrays.metadata)
+        for kind in ARRAY_KINDS:
+            array = getattr(song_arrays, kind)
+            start = self._offsets[kind]
+            entry[kind] = [start, start + len(array)]
+            self._offsets[kind] += len(array)
+            self._pending[kind].append(array)
+        track_start = entry["events"][0]
+        entry["tracks"] = [dict(track) for track in entry["tracks"]]
+        for track in entry["tracks"]:
+            n_events = track.pop("n_events")
+            track["events"] = [track_start, track_start + n_events]
+            track_start += n_events
+        self.songs.append(entry)
+        if self._offsets["events"] >= self.chunk_size:
+            self._write_chunk()
+        return len(self.songs) - 1
+
+    def add_failure(self, name: str, error: str) -> None:
+        self.failures[name] = error
+
+    def _write_chunk(self) -> None:
+        if not self._pending["events"]:
+            return
+        for kind, arrays in self._pending.items():
+            np.save(
+                _chunk_path(self.folder, self.n_chunks, kind), np.concatenate(arrays)
+            )
+        self.n_chunks += 1
+        self._pending = {kind: [] for kind in ARRAY_KINDS}
+        self._offsets = {kind: 0 for kind in ARRAY_KINDS}
+
+    def close(self) -> None:
+        self._write_chunk()
+        index = {
+            "version": CORPUS_VERSION,
+            "ticks_per_quarter": QUARTER_TIME_IN_TICKS,
+            "n_chunks": self.n_chunks,
+            "songs": self.songs,
+            "failures": self.failures,
+        }
+        # Written aside and moved, so a store is never left with half an index
+        index_path = self.folder / INDEX_NAME
+        temporary_path = index_path.with_suffix(".tmp")
+        with open(temporary_path, "w") as fp:
+            json.dump(index, fp)
+        os.replace(temporary_path, index_path)
+
+
+class CorpusStore:
+    """Reads a corpus store written by CorpusWriter.
+
+    Opening only reads the index. Chunks are memory-mapped the first time
+    one of their songs is read, so fetching a song, a track or a measure
+    range only touches the pages holding it. Songs are given by index or
+    by name.
+    """
+
+    def __init__(self, folder: Path, mmap_mode: Optional[str] = "r") -> None:
+        self.folder = Path(folder)
+        self.mmap_mode = mmap_mode
+        with open(self.folder / INDEX_NAME) as fp:
+            index = json.load(fp)
+        if index["version"] != CORPUS_VERSION:
+            raise ValueError(f"Unsupported corpus store version: {index['version']}")
+        self.ticks_per_quarter = index["ticks_per_quarter"]
+        self.songs: List[dict] = index["songs"]
+        self.failures: Dict[str, str] = index["failures"]
+        self._song_indexes = {song["name"]: idx for idx, song in enumerate(self.songs)}
+        self._chunks: Dict[Tuple[int, str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.songs)
+
+    def __iter__(self) -> Iterator[str]:
+        return (song["name"] for song in self.songs)
+
+    def _song(self, song: SongKey) -> dict:
+        if isinstance(song, str):
+            song = self._song_indexes[song]
+        return self.songs[song]
+
+    def _array(self, entry: dict, kind: str) -> np.ndarray:
+        key = (entry["chunk"], kind)
+        if key not in self._chunks:
+            self._chunks[key] = np.load(
+                _chunk_path(self.folder, entry["chunk"], kind), mmap_mode=self.mmap_mode
+            )
+        return self._chunks[key]
+
+    def _slice(self, entry: dict, kind: str, rows: Sequence[int]) -> np.ndarray:
+        start, stop = rows
+        return self._array(entry, kind)[start:stop]
+
+    def metadata(self, song: SongKey) -> dict:
+        """Returns the name, title, artist and tracks of a song."""
+        entry = self._song(song)
+        return {
+            "name": entry["name"],
+            "title": entry["title"],
+            "artist": entry["artist"],
+            "tracks": [
+                {key: value for key, value in track.items() if key != "events"}
+                for track in entry["tracks"]
+            ],
+        }
+
+    def events(
+        self,
+        song: SongKey,
+        tracks: Optional[Sequence[int]] = None,
+        measures: Optional[Tuple[int, int]] = None,
+    ) -> NoteEventTable:
+        """Returns the events of a song, optionally of some tracks and measures.
+
+        measures is a (first, stop) range of measure indexes. Without tracks
+        nor measures, the events are a read-only view of the store.
+        """
+        entry = self._song(song)
+        if tracks is None and measures is None:
+            return NoteEventTable(self._slice(entry, "events", entry["events"]))
+        if tracks is None:
+            tracks = range(len(entry["tracks"]))
+        track_events = []
+        for idx_track in tracks:
+            events = self._slice(entry, "events", entry["tracks"][idx_track]["events"])
+            if measures is not None:
+                start, stop = np.searchsorted(events["measure"], measures)
+                events = events[start:stop]
+            track_events.append(events)
+        if not track_events:
+            return NoteEventTable(np.zeros(0, dtype=NOTE_EVENT_DTYPE))
+        return NoteEventTable(np.concatenate(track_events))
+
+    def measures(self, song: SongKey) -> np.ndarray:
+        entry = self._song(song)
+        return self._slice(entry, "measures", entry["measures"])
+
+    def tempos(self, song: SongKey) -> np.ndarray:
+        entry = self._song(song)
+        return self._slice(entry, "tempos", entry["tempos"])
+
+    def time_signatures(self, song: SongKey) -> np.ndarray:
+        """Returns the measures of a song where the time signature changes."""
+        measures = self.measures(song)
+        is_change = np.ones(len(measures), dtype=bool)
+        is_change[1:] = (measures["numerator"][1:] != measures["numerator"][:-1]) | (
+            measures["denominator"][1:] != measures["denominator"][:-1]
+        )
+        return measures[["start", "numerator", "denominator"]][is_change]
+
+
+def _song_arrays(path: Path, gp_stream: gm.models.Song) -> SongArrays:
+    return SongArrays.from_song(gp_stream)
+
+
+def build_corpus(
+    inputs: Iterable[Path],
+    folder: Path,
+    n_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """Parses the GuitarPro files found in inputs into a corpus store.
+
+    Files are parsed by a PipelinedLoader, and only their arrays come back
+    from the workers. Songs are named by their path and stored in the
+    order they finish. Files that fail are listed in the index.
+    """
+    gp_paths = find_guitarpro_files(inputs)
+    with CorpusWriter(folder, chunk_size) as writer:
+        for result in PipelinedLoader(gp_paths, _song_arrays, n_workers=n_workers):
+            if result.error is not None:
+                writer.add_failure(str(result.path), result.error)
+                continue
+            writer.add(str(result.path), result.value)
+    return {
+        "total": len(gp_paths),
+        "succeeded": len(writer.songs),
+        "failed": len(writer.failures),
+        "n_chunks": writer.n_chunks,
+    }
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Parse GuitarPro files into a columnar corpus store."
+    )
+    parser.add_argument("inputs", nargs="+", type=Path)
+    parser.add_argument("-o", "--output-folder", type=Path, required=True)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parsed_args = parser.parse_args(args)
+
+    summary = build_corpus(
+        parsed_args.inputs,
+        parsed_args.output_folder,
+        n_workers=parsed_args.workers,
+        chunk_size=parsed_args.chunk_size,
+    )
+    print(
+        f"Stored {summary['succeeded']}/{summary['total']} songs in "
+        f"{summary['n_chunks']} chunks, {summary['failed']} failed."
+    )
+
+
+if __name__ == "__main__":
+    main()
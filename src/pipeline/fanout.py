@@ -0,0 +1,292 @@
+import argparse
+import io
+import json
+import traceback
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+import guitarpro as gm
+import numpy as np
+from music21.stream import Score
+
+from src.loading.serialization import Music21Serializer, Target, open_target
+from src.pipeline.batchconvertor import ENGINES, find_guitarpro_files
+from src.pipeline.corpusstore import SongArrays
+from src.pipeline.pipelinedloader import PipelinedLoader
+from src.profiling.conversionstats import ConversionStats, timer
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+from src.transforming.noteeventtable import QUARTER_TIME_IN_TICKS
+from src.transforming.tokenizer import GuitarProToTokensConvertor
+
+
+class SongViews:
+    """The representations of a song that sinks write from.
+
+    Each view is built the first time a sink asks for it and shared by the
+    following ones, so the song is converted once however many sinks need
+    it. A view that fails to build fails every sink asking for it, without
+    being built again.
+    """
+
+    def __init__(
+        self,
+        gp_stream: gm.models.Song,
+        unroll_repeats: bool = False,
+        stats: Optional[ConversionStats] = None,
+    ) -> None:
+        self.gp_stream = gp_stream
+        self.unroll_repeats = unroll_repeats
+        self.stats = stats
+        # Name of each view built, with its value or the error building it
+        self._views: Dict[str, tuple] = {}
+
+    def _view(self, name: str, build: Callable[[], Any]) -> Any:
+        if name not in self._views:
+            try:
+                with timer(self.stats, name):
+                    self._views[name] = (build(), None)
+            except Exception as error:
+                self._views[name] = (None, error)
+        value, error = self._views[name]
+        if error is not None:
+            raise error
+        return value
+
+    def m21_score(self) -> Score:
+        return self._view(
+            "convert",
+            lambda: GuitarProToMusic21Convertor(
+                self.gp_stream, stats=self.stats, unroll_repeats=self.unroll_repeats
+            ).apply(),
+        )
+
+    def arrays(self) -> SongArrays:
+        return self._view("arrays", lambda: SongArrays.from_song(self.gp_stream))
+
+
+class OutputSink(ABC):
+    """Writes one output format of a song from its SongViews."""
+
+    name = ""
+    extension = ""
+
+    @abstractmethod
+    def dumps(self, views: SongViews) -> bytes:
+        pass
+
+
+class MidiSink(OutputSink):
+    """Writes the MIDI file of the music21 score, or of the midi engine."""
+
+    name = "midi"
+    extension = ".mid"
+
+    def __init__(self, engine: str = "music21", midi_backend: str = "fast") -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}")
+        self.engine = engine
+        self.serializer = Music21Serializer("midi", midi_backend=midi_backend)
+
+    def dumps(self, views: SongViews) -> bytes:
+        if self.engine == "midi":
+            return (
+                GuitarProToMidiConvertor(
+                    views.gp_stream, unroll_repeats=views.unroll_repeats
+                )
+                .apply()
+                .to_bytes()
+            )
+        return self.serializer.dumps(views.m21_score())
+
+
+class MusicXmlSink(OutputSink):
+    name = "musicxml"
+    extension = ".musicxml"
+
+    def __init__(self) -> None:
+        self.serializer = Music21Serializer("musicxml")
+
+    def dumps(self, views: SongViews) -> bytes:
+        return self.serializer.dumps(views.m21_score())
+
+
+class EventDumpSink(OutputSink):
+    """Writes the tracks, tempos, measures and note events of a song as JSON.
+
+    Arrays are written column by column, as lists of values.
+    """
+
+    name = "events"
+    extension = ".json"
+
+    def dumps(self, views: SongViews) -> bytes:
+        song_arrays = views.arrays()
+        dump = {"ticks_per_quarter": QUARTER_TIME_IN_TICKS}
+        dump.update(song_arrays.metadata)
+        for kind in ("tempos", "measures", "events"):
+            array = getattr(song_arrays, kind)
+            dump[kind] = {
+                column: array[column].tolist() for column in array.dtype.names
+            }
+        return json.dumps(dump).encode()
+
+
+class TokenSink(OutputSink):
+    """Writes the token sequence of a song as a NumPy .npy file."""
+
+    name = "tokens"
+    extension = ".tokens.npy"
+
+    def dumps(self, views: SongViews) -> bytes:
+        fp = io.BytesIO()
+        np.save(fp, GuitarProToTokensConvertor(views.gp_stream).apply())
+        return fp.getvalue()
+
+
+SINKS = {sink.name: sink for sink in (MidiSink, MusicXmlSink, EventDumpSink, TokenSink)}
+
+
+class FanOut:
+    """Writes a song to every registered sink from a single conversion.
+
+    Sinks are written in registration order from shared SongViews. Each
+    sink is written to memory before its target, so a sink that fails
+    leaves no partial output and does not stop the others.
+    """
+
+    def __init__(
+        self,
+        sinks: Sequence[OutputSink] = (),
+        unroll_repeats: bool = False,
+        stats: Optional[ConversionStats] = None,
+    ) -> None:
+        self.sinks: List[OutputSink] = []
+        self.unroll_repeats = unroll_repeats
+        self.stats = stats
+        for sink in sinks:
+            self.register(sink)
+
+    def register(self, sink: OutputSink) -> None:
+        if any(registered.name == sink.name for registered in self.sinks):
+            raise ValueError(f"A sink named {sink.name} is already registered")
+        self.sinks.append(sink)
+
+    def targets(self, output_stem: Path) -> Dict[str, Path]:
+        """Returns the path of each sink, its extension appended to output_stem."""
+        return {
+            sink.name: Path(str(output_stem) + sink.extension) for sink in self.sinks
+        }
+
+    def run(
+        self, gp_stream: gm.models.Song, targets: Mapping[str, Target]
+    ) -> Dict[str, Optional[str]]:
+        """Writes the sinks with a target and returns their errors, None if ok."""
+        views = SongViews(gp_stream, self.unroll_repeats, self.stats)
+        errors = {}
+        for sink in self.sinks:
+            if sink.name not in targets:
+                continue
+            try:
+                with timer(self.stats, f"dump_{sink.name}"):
+                    data = sink.dumps(views)
+                with open_target(targets[sink.name]) as fp:
+                    fp.write(data)
+                errors[sink.name] = None
+            except Exception:
+                errors[sink.name] = traceback.format_exc()
+        return errors
+
+
+class _PublishSong:
+    """Writes every format of a song in a worker, next to its output stem."""
+
+    def __init__(
+        self,
+        output_stems: Dict[Path, Path],
+        formats: Sequence[str],
+        unroll_repeats: bool,
+    ) -> None:
+        self.output_stems = output_stems
+        self.formats = formats
+        self.unroll_repeats = unroll_repeats
+
+    def __call__(self, path: Path, gp_stream: gm.models.Song) -> Dict[str, str]:
+        fan_out = FanOut(
+            [SINKS[name]() for name in self.formats], unroll_repeats=self.unroll_repeats
+        )
+        output_stem = self.output_stems[path]
+        output_stem.parent.mkdir(parents=True, exist_ok=True)
+        errors = fan_out.run(gp_stream, fan_out.targets(output_stem))
+        return {name: error for name, error in errors.items() if error is not None}
+
+
+def publish(
+    inputs: Sequence[Path],
+    output_folder: Path,
+    formats: Sequence[str] = tuple(SINKS),
+    n_workers: Optional[int] = None,
+    unroll_repeats: bool = False,
+) -> dict:
+    """Writes every format of the GuitarPro files found in inputs.
+
+    Outputs are named as by the batch convertor, each format appending its
+    extension. Returns the number of songs and the errors of those with a
+    format that failed.
+    """
+    output_folder = Path(output_folder)
+    output_stems = {}
+    for input_path in map(Path, inputs):
+        for gp_path in find_guitarpro_files([input_path]):
+            relative_path = (
+                gp_path.relative_to(input_path)
+                if input_path.is_dir()
+                else Path(gp_path.name)
+            )
+            output_stems[gp_path] = output_folder / relative_path
+
+    errors = {}
+    loader = PipelinedLoader(
+        list(output_stems),
+        _PublishSong(output_stems, formats, unroll_repeats),
+        n_workers=n_workers,
+    )
+    for result in loader:
+        if result.error is not None:
+            errors[str(result.path)] = {name: result.error for name in formats}
+        elif result.value:
+            errors[str(result.path)] = result.value
+    return {"total": len(output_stems), "failed": len(errors), "errors": errors}
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write several formats of GuitarPro files from one conversion."
+    )
+    parser.add_argument("inputs", nargs="+", type=Path)
+    parser.add_argument("-o", "--output-folder", type=Path, required=True)
+    parser.add_argument(
+        "-f", "--formats", nargs="+", default=list(SINKS), choices=SINKS
+    )
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--unroll-repeats", action="store_true")
+    parsed_args = parser.parse_args(args)
+
+    summary = publish(
+        parsed_args.inputs,
+        parsed_args.output_folder,
+        formats=parsed_args.formats,
+        n_workers=parsed_args.workers,
+        unroll_repeats=parsed_args.unroll_repeats,
+    )
+    print(
+        f"Published {summary['total'] - summary['failed']}/{summary['total']} "
+        f"songs in {', '.join(parsed_args.formats)}."
+    )
+    for path, errors in summary["errors"].items():
+        print(f"{path}: {', '.join(errors)} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import queue
+import threading
+import traceback
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Iterable, Iterator, NamedTuple, Optional
+
+import guitarpro as gm
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.pipeline.workerpool import THREAD_SAFE_START_METHOD, WorkerPool
+
+# Files read ahead of the workers, waiting to be parsed
+DEFAULT_PREFETCH = 8
+# How often a reader blocked on a full queue checks that it should stop
+STOP_POLL_INTERVAL = 0.1
+
+# Put in the read queue by each reader once it runs out of files
+_END_OF_FILES = object()
+
+
+class LoadResult(NamedTuple):
+    """A file loaded by a PipelinedLoader.
+
+    value is the Song, or what the loader function returned for it. When
+    reading, parsing or the function fails, value is None and error holds
+    the traceback.
+    """
+
+    path: Path
+    value: Any
+    error: Optional[str]
+    elapsed: float
+
+
+class _ParseFile:
+    """Parses the bytes of a file in a worker and applies function to the Song."""
+
+    def __init__(self, function: Optional[Callable[[Path, gm.models.Song], Any]]):
+        self.function = function
+
+    def __call__(self, task):
+        path, data = task
+        gp_stream = PyGuitarProSerializer().load(data)
+        if self.function is None:
+            return gp_stream
+        return self.function(path, gp_stream)
+
+
+class PipelinedLoader:
+    """Reads, parses and converts GuitarPro files as a pipeline.
+
+    Reader threads read upcoming files while worker processes parse the
+    ones already read and run function(path, song) on them, so reads wait
+    on storage while the CPUs keep busy. Iterating yields a LoadResult per
+    file in completion order.
+
+    Reads block once prefetch files are waiting to be parsed, so at most
+    prefetch + n_readers + n_workers files are held in memory, however
+    many paths are given. function must be picklable, and its results are
+    sent back from the workers: returning something smaller than the Song
+    avoids copying the Song between processes.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[Path],
+        function: Optional[Callable[[Path, gm.models.Song], Any]] = None,
+        n_workers: Optional[int] = None,
+        n_readers: int = 1,
+        prefetch: int = DEFAULT_PREFETCH,
+        timeout: Optional[float] = None,
+        max_tasks_per_worker: Optional[int] = None,
+    ) -> None:
+        if n_readers < 1:
+            raise ValueError("At least one reader is needed")
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        self.paths = paths
+        self.function = function
+        self.n_workers = n_workers
+        self.n_readers = n_readers
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+
+    def __iter__(self) -> Iterator[LoadResult]:
+        read_queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        paths = iter(self.paths)
+        paths_lock = threading.Lock()
+        readers = [
+            threading.Thread(
+                target=_read_files,
+                args=(paths, paths_lock, read_queue, stop),
+                daemon=True,
+            )
+            for _ in range(self.n_readers)
+        ]
+        for reader in readers:
+            reader.start()
+        # Files that could not be read, reported between the parsed ones
+        read_failures: Deque[LoadResult] = deque()
+
+        def read_files() -> Iterator[tuple]:
+            n_finished_readers = 0
+            while n_finished_readers < len(readers):
+                item = read_queue.get()
+                if item is _END_OF_FILES:
+                    n_finished_readers += 1
+                    continue
+                path, data, error = item
+                if error is not None:
+                    read_failures.append(LoadResult(path, None, error, 0.0))
+                    continue
+                yield path, data
+
+        try:
+            with WorkerPool(
+                _ParseFile(self.function),
+                n_workers=self.n_workers,
+                timeout=self.timeout,
+                max_tasks_per_worker=self.max_tasks_per_worker,
+                # Workers start, and are replaced, while the readers run
+                start_method=THREAD_SAFE_START_METHOD,
+            ) as pool:
+                for result in pool.imap_unordered(read_files()):
+                    while read_failures:
+                        yield read_failures.popleft()
+                    path, _ = result.task
+                    yield LoadResult(path, result.value, result.error, result.elapsed)
+            while read_failures:
+                yield read_failures.popleft()
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+
+
+def _read_files(
+    paths: Iterator[Path],
+    paths_lock: threading.Lock,
+    read_queue: queue.Queue,
+    stop: threading.Event,
+) -> None:
+    """Reads files until paths runs out, blocking while read_queue is full."""
+    try:
+        while not stop.is_set():
+            with paths_lock:
+                path = next(paths, None)
+            if path is None:
+                return
+            path = Path(path)
+            try:
+                data, error = path.read_bytes(), None
+            except OSError:
+                data, error = None, traceback.format_exc()
+            _put(read_queue, (path, data, error), stop)
+    finally:
+        _put(read_queue, _END_OF_FILES, stop)
+
+
+def _put(read_queue: queue.Queue, item: Any, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            read_queue.put(item, timeout=STOP_POLL_INTERVAL)
+            return
+        except queue.Full:
+            continue
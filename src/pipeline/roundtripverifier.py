@@ -0,0 +1,437 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import guitarpro as gm
+import numpy as np
+
+from src.loading.midifile import MidiFile
+from src.loading.serialization import MIDI_BACKENDS, Music21Serializer
+from src.pipeline.batchconvertor import ENGINES, find_guitarpro_files
+from src.pipeline.pipelinedloader import PipelinedLoader
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+from src.transforming.measuremap import MeasureMap
+from src.transforming.noteeventtable import QUARTER_TIME_IN_TICKS, NoteEventTable
+from src.transforming.tempomap import TempoMap
+
+ROUND_TRIP_DTYPE = np.dtype(
+    [
+        ("track", np.uint16),
+        ("start", np.int64),
+        ("duration", np.int64),
+        ("pitch", np.int16),
+    ]
+)
+# Ticks a duration can be off by, from rescaling the MIDI ticks
+DEFAULT_DURATION_TOLERANCE = 1
+# Farthest a note can move and still count as shifted rather than missing
+DEFAULT_MAX_SHIFT = 4 * QUARTER_TIME_IN_TICKS
+# Mismatched notes kept as examples for each kind of mismatch
+DEFAULT_MAX_EXAMPLES = 5
+# Starts are packed under the (track, pitch) group in a single int64 key
+_START_BITS = 40
+
+MISMATCH_KINDS = ("wrong_duration", "dropped_tie", "shifted", "missing", "extra")
+MISMATCH_COUNTS = tuple(f"n_{kind}" for kind in MISMATCH_KINDS)
+
+
+class RoundTripReport(NamedTuple):
+    """How the notes of a converted MIDI file compare to the source song.
+
+    Notes are matched on track, start and pitch. A matched note with
+    another duration is a wrong_duration; when the MIDI plays the rest of
+    it as a new note right after, that new note is a dropped_tie. Notes
+    left over on both sides with the same track and pitch are shifted,
+    which is how a missing filler rest shows up: the notes after it start
+    early. The others are missing from the MIDI, or extra in it.
+    """
+
+    n_expected: int
+    n_actual: int
+    n_matched: int
+    n_wrong_duration: int
+    n_dropped_tie: int
+    n_shifted: int
+    n_missing: int
+    n_extra: int
+    # Some [track, start, duration, pitch] rows of each kind of mismatch,
+    # with the shift in ticks appended for shifted notes
+    examples: Dict[str, List[List[int]]]
+
+    @property
+    def ok(self) -> bool:
+        return self.n_matched == self.n_expected == self.n_actual
+
+    def to_dict(self) -> dict:
+        report = self._asdict()
+        report["ok"] = self.ok
+        return report
+
+
+def source_notes(gp_stream: gm.models.Song, unroll_repeats: bool = False) -> np.ndarray:
+    """Returns the notes the song should sound, ties merged, sorted.
+
+    With unroll_repeats, the notes of repeats and alternate endings are
+    played out.
+    """
+    table = NoteEventTable.from_song(gp_stream)
+    if unroll_repeats:
+        tempo_map = TempoMap.from_song(gp_stream)
+        measure_map, _ = MeasureMap.from_song(gp_stream, tempo_map).unrolled(tempo_map)
+        table = table.unrolled(measure_map)
+    table = table.merge_ties()
+    events = table.events[table.sounding]
+    notes = np.empty(len(events), dtype=ROUND_TRIP_DTYPE)
+    for column in ("track", "start", "duration"):
+        notes[column] = events[column]
+    notes["pitch"] = np.clip(events["pitch"], 0, 127)
+    return _sort_notes(notes)
+
+
+def midi_notes(data: bytes) -> np.ndarray:
+    """Returns the notes of a MIDI file in song ticks, sorted.
+
+    The first track is the conductor track, so MIDI track i + 1 holds the
+    notes of song track i.
+    """
+    midi_file = MidiFile.from_bytes(data)
+    rows = [
+        (idx_track, note.start, note.duration, note.pitch)
+        for idx_track, midi_track in enumerate(midi_file.tracks[1:])
+        for note in midi_track.notes()
+    ]
+    notes = np.array(rows, dtype=ROUND_TRIP_DTYPE)
+    scale = QUARTER_TIME_IN_TICKS / midi_file.ticks_per_quarter
+    ends = np.rint((notes["start"] + notes["duration"]) * scale).astype(np.int64)
+    notes["start"] = np.rint(notes["start"] * scale)
+    notes["duration"] = ends - notes["start"]
+    return _sort_notes(notes)
+
+
+def _sort_notes(notes: np.ndarray) -> np.ndarray:
+    return notes[np.lexsort((notes["pitch"], notes["start"], notes["track"]))]
+
+
+def _row_ids(*tables: np.ndarray) -> List[np.ndarray]:
+    """Numbers the rows of tables sharing the same fields, so equal rows
+    get equal ids across tables."""
+    inverse = np.unique(np.concatenate(tables), return_inverse=True)[1].ravel()
+    splits = np.cumsum([len(table) for table in tables])[:-1]
+    return np.split(inverse, splits)
+
+
+def _note_keys(notes: np.ndarray, starts: Optional[np.ndarray] = None) -> np.ndarray:
+    """Returns (track, start, pitch, occurrence) of sorted notes.
+
+    occurrence numbers the notes sharing a track, start and pitch, so each
+    key is unique and unison notes are matched one to one.
+    """
+    keys = np.empty(
+        len(notes),
+        dtype=[
+            ("track", np.uint16),
+            ("start", np.int64),
+            ("pitch", np.int16),
+            ("occurrence", np.int64),
+        ],
+    )
+    keys["track"] = notes["track"]
+    keys["start"] = notes["start"] if starts is None else starts
+    keys["pitch"] = notes["pitch"]
+    positions = np.arange(len(notes))
+    is_first = np.ones(len(notes), dtype=bool)
+    is_first[1:] = (
+        (keys["track"][1:] != keys["track"][:-1])
+        | (keys["start"][1:] != keys["start"][:-1])
+        | (keys["pitch"][1:] != keys["pitch"][:-1])
+    )
+    keys["occurrence"] = positions - np.maximum.accumulate(
+        np.where(is_first, positions, 0)
+    )
+    return keys
+
+
+def compare_notes(
+    expected: np.ndarray,
+    actual: np.ndarray,
+    duration_tolerance: int = DEFAULT_DURATION_TOLERANCE,
+    max_shift: int = DEFAULT_MAX_SHIFT,
+    max_examples: int = DEFAULT_MAX_EXAMPLES,
+) -> RoundTripReport:
+    """Aligns the sorted notes of the source and of the MIDI file.
+
+    Notes are aligned with sorts and searches over whole arrays, in
+    O(n log n), without comparing notes pairwise.
+    """
+    expected_ids, actual_ids = _row_ids(_note_keys(expected), _note_keys(actual))
+    _, idx_expected, idx_actual = np.intersect1d(
+        expected_ids, actual_ids, assume_unique=True, return_indices=True
+    )
+    duration_error = np.abs(
+        actual["duration"][idx_actual] - expected["duration"][idx_expected]
+    )
+    is_wrong_duration = duration_error > duration_tolerance
+    unmatched_expected = np.ones(len(expected), dtype=bool)
+    unmatched_expected[idx_expected] = False
+    unmatched_actual = np.ones(len(actual), dtype=bool)
+    unmatched_actual[idx_actual] = False
+
+    # A left over note starting where a note of the same pitch ends
+    actual_ends = actual["start"] + actual["duration"]
+    extra_ids, end_ids = _row_ids(
+        _note_keys(actual)[["track", "start", "pitch"]],
+        _note_keys(actual, actual_ends)[["track", "start", "pitch"]],
+    )
+    is_dropped_tie = unmatched_actual & np.isin(extra_ids, end_ids)
+    unmatched_actual &= ~is_dropped_tie
+
+    missing = np.flatnonzero(unmatched_expected)
+    extra = np.flatnonzero(unmatched_actual)
+    shifts, targets = _nearest_shifts(expected[missing], actual, extra)
+    is_shifted = (targets >= 0) & (np.abs(shifts) <= max_shift)
+    # Each extra note stands for at most one missing note, the nearest one,
+    # the other missing notes stay missing
+    shifted = np.flatnonzero(is_shifted)
+    shifted = shifted[np.argsort(np.abs(shifts[shifted]), kind="stable")]
+    _, first_of_target = np.unique(targets[shifted], return_index=True)
+    is_shifted[:] = False
+    is_shifted[shifted[first_of_target]] = True
+    is_shift_target = np.zeros(len(actual), dtype=bool)
+    is_shift_target[targets[is_shifted]] = True
+    is_extra = unmatched_actual & ~is_shift_target
+
+    shifted_rows = [
+        row + [shift]
+        for row, shift in zip(
+            _examples(expected[missing[is_shifted]], max_examples),
+            shifts[is_shifted][:max_examples].tolist(),
+        )
+    ]
+    examples = {
+        "wrong_duration": _examples(
+            expected[idx_expected[is_wrong_duration]], max_examples
+        ),
+        "dropped_tie": _examples(actual[is_dropped_tie], max_examples),
+        "shifted": shifted_rows,
+        "missing": _examples(expected[missing[~is_shifted]], max_examples),
+        "extra": _examples(actual[is_extra], max_examples),
+    }
+    return RoundTripReport(
+        n_expected=len(expected),
+        n_actual=len(actual),
+        n_matched=int(np.count_nonzero(~is_wrong_duration)),
+        n_wrong_duration=int(np.count_nonzero(is_wrong_duration)),
+        n_dropped_tie=int(np.count_nonzero(is_dropped_tie)),
+        n_shifted=int(np.count_nonzero(is_shifted)),
+        n_missing=int(np.count_nonzero(~is_shifted)),
+        n_extra=int(np.count_nonzero(is_extra)),
+        examples={kind: rows for kind, rows in examples.items() if rows},
+    )
+
+
+def _nearest_shifts(
+    missing_notes: np.ndarray, actual: np.ndarray, extra: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds the nearest extra note of the same track and pitch of each
+    missing note.
+
+    Returns the shift in ticks from each missing note to that note, and
+    its row in actual, -1 when there is none.
+    """
+    shifts = np.zeros(len(missing_notes), dtype=np.int64)
+    targets = np.full(len(missing_notes), -1)
+    if len(missing_notes) == 0 or len(extra) == 0:
+        return shifts, targets
+    missing_groups, extra_groups = _row_ids(
+        missing_notes[["track", "pitch"]], actual[["track", "pitch"]][extra]
+    )
+    extra_keys = (extra_groups.astype(np.int64) << _START_BITS) + actual["start"][extra]
+    order = np.argsort(extra_keys, kind="stable")
+    extra, extra_keys, extra_groups = (
+        extra[order],
+        extra_keys[order],
+        extra_groups[order],
+    )
+    missing_keys = (missing_groups.astype(np.int64) << _START_BITS) + missing_notes[
+        "start"
+    ]
+    positions = np.searchsorted(extra_keys, missing_keys)
+    # The nearest note is just before or just after the insertion position
+    for candidates in (positions - 1, positions):
+        is_valid = (candidates >= 0) & (candidates < len(extra))
+        candidates = np.clip(candidates, 0, len(extra) - 1)
+        is_valid &= extra_groups[candidates] == missing_groups
+        candidate_shifts = actual["start"][extra[candidates]] - missing_notes["start"]
+        is_nearer = is_valid & (
+            (targets < 0) | (np.abs(candidate_shifts) < np.abs(shifts))
+        )
+        shifts = np.where(is_nearer, candidate_shifts, shifts)
+        targets = np.where(is_nearer, extra[candidates], targets)
+    return shifts, targets
+
+
+def _examples(notes: np.ndarray, max_examples: int) -> List[List[int]]:
+    return [
+        [int(value) for value in row]
+        for row in notes[:max_examples][list(ROUND_TRIP_DTYPE.names)].tolist()
+    ]
+
+
+def convert_to_midi(
+    gp_stream: gm.models.Song,
+    engine: str = "music21",
+    midi_backend: str = "fast",
+    unroll_repeats: bool = False,
+) -> bytes:
+    """Returns the MIDI file the engine writes for the song."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unsupported engine: {engine}")
+    if engine == "midi":
+        return (
+            GuitarProToMidiConvertor(gp_stream, unroll_repeats=unroll_repeats)
+            .apply()
+            .to_bytes()
+        )
+    m21_score = GuitarProToMusic21Convertor(
+        gp_stream, unroll_repeats=unroll_repeats
+    ).apply()
+    return Music21Serializer(midi_backend=midi_backend).dumps(m21_score)
+
+
+def verify_song(
+    gp_stream: gm.models.Song,
+    engine: str = "music21",
+    midi_backend: str = "fast",
+    unroll_repeats: bool = False,
+    max_examples: int = DEFAULT_MAX_EXAMPLES,
+) -> RoundTripReport:
+    """Converts the song to MIDI and compares its notes with the song.
+
+    music21 expands the repeat barlines of a score its own way when it
+    writes MIDI, which the source notes cannot follow, so repeats are
+    always played out with the music21 engine.
+    """
+    if engine == "music21":
+        unroll_repeats = True
+    data = convert_to_midi(gp_stream, engine, midi_backend, unroll_repeats)
+    return compare_notes(
+        source_notes(gp_stream, unroll_repeats),
+        midi_notes(data),
+        max_examples=max_examples,
+    )
+
+
+class _VerifySong:
+    """Verifies a song in a worker, sending back only its report."""
+
+    def __init__(
+        self, engine: str, midi_backend: str, unroll_repeats: bool, max_examples: int
+    ) -> None:
+        self.engine = engine
+        self.midi_backend = midi_backend
+        self.unroll_repeats = unroll_repeats
+        self.max_examples = max_examples
+
+    def __call__(self, path: Path, gp_stream: gm.models.Song) -> dict:
+        return verify_song(
+            gp_stream,
+            self.engine,
+            self.midi_backend,
+            self.unroll_repeats,
+            self.max_examples,
+        ).to_dict()
+
+
+def verify_files(
+    inputs: Iterable[Path],
+    engine: str = "music21",
+    midi_backend: str = "fast",
+    unroll_repeats: bool = False,
+    n_workers: Optional[int] = None,
+    max_examples: int = DEFAULT_MAX_EXAMPLES,
+) -> dict:
+    """Verifies the conversion of the GuitarPro files found in inputs.
+
+    Returns the number of files that match, that mismatch and that fail
+    to convert, the mismatches added up over every file, and the report
+    of each mismatching file and the error of each failing one.
+    """
+    gp_paths = find_guitarpro_files(inputs)
+    totals = dict.fromkeys(("n_expected", "n_matched") + MISMATCH_COUNTS, 0)
+    mismatches = {}
+    errors = {}
+    for result in PipelinedLoader(
+        gp_paths,
+        _VerifySong(engine, midi_backend, unroll_repeats, max_examples),
+        n_workers=n_workers,
+    ):
+        if result.error is not None:
+            errors[str(result.path)] = result.error
+            continue
+        report = result.value
+        for field in totals:
+            totals[field] += report[field]
+        if not report["ok"]:
+            mismatches[str(result.path)] = report
+    return {
+        "total": len(gp_paths),
+        "passed": len(gp_paths) - len(mismatches) - len(errors),
+        "mismatched": len(mismatches),
+        "failed": len(errors),
+        "totals": totals,
+        "mismatches": mismatches,
+        "errors": errors,
+    }
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Check that converted MIDI files play the notes of GuitarPro files."
+    )
+    parser.add_argument("inputs", nargs="+", type=Path)
+    parser.add_argument("-e", "--engine", default="music21", choices=ENGINES)
+    parser.add_argument("--midi-backend", default="fast", choices=MIDI_BACKENDS)
+    parser.add_argument(
+        "--unroll-repeats",
+        action="store_true",
+        help="Play out repeats, always done with the music21 engine",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--max-examples", type=int, default=DEFAULT_MAX_EXAMPLES)
+    parser.add_argument(
+        "-r", "--report", type=Path, default=None, help="Write the full summary as JSON"
+    )
+    parsed_args = parser.parse_args(args)
+
+    summary = verify_files(
+        parsed_args.inputs,
+        engine=parsed_args.engine,
+        midi_backend=parsed_args.midi_backend,
+        unroll_repeats=parsed_args.unroll_repeats,
+        n_workers=parsed_args.workers,
+        max_examples=parsed_args.max_examples,
+    )
+    if parsed_args.report is not None:
+        parsed_args.report.write_text(json.dumps(summary, indent=2))
+    print(
+        f"Verified {summary['total']} files: {summary['passed']} passed, "
+        f"{summary['mismatched']} mismatched, {summary['failed']} failed."
+    )
+    totals = summary["totals"]
+    print(
+        ", ".join(
+            f"{totals[field]} {field[2:]}" for field in ("n_matched",) + MISMATCH_COUNTS
+        )
+        + f" of {totals['n_expected']} notes"
+    )
+    for path, report in summary["mismatches"].items():
+        counts = ", ".join(
+            f"{report[field]} {field[2:]}" for field in MISMATCH_COUNTS if report[field]
+        )
+        print(f"{path}: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import guitarpro as gm
+import numpy as np
+
+from src.pipeline.batchconvertor import find_guitarpro_files
+from src.pipeline.pipelinedloader import PipelinedLoader
+from src.transforming.tokenizer import (
+    VOCABULARY_SIZE,
+    GuitarProToTokensConvertor,
+    concatenate_tokens,
+)
+
+
+class TokenCorpus(NamedTuple):
+    """Token sequences of many songs, one after the other.
+
+    Song i is tokens[offsets[i]:offsets[i + 1]], its path names[i].
+    """
+
+    tokens: np.ndarray
+    offsets: np.ndarray
+    names: List[str]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def sequence(self, idx_song: int) -> np.ndarray:
+        return self.tokens[self.offsets[idx_song] : self.offsets[idx_song + 1]]
+
+    def save(self, path: Path) -> None:
+        # Written through a file object, so no .npz suffix is appended
+        with open(path, "wb") as fp:
+            np.savez(
+                fp,
+                tokens=self.tokens,
+                offsets=self.offsets,
+                names=np.array(self.names),
+                vocabulary_size=VOCABULARY_SIZE,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "TokenCorpus":
+        with np.load(path) as arrays:
+            if int(arrays["vocabulary_size"]) != VOCABULARY_SIZE:
+                raise ValueError(f"{path} was encoded with another vocabulary")
+            return cls(arrays["tokens"], arrays["offsets"], arrays["names"].tolist())
+
+
+def _encode(path: Path, gp_stream: gm.models.Song) -> np.ndarray:
+    return GuitarProToTokensConvertor(gp_stream).apply()
+
+
+def build_token_corpus(
+    inputs: Iterable[Path], n_workers: Optional[int] = None
+) -> Tuple[TokenCorpus, Dict[str, str]]:
+    """Encodes the GuitarPro files found in inputs, in parallel.
+
+    Only the tokens come back from the workers. Songs are named by their
+    path and kept in the order they finish. Returns the corpus and the
+    error of each file that failed.
+    """
+    sequences = []
+    names = []
+    failures = {}
+    for result in PipelinedLoader(
+        find_guitarpro_files(inputs), _encode, n_workers=n_workers
+    ):
+        if result.error is not None:
+            failures[str(result.path)] = result.error
+            continue
+        sequences.append(result.value)
+        names.append(str(result.path))
+    tokens, offsets = concatenate_tokens(sequences)
+    return TokenCorpus(tokens, offsets, names), failures
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Encode GuitarPro files into a token corpus."
+    )
+    parser.add_argument("inputs", nargs="+", type=Path)
+    parser.add_argument("-o", "--output", type=Path, required=True)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parsed_args = parser.parse_args(args)
+
+    corpus, failures = build_token_corpus(
+        parsed_args.inputs, n_workers=parsed_args.workers
+    )
+    corpus.save(parsed_args.output)
+    print(
+        f"Encoded {len(corpus)} songs into {len(corpus.tokens)} tokens, "
+        f"{len(failures)} failed."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+# Start the errors of tasks the pool stopped, told apart from their own errors
+TIMED_OUT = "Timed out"
+NO_WORKER_FREE = "No worker free"
+# Start method of pools whose workers start while other threads run, as a
+# forked worker could inherit locks held by those threads
+THREAD_SAFE_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class TaskResult(NamedTuple):
+    """Outcome of a task run by a WorkerPool."""
+
+    task: Any
+    ok: bool
+    value: Any
+    error: Optional[str]
+    elapsed: float
+
+
+def _worker_main(
+    function: Callable[[Any], Any],
+    connection: Connection,
+    initializer: Optional[Callable[[], None]] = None,
+) -> None:
+    """Runs tasks received through the connection until told to stop."""
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            return
+        # Tasks come wrapped in a tuple, so that None can stop the worker
+        if message is None:
+            return
+        (task,) = message
+        start = time.perf_counter()
+        try:
+            value = function(task)
+            ok, error = True, None
+        except Exception:
+            value, ok, error = None, False, traceback.format_exc()
+        connection.send((ok, value, error, time.perf_counter() - start))
+
+
+class _Worker:
+    """A worker process with the task it is currently running."""
+
+    def __init__(
+        self,
+        context,
+        function: Callable[[Any], Any],
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(function, child_connection, initializer),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.task = None
+        self.started_at = 0.0
+        self.n_tasks = 0
+
+    def submit(self, task: Any) -> None:
+        self.task = task
+        self.started_at = time.perf_counter()
+        self.connection.send((task,))
+
+    def stop(self) -> None:
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class WorkerPool:
+    """Runs a function over tasks in separate processes.
+
+    Each task runs with an optional timeout, and a task that raises, hangs
+    or crashes its process only fails itself: the worker is replaced and the
+    remaining tasks keep running. Workers are recycled after
+    max_tasks_per_worker tasks to contain memory growth.
+
+    Batches go through imap_unordered. apply runs a single task and can be
+    called from many threads at once, for instance by a server; after
+    start, workers retired or killed are replaced right away so that
+    n_workers stay ready. Workers are started outside of the pool lock, and
+    start_method picks how: a threaded caller such as a server should not
+    fork, as the child could inherit locks held by other threads.
+    initializer runs once in each worker, to import what tasks need ahead
+    of the first one.
+    """
+
+    def __init__(
+        self,
+        function: Callable[[Any], Any],
+        n_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_tasks_per_worker: Optional[int] = None,
+        start_method: Optional[str] = None,
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.function = function
+        self.initializer = initializer
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._context = multiprocessing.get_context(start_method)
+        self._idle_workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        # Taken by apply for as long as a task runs
+        self._slots = threading.BoundedSemaphore(self.n_workers)
+        self._keep_warm = False
+        self.n_started_workers = 0
+        self.n_running_tasks = 0
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Starts the workers ahead of the first task and keeps them ready."""
+        with self._lock:
+            self._keep_warm = True
+            n_missing = self.n_workers - len(self._idle_workers)
+        for _ in range(n_missing):
+            self._replace_worker()
+
+    def close(self) -> None:
+        with self._lock:
+            self._keep_warm = False
+            idle_workers, self._idle_workers = self._idle_workers, []
+        for worker in idle_workers:
+            worker.stop()
+
+    def _new_worker(self) -> _Worker:
+        """Starts a worker; never called with the lock held."""
+        with self._lock:
+            self.n_started_workers += 1
+        return _Worker(self._context, self.function, self.initializer)
+
+    def _get_worker(self) -> _Worker:
+        with self._lock:
+            if self._idle_workers:
+                return self._idle_workers.pop()
+        return self._new_worker()
+
+    def _release_worker(self, worker: _Worker) -> None:
+        worker.n_tasks += 1
+        worker.task = None
+        if self.max_tasks_per_worker and worker.n_tasks >= self.max_tasks_per_worker:
+            worker.stop()
+            self._replace_worker()
+        else:
+            with self._lock:
+                self._idle_workers.append(worker)
+
+    def _replace_worker(self) -> None:
+        with self._lock:
+            if not self._keep_warm:
+                return
+        worker = self._new_worker()
+        with self._lock:
+            if self._keep_warm:
+                self._idle_workers.append(worker)
+                return
+        # Closed while the worker was starting
+        worker.stop()
+
+    def apply(self, task: Any, wait_timeout: Optional[float] = None) -> TaskResult:
+        """Runs a single task on a free worker and returns its TaskResult.
+
+        Waits for a worker while n_workers tasks are running, at most
+        wait_timeout seconds if given, after which the task fails without
+        running.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=wait_timeout):
+            return TaskResult(
+                task,
+                False,
+                None,
+                f"{NO_WORKER_FREE} after {wait_timeout} seconds",
+                time.perf_counter() - start,
+            )
+        with self._lock:
+            self.n_running_tasks += 1
+        try:
+            worker = self._get_worker()
+            worker.submit(task)
+            if not worker.connection.poll(self.timeout):
+                worker.kill()
+                self._replace_worker()
+                return TaskResult(
+                    task,
+                    False,
+                    None,
+                    f"{TIMED_OUT} after {self.timeout} seconds",
+                    time.perf_counter() - worker.started_at,
+                )
+            try:
+                ok, value, error, elapsed = worker.connection.recv()
+            except (EOFError, OSError):
+                worker.process.join()
+                exit_code = worker.process.exitcode
+                worker.kill()
+                self._replace_worker()
+                return TaskResult(
+                    task,
+                    False,
+                    None,
+                    f"Worker crashed with exit code {exit_code}",
+                    time.perf_counter() - worker.started_at,
+                )
+            self._release_worker(worker)
+            return TaskResult(task, ok, value, error, elapsed)
+        finally:
+            with self._lock:
+                self.n_running_tasks -= 1
+            self._slots.release()
+
+    def imap_unordered(self, tasks: Iterable[Any]) -> Iterator[TaskResult]:
+        """Yields a TaskResult for every task, in completion order."""
+        pending_tasks = iter(tasks)
+        busy_workers: Dict[Connection, _Worker] = {}
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(busy_workers) < self.n_workers:
+                    try:
+                        task = next(pending_tasks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    worker = self._get_worker()
+                    worker.submit(task)
+                    busy_workers[worker.connection] = worker
+                if not busy_workers:
+                    return
+
+                for connection in wait(
+                    list(busy_workers), self._wait_timeout(busy_workers)
+                ):
+                    worker = busy_workers.pop(connection)
+                    try:
+                        ok, value, error, elapsed = connection.recv()
+                    except (EOFError, OSError):
+                        worker.process.join()
+                        exit_code = worker.process.exitcode
+                        worker.kill()
+                        yield TaskResult(
+                            worker.task,
+                            False,
+                            None,
+                            f"Worker crashed with exit code {exit_code}",
+                            time.perf_counter() - worker.started_at,
+                        )
+                        continue
+                    task = worker.task
+                    self._release_worker(worker)
+                    yield TaskResult(task, ok, value, error, elapsed)
+
+                if self.timeout is None:
+                    continue
+                now = time.perf_counter()
+                for connection, worker in list(busy_workers.items()):
+                    if now - worker.started_at < self.timeout:
+                        continue
+                    del busy_workers[connection]
+                    worker.kill()
+                    yield TaskResult(
+                        worker.task,
+                        False,
+                        None,
+                        f"{TIMED_OUT} after {self.timeout} seconds",
+                        now - worker.started_at,
+                    )
+        finally:
+            for worker in busy_workers.values():
+                worker.kill()
+
+    def _wait_timeout(self, busy_workers: Dict[Connection, _Worker]) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        now = time.perf_counter()
+        deadlines = [
+            worker.started_at + self.timeout for worker in busy_workers.values()
+        ]
+        return max(min(deadlines) - now, 0)
@@ -0,0 +1,162 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, Iterator, Optional, Sequence
+
+StatsHook = Callable[["ConversionStats"], None]
+
+# Writing it to clear_refs resets the peak resident set size of the process
+RESET_PEAK_RSS = "5"
+CLEAR_REFS_PATH = Path("/proc/self/clear_refs")
+STATUS_PATH = Path("/proc/self/status")
+PEAK_RSS_FIELD = "VmHWM:"
+
+
+class ConversionStats:
+    """Stage timers and counters of one conversion.
+
+    Timings are in seconds and add up when a stage runs more than once.
+    With per_track, timings and counters given a track index are also
+    recorded for that track. Memory figures are in bytes, by stage.
+    emit() passes the stats to every hook.
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        per_track: bool = False,
+        hooks: Sequence[StatsHook] = (),
+    ) -> None:
+        self.name = name
+        self.per_track = per_track
+        self.hooks = list(hooks)
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.tracks: Dict[int, Dict[str, Dict[str, float]]] = {}
+        self.memory: Dict[str, Dict[str, Optional[int]]] = {}
+
+    def _track(self, idx_track: int) -> Dict[str, Dict[str, float]]:
+        if idx_track not in self.tracks:
+            self.tracks[idx_track] = {"timings": {}, "counters": {}}
+        return self.tracks[idx_track]
+
+    def add_time(
+        self, stage: str, seconds: float, idx_track: Optional[int] = None
+    ) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        if self.per_track and idx_track is not None:
+            track_timings = self._track(idx_track)["timings"]
+            track_timings[stage] = track_timings.get(stage, 0.0) + seconds
+
+    def count(self, counter: str, n: int = 1, idx_track: Optional[int] = None) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + n
+        if self.per_track and idx_track is not None:
+            track_counters = self._track(idx_track)["counters"]
+            track_counters[counter] = track_counters.get(counter, 0) + n
+
+    @contextmanager
+    def timer(self, stage: str, idx_track: Optional[int] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, idx_track)
+
+    @contextmanager
+    def track_memory(self, stage: str, trace: bool = False) -> Iterator[None]:
+        """Records the peak memory of the process while a stage runs.
+
+        peak_rss is the peak resident set size, measured from the start of
+        the stage where the system lets it be reset, and None where it is
+        not known. With trace, peak_traced is the peak of the memory Python
+        allocated during the stage, as traced by tracemalloc; tracing slows
+        the stage down several times, so its timings are not meaningful.
+        """
+        rss_is_reset = _reset_peak_rss()
+        was_tracing = tracemalloc.is_tracing()
+        if trace:
+            if not was_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            memory = {"peak_rss": _peak_rss() if rss_is_reset else None}
+            if trace:
+                memory["peak_traced"] = tracemalloc.get_traced_memory()[1]
+                if not was_tracing:
+                    tracemalloc.stop()
+            self.memory[stage] = memory
+
+    def to_dict(self) -> dict:
+        stats = {
+            "name": self.name,
+            "timings": dict(self.timings),
+            "counters": dict(self.counters),
+        }
+        if self.memory:
+            stats["memory"] = {
+                stage: dict(memory) for stage, memory in self.memory.items()
+            }
+        if self.per_track:
+            stats["tracks"] = {
+                str(idx_track): track_stats
+                for idx_track, track_stats in sorted(self.tracks.items())
+            }
+        return stats
+
+    def emit(self) -> None:
+        for hook in self.hooks:
+            hook(self)
+
+
+def timer(
+    stats: Optional[ConversionStats], stage: str, idx_track: Optional[int] = None
+) -> ContextManager:
+    """Times a stage into stats, or does nothing when stats is None."""
+    if stats is None:
+        return nullcontext()
+    return stats.timer(stage, idx_track)
+
+
+def track_memory(
+    stats: Optional[ConversionStats], stage: str, trace: bool = False
+) -> ContextManager:
+    """Records the peak memory of a stage into stats, or does nothing."""
+    if stats is None:
+        return nullcontext()
+    return stats.track_memory(stage, trace)
+
+
+def _reset_peak_rss() -> bool:
+    """Resets the peak resident set size, and tells if it could."""
+    try:
+        CLEAR_REFS_PATH.write_text(RESET_PEAK_RSS)
+    except OSError:
+        return False
+    return True
+
+
+def _peak_rss() -> Optional[int]:
+    try:
+        with open(STATUS_PATH) as fp:
+            for line in fp:
+                if line.startswith(PEAK_RSS_FIELD):
+                    # In kB
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class JsonLinesSink:
+    """Hook appending every emitted ConversionStats to a JSON-lines file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+    def __call__(self, stats: ConversionStats) -> None:
+        with open(self.path, "a") as fp:
+            fp.write(json.dumps(stats.to_dict()) + "\n")
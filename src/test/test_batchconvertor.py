@@ -0,0 +1,148 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from src.loading.archives import iter_archive
+from src.loading.serialization import PyGuitarProSerializer
+from src.loading.music21midiwriter import Music21MidiWriter, UnsupportedScoreError
+from src.pipeline.batchconvertor import (
+    BatchConvertor,
+    ConversionJob,
+    convert_member,
+    find_guitarpro_files,
+)
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def _create_corpus(corpus_folder: Path) -> None:
+    (corpus_folder / "bass").mkdir(parents=True)
+    shutil.copy(TEST_FOLDER_PATH / "slapbass.gp3", corpus_folder / "bass")
+    shutil.copy(
+        TEST_FOLDER_PATH / "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5",
+        corpus_folder,
+    )
+    (corpus_folder / "broken.gp5").write_bytes(b"not a guitar pro file")
+    (corpus_folder / "notes.txt").write_text("ignored")
+
+
+def _converted_names(batch_convertor: BatchConvertor, n_skipped: int) -> set:
+    """Returns the names of the files in the manifest after its n_skipped lines."""
+    with open(batch_convertor.manifest_path) as fp:
+        entries = [json.loads(line) for line in fp][n_skipped:]
+    return {Path(entry["input"]).name for entry in entries}
+
+
+def test_find_guitarpro_files(tmp_path):
+    _create_corpus(tmp_path)
+    gp_paths = find_guitarpro_files([tmp_path])
+    assert sorted(path.name for path in gp_paths) == [
+        "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5",
+        "broken.gp5",
+        "slapbass.gp3",
+    ]
+
+
+def test_batch_convertor_run(tmp_path):
+    corpus_folder = tmp_path / "corpus"
+    output_folder = tmp_path / "output"
+    _create_corpus(corpus_folder)
+    batch_convertor = BatchConvertor(output_folder, engine="midi", n_workers=2)
+    summary = batch_convertor.run([corpus_folder])
+    assert summary["total"] == 3
+    assert summary["succeeded"] == 2
+    assert list(summary["failures"]) == [str(corpus_folder / "broken.gp5")]
+    assert (output_folder / "bass" / "slapbass.gp3.mid").is_file()
+    with open(batch_convertor.summary_path) as fp:
+        assert json.load(fp)["failed"] == 1
+
+    # A second run only retries the failed file
+    summary = batch_convertor.run([corpus_folder])
+    with open(batch_convertor.manifest_path) as fp:
+        entries = [json.loads(line) for line in fp]
+    assert len(entries) == 4
+    assert entries[-1]["input"] == str(corpus_folder / "broken.gp5")
+    assert summary["succeeded"] == 2
+
+    # Files edited or converted with other options are not skipped
+    shutil.copy(
+        TEST_FOLDER_PATH / "progmetal.gp3", corpus_folder / "bass" / "slapbass.gp3"
+    )
+    batch_convertor.run([corpus_folder])
+    assert _converted_names(batch_convertor, 4) == {"slapbass.gp3", "broken.gp5"}
+    BatchConvertor(output_folder, engine="midi", unroll_repeats=True).run(
+        [corpus_folder]
+    )
+    assert len(_converted_names(batch_convertor, 6)) == 3
+
+
+def test_batch_convertor_low_memory(tmp_path):
+    corpus_folder = tmp_path / "corpus"
+    _create_corpus(corpus_folder)
+    summary = BatchConvertor(tmp_path / "output", midi_backend="fast").run(
+        [corpus_folder]
+    )
+    low_memory_convertor = BatchConvertor(
+        tmp_path / "low_memory",
+        midi_backend="fast",
+        low_memory=True,
+        collect_stats=True,
+        trace_memory=True,
+    )
+    low_memory_summary = low_memory_convertor.run([corpus_folder])
+    assert low_memory_summary["succeeded"] == summary["succeeded"] == 2
+    for output_path in (tmp_path / "output").rglob("*.mid"):
+        low_memory_path = (
+            tmp_path / "low_memory" / output_path.relative_to(tmp_path / "output")
+        )
+        assert low_memory_path.read_bytes() == output_path.read_bytes()
+    with open(low_memory_convertor.manifest_path) as fp:
+        entry = json.loads(fp.readline())
+    assert entry["timings"]["stats"]["memory"]["conversion"]["peak_traced"] > 0
+
+    # Only the fast backend writes parts one at a time
+    with pytest.raises(ValueError):
+        BatchConvertor(tmp_path / "output", low_memory=True)
+    with pytest.raises(ValueError):
+        BatchConvertor(tmp_path / "output", trace_memory=True)
+
+
+def test_low_memory_falls_back_to_music21(tmp_path, monkeypatch):
+    gp_path = TEST_FOLDER_PATH / "slapbass.gp3"
+    job = ConversionJob(gp_path, tmp_path / "slapbass.mid", midi_backend="fast")
+    expected_data, _ = convert_member((job, gp_path.read_bytes()))
+
+    def add_part(self, m21_part):
+        raise UnsupportedScoreError("Not supported")
+
+    # Parts the fast backend cannot write are written by music21 from the
+    # song loaded again
+    monkeypatch.setattr(Music21MidiWriter, "add_part", add_part)
+    job = job._replace(low_memory=True, collect_stats=True)
+    data, timings = convert_member((job, gp_path.read_bytes()))
+    assert data == expected_data
+    counters = timings["stats"]["counters"]
+    assert counters["low_memory_fallbacks"] == counters["midi_fallbacks"] == 1
+
+
+def test_batch_convertor_run_archive(tmp_path):
+    corpus_folder = tmp_path / "corpus"
+    _create_corpus(corpus_folder)
+    input_archive = shutil.make_archive(tmp_path / "corpus", "zip", corpus_folder)
+    output_archive = tmp_path / "converted.tar.gz"
+    batch_convertor = BatchConvertor(tmp_path / "output", engine="midi")
+    summary = batch_convertor.run_archive(input_archive, output_archive)
+    assert summary["total"] == 3
+    assert summary["succeeded"] == 2
+    assert list(summary["failures"]) == [str(Path(input_archive) / "broken.gp5")]
+    members = dict(iter_archive(output_archive))
+    assert sorted(members) == [
+        "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5.mid",
+        "bass/slapbass.gp3.mid",
+    ]
+    gp_stream = PyGuitarProSerializer().load(corpus_folder / "bass" / "slapbass.gp3")
+    midi_file = GuitarProToMidiConvertor(gp_stream).apply()
+    assert members["bass/slapbass.gp3.mid"] == midi_file.to_bytes()
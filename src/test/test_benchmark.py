@@ -0,0 +1,55 @@
+from src.benchmarks.benchmark import STAGES, compare_to_baseline, run_benchmark
+from src.benchmarks.songgenerator import SongSpec, generate_song, write_song
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.measuremap import MeasureMap
+from src.transforming.noteeventtable import NOTE_TYPE_TIE, NoteEventTable
+
+
+def test_generate_song():
+    spec = SongSpec(
+        n_tracks=3,
+        n_measures=12,
+        n_voices=2,
+        notes_per_beat=2,
+        tie_density=0.5,
+        tuplet_density=0.5,
+        n_tempo_changes=2,
+        n_time_signature_changes=3,
+    )
+    gp_stream = generate_song(spec)
+    assert len(gp_stream.tracks) == 3
+    assert len(gp_stream.measureHeaders) == 12
+    measure_map = MeasureMap.from_song(gp_stream)
+    assert len(measure_map.time_signature_changes()) == 4
+    assert len(measure_map.measures[0].tempo_changes) == 1
+    # Every voice fills its measure exactly
+    for gp_measure in gp_stream.tracks[0].measures:
+        for gp_voice in gp_measure.voices:
+            assert sum(gp_beat.duration.time for gp_beat in gp_voice.beats) == (
+                gp_measure.length
+            )
+    note_event_table = NoteEventTable.from_song(gp_stream)
+    assert (note_event_table["note_type"] == NOTE_TYPE_TIE).any()
+    assert (note_event_table["tuplet_enters"] == 3).any()
+    assert (note_event_table["voice"] == 1).any()
+
+
+def test_write_song_round_trip(tmp_path):
+    spec = SongSpec(n_measures=8, tie_density=0.3, tuplet_density=0.3, seed=4)
+    gp_path = write_song(spec, tmp_path / "song.gp5")
+    gp_stream = PyGuitarProSerializer().load(gp_path)
+    loaded_events = NoteEventTable.from_song(gp_stream).events
+    generated_events = NoteEventTable.from_song(generate_song(spec)).events
+    assert (loaded_events == generated_events).all()
+
+
+def test_run_benchmark(tmp_path):
+    spec = SongSpec(n_tracks=1, n_measures=4)
+    result = run_benchmark("tiny", spec, tmp_path, engine="midi", repeat=1)
+    assert set(result["timings"]) == set(STAGES)
+    assert result["peak_memory"] > 0
+    report = {"results": [result]}
+    assert compare_to_baseline(report, report) == []
+    slow_result = dict(result, timings=dict(result["timings"], convert=1000.0))
+    regressions = compare_to_baseline({"results": [slow_result]}, report)
+    assert [regression["measure"] for regression in regressions] == ["convert"]
@@ -0,0 +1,76 @@
+import time
+from pathlib import Path
+
+from src.pipeline.batchconvertor import BatchConvertor
+from src.pipeline.conversioncache import ConversionCache, open_cache
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_make_key(tmp_path):
+    cache_1 = ConversionCache(tmp_path, convertor_version="1")
+    cache_2 = ConversionCache(tmp_path, convertor_version="2")
+    key = cache_1.make_key(b"gp", {"save_format": "midi"})
+    assert key == cache_1.make_key(b"gp", {"save_format": "midi"})
+    assert key != cache_1.make_key(b"gp", {"save_format": "musicxml"})
+    assert key != cache_1.make_key(b"other gp", {"save_format": "midi"})
+    assert key != cache_2.make_key(b"gp", {"save_format": "midi"})
+
+
+def test_get_and_put(tmp_path):
+    cache = ConversionCache(tmp_path)
+    key = cache.make_key(b"gp")
+    assert cache.get(key) is None
+    cache.put(key, b"midi")
+    assert cache.get(key) == b"midi"
+    assert cache.stats == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+
+def test_put_replacing_an_entry(tmp_path):
+    cache = ConversionCache(tmp_path, max_size=150)
+    keys = [cache.make_key(bytes([value])) for value in range(2)]
+    cache.put(keys[0], b"x" * 50)
+    cache.put(keys[1], b"x" * 100)
+    # The replaced entry no longer counts, so nothing needs to be evicted
+    cache.put(keys[1], b"x" * 30)
+    assert cache.stats["evictions"] == 0
+    assert cache.get(keys[0]) is not None
+    assert cache.size() == 80
+
+
+def test_open_cache_is_shared(tmp_path):
+    cache = open_cache(tmp_path)
+    assert open_cache(tmp_path / ".") is cache
+    assert open_cache(tmp_path, max_size=100) is not cache
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ConversionCache(tmp_path, max_size=250)
+    keys = [cache.make_key(bytes([value])) for value in range(3)]
+    for key in keys[:2]:
+        cache.put(key, b"x" * 100)
+        time.sleep(0.01)
+    # Using the first entry makes the second one the least recently used
+    cache.get(keys[0])
+    time.sleep(0.01)
+    cache.put(keys[2], b"x" * 100)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats["evictions"] == 1
+    assert cache.size() == 200
+
+
+def test_batch_convertor_uses_cache(tmp_path):
+    gp_path = TEST_FOLDER_PATH / "slapbass.gp3"
+    batch_convertor = BatchConvertor(
+        tmp_path / "output_1", engine="midi", cache_folder=tmp_path / "cache"
+    )
+    assert batch_convertor.run([gp_path])["cache_hits"] == 0
+    batch_convertor = BatchConvertor(
+        tmp_path / "output_2", engine="midi", cache_folder=tmp_path / "cache"
+    )
+    assert batch_convertor.run([gp_path])["cache_hits"] == 1
+    output_1 = tmp_path / "output_1" / "slapbass.gp3.mid"
+    output_2 = tmp_path / "output_2" / "slapbass.gp3.mid"
+    assert output_1.read_bytes() == output_2.read_bytes()
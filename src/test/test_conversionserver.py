@@ -0,0 +1,80 @@
+import http.client
+import json
+import socket
+from pathlib import Path
+
+from src.pipeline.batchconvertor import ConversionJob, convert_member
+from src.pipeline.conversionserver import ConversionServer
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: Path) -> None:
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(self.socket_path))
+
+
+def _request(connection, method, path, body=None):
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def test_conversion_server():
+    gp_bytes = (TEST_FOLDER_PATH / "slapbass.gp3").read_bytes()
+    expected, _ = convert_member(
+        (ConversionJob(Path("request"), Path("request.mid"), engine="midi"), gp_bytes)
+    )
+    with ConversionServer(("127.0.0.1", 0), n_workers=1) as server:
+        connection = http.client.HTTPConnection(*server.address)
+        # Many calls share a connection
+        for _ in range(2):
+            assert _request(connection, "POST", "/convert", gp_bytes) == (200, expected)
+        status, body = _request(
+            connection, "POST", "/convert?unroll_repeats=1", gp_bytes
+        )
+        assert status == 200
+        status, body = _request(connection, "POST", "/convert?engine=other", gp_bytes)
+        assert status == 400
+        status, body = _request(connection, "POST", "/convert", b"not a song")
+        assert status == 422
+        assert _request(connection, "GET", "/health")[0] == 200
+        assert _request(connection, "GET", "/missing")[0] == 404
+        status, body = _request(connection, "GET", "/metrics")
+        metrics = json.loads(body)
+        assert metrics["requests"] == 5
+        assert metrics["succeeded"] == 3
+        assert metrics["failed"] == 2
+        assert metrics["running"] == 0 and metrics["queued"] == 0
+        connection.close()
+
+
+def test_conversion_server_limits(tmp_path):
+    socket_path = tmp_path / "server.sock"
+    gp_bytes = (TEST_FOLDER_PATH / "progmetal.gp3").read_bytes()
+    with ConversionServer(
+        socket_path, n_workers=1, max_queued=0, max_tasks_per_worker=2
+    ) as server:
+        connection = _UnixHTTPConnection(socket_path)
+        for _ in range(3):
+            assert _request(connection, "POST", "/convert", gp_bytes)[0] == 200
+        # Recycled after two conversions, and replaced ahead of the next
+        metrics = json.loads(_request(connection, "GET", "/metrics")[1])
+        assert metrics["workers_started"] == 2
+
+        # Every worker busy and no room to queue
+        server._n_pending = 1
+        assert _request(connection, "POST", "/convert", gp_bytes)[0] == 503
+        server._n_pending = 0
+        server.pool.timeout = 0.001
+        assert _request(connection, "POST", "/convert", gp_bytes)[0] == 504
+        metrics = json.loads(_request(connection, "GET", "/metrics")[1])
+        assert metrics["rejected"] == 1 and metrics["timed_out"] == 1
+        assert metrics["workers_started"] == 3
+        connection.close()
+    assert not socket_path.exists()
@@ -0,0 +1,124 @@
+from fractions import Fraction
+from pathlib import Path
+
+import music21 as m21
+import pytest
+
+from src.loading.serialization import Music21Serializer, PyGuitarProSerializer
+from src.transforming.conversionspec import ConversionSpec
+from src.transforming.guitarprotomusic21convertor import (
+    QUARTER_TIME_IN_TICKS,
+    GuitarProToMusic21Convertor,
+)
+from src.transforming.measuremap import MeasureMap
+from src.transforming.tempomap import TempoMap
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+METALLICA_FILE = "Metallica - Nothing else matters (7).gp3.gp2tokens2gp.gp5"
+
+
+def _notes(m21_score, start, stop):
+    """Returns (part, pitches, start, end) of the notes clipped to start, stop."""
+    notes = []
+    for idx_part, m21_part in enumerate(m21_score.parts):
+        for m21_note in m21_part.stripTies(matchByPitch=True).flatten().notes:
+            note_start = max(Fraction(m21_note.offset), start)
+            note_end = min(
+                Fraction(m21_note.offset) + Fraction(m21_note.quarterLength), stop
+            )
+            if note_start < note_end:
+                pitches = tuple(pitch.midi for pitch in m21_note.pitches)
+                notes.append((idx_part, pitches, note_start - start, note_end - start))
+    return sorted(notes)
+
+
+def test_conversion_spec_select_tracks():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    assert ConversionSpec().select_tracks(gp_stream) == [0, 1, 2, 3, 4]
+    assert ConversionSpec(tracks=("Bass", 0)).select_tracks(gp_stream) == [0, 3]
+    assert ConversionSpec(instruments=(30,)).select_tracks(gp_stream) == [0, 1]
+    spec = ConversionSpec(tracks=(0, 4), exclude_percussion=True)
+    assert spec.select_tracks(gp_stream) == [0]
+    with pytest.raises(ValueError):
+        ConversionSpec(tracks=("Drums",)).select_tracks(gp_stream)
+    with pytest.raises(ValueError):
+        ConversionSpec(tracks=(5,)).select_tracks(gp_stream)
+
+
+def test_conversion_spec_select_measures():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "slapbass.gp3")
+    measure_map = MeasureMap.from_song(gp_stream, TempoMap.from_song(gp_stream))
+    n_measures = len(measure_map)
+    assert ConversionSpec().select_measures(measure_map) == (0, n_measures)
+    assert ConversionSpec(measures=(2, 5)).select_measures(measure_map) == (2, 5)
+    assert ConversionSpec(measures=(2, 1000)).select_measures(measure_map) == (
+        2,
+        n_measures,
+    )
+    # 4/4 measures: the range overlaps the end of measure 1 up to measure 3
+    spec = ConversionSpec(ticks=(7 * QUARTER_TIME_IN_TICKS, 13 * QUARTER_TIME_IN_TICKS))
+    assert spec.select_measures(measure_map) == (1, 4)
+    with pytest.raises(ValueError):
+        ConversionSpec(measures=(0, 1), ticks=(0, 1)).select_measures(measure_map)
+    assert ConversionSpec(tracks=(0,), measures=(2, 5)).to_dict() == {
+        "tracks": [0],
+        "measures": [2, 5],
+    }
+
+
+def test_apply_with_spec():
+    gp_serializer = PyGuitarProSerializer()
+    # Ties enter the selection on the first measure
+    gp_stream = gp_serializer.load(TEST_FOLDER_PATH / "progmetal.gp3")
+    full_score = GuitarProToMusic21Convertor(gp_stream).apply()
+    spec = ConversionSpec(tracks=(0, 1, 3), measures=(5, 7))
+    convertor = GuitarProToMusic21Convertor(gp_stream, spec=spec)
+    m21_score = convertor.apply()
+    assert len(m21_score.parts) == 3
+    assert convertor.tie_resolver.n_unresolved == 0
+    first_measure, last_measure = convertor.measure_map[5], convertor.measure_map[6]
+    start = Fraction(first_measure.start, QUARTER_TIME_IN_TICKS)
+    stop = Fraction(last_measure.start + last_measure.length, QUARTER_TIME_IN_TICKS)
+    full_notes = [
+        (spec.tracks.index(note[0]),) + note[1:]
+        for note in _notes(full_score, start, stop)
+        if note[0] in spec.tracks
+    ]
+    assert _notes(m21_score, Fraction(0), stop - start) == sorted(full_notes)
+
+    # The tempo and time signature in effect where the selection starts
+    gp_stream = gp_serializer.load(TEST_FOLDER_PATH / METALLICA_FILE)
+    spec = ConversionSpec(ticks=(42000, 50000))
+    convertor = GuitarProToMusic21Convertor(gp_stream, spec=spec)
+    m21_score = convertor.apply()
+    first_measure = convertor.measure_map[convertor.first_measure]
+    assert first_measure.start <= 42000 < first_measure.start + first_measure.length
+    m21_measure = m21_score.parts[0].getElementsByClass("Measure")[0]
+    assert m21_measure.getElementsByClass("MetronomeMark")[0].number == 80
+    assert (
+        m21_measure.timeSignature.numerator,
+        m21_measure.timeSignature.denominator,
+    ) == (first_measure.numerator, first_measure.denominator)
+
+
+@pytest.mark.parametrize("midi_backend", ["fast", "music21"])
+def test_selection_cutting_repeats(midi_backend):
+    # Repeats open on measures 0, 4 and 9 and close on 3, 7 and 12
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    serializer = Music21Serializer(midi_backend=midi_backend)
+    for measures in ((0, 1), (0, 2), (3, 5), (4, 6), (2, 8)):
+        spec = ConversionSpec(tracks=(0,), measures=measures)
+        m21_score = GuitarProToMusic21Convertor(gp_stream, spec=spec).apply()
+        assert serializer.dumps(m21_score).startswith(b"MThd")
+    # The repeat from 4 to 7 is held whole, so it is still written
+    m21_score = GuitarProToMusic21Convertor(
+        gp_stream, spec=ConversionSpec(tracks=(0,), measures=(2, 8))
+    ).apply()
+    m21_measures = m21_score.parts[0].getElementsByClass("Measure")
+    repeats = [
+        idx_measure
+        for idx_measure, m21_measure in enumerate(m21_measures)
+        if isinstance(m21_measure.leftBarline, m21.bar.Repeat)
+        or isinstance(m21_measure.rightBarline, m21.bar.Repeat)
+    ]
+    assert repeats == [2, 5]
@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+from src.loading.serialization import Music21Serializer, PyGuitarProSerializer
+from src.pipeline.batchconvertor import BatchConvertor
+from src.profiling.conversionstats import (
+    ConversionStats,
+    JsonLinesSink,
+    timer,
+    track_memory,
+)
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_conversion_stats():
+    stats = ConversionStats("song", per_track=True)
+    with stats.timer("convert", idx_track=1):
+        pass
+    stats.count("notes", 3, idx_track=1)
+    stats.count("notes", 2, idx_track=2)
+    stats.count("tracks")
+    assert stats.counters == {"notes": 5, "tracks": 1}
+    assert stats.timings["convert"] >= 0
+    stats_dict = stats.to_dict()
+    assert stats_dict["tracks"]["1"]["counters"] == {"notes": 3}
+    assert "convert" in stats_dict["tracks"]["1"]["timings"]
+    with timer(None, "convert"):
+        pass
+
+
+def test_track_memory():
+    stats = ConversionStats("song")
+    with stats.track_memory("convert", trace=True):
+        buffer = bytearray(10_000_000)
+        del buffer
+    memory = stats.memory["convert"]
+    assert memory["peak_traced"] >= 10_000_000
+    assert memory["peak_rss"] is None or memory["peak_rss"] >= 10_000_000
+    with stats.track_memory("dump"):
+        pass
+    assert set(stats.to_dict()["memory"]["dump"]) == {"peak_rss"}
+    with track_memory(None, "convert"):
+        pass
+
+
+def test_json_lines_sink(tmp_path):
+    stats_path = tmp_path / "stats.jsonl"
+    received = []
+    stats = ConversionStats("song", hooks=[JsonLinesSink(stats_path), received.append])
+    stats.count("notes", 4)
+    stats.emit()
+    stats.emit()
+    assert received == [stats, stats]
+    lines = stats_path.read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["counters"] == {"notes": 4}
+
+
+def test_convertor_stats(tmp_path):
+    stats = ConversionStats("Engano", per_track=True)
+    gp_file = PyGuitarProSerializer(stats).load(
+        TEST_FOLDER_PATH / "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5"
+    )
+    m21_score = GuitarProToMusic21Convertor(gp_file, stats=stats).apply()
+    Music21Serializer(stats=stats).dump(m21_score, tmp_path / "engano.mid")
+
+    counters = stats.counters
+    assert counters["tracks"] == len(gp_file.tracks)
+    assert counters["measures"] == sum(len(track.measures) for track in gp_file.tracks)
+    assert counters["notes"] == sum(
+        len(gp_beat.notes)
+        for track in gp_file.tracks
+        for gp_measure in track.measures
+        for gp_voice in gp_measure.voices
+        for gp_beat in gp_voice.beats
+    )
+    assert counters["ties_resolved"] + counters["ties_dropped"] > 0
+    assert {"load", "setup", "tracks", "measures", "notes", "dump"} <= set(
+        stats.timings
+    )
+    assert set(stats.tracks) == set(range(len(gp_file.tracks)))
+
+
+def test_batch_convertor_stats(tmp_path):
+    gp_path = TEST_FOLDER_PATH / "slapbass.gp3"
+    batch_convertor = BatchConvertor(tmp_path / "output", collect_stats=True)
+    batch_convertor.run([gp_path])
+    with open(batch_convertor.manifest_path) as fp:
+        entry = json.loads(fp.readline())
+    stats = entry["timings"]["stats"]
+    assert stats["name"] == str(gp_path)
+    assert stats["counters"]["tracks"] == 1
+    assert "load" in stats["timings"]
+    # Tracing is opt-in, as it slows the timed stages down
+    assert set(stats["memory"]["conversion"]) == {"peak_rss"}
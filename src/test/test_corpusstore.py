@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import numpy as np
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.pipeline.corpusstore import CorpusStore, build_corpus
+from src.transforming.measuremap import MeasureMap
+from src.transforming.noteeventtable import NoteEventTable
+from src.transforming.tempomap import TempoMap
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_build_and_read_corpus(tmp_path):
+    broken_path = tmp_path / "broken.gp5"
+    broken_path.write_bytes(b"not a guitar pro file")
+    gp_paths = sorted(TEST_FOLDER_PATH.glob("*.gp[345]"))
+    summary = build_corpus(
+        gp_paths + [broken_path], tmp_path / "store", n_workers=2, chunk_size=500
+    )
+    assert summary["succeeded"] == len(gp_paths)
+    assert summary["failed"] == 1
+    assert summary["n_chunks"] > 1
+
+    corpus_store = CorpusStore(tmp_path / "store")
+    assert sorted(corpus_store) == [str(gp_path) for gp_path in gp_paths]
+    assert list(corpus_store.failures) == [str(broken_path)]
+    gp_serializer = PyGuitarProSerializer()
+    for gp_path in gp_paths:
+        gp_stream = gp_serializer.load(gp_path)
+        events = corpus_store.events(str(gp_path)).events
+        assert isinstance(events.base, np.memmap)
+        assert (events == NoteEventTable.from_song(gp_stream).events).all()
+        tempo_map = TempoMap.from_song(gp_stream)
+        assert corpus_store.tempos(str(gp_path)).tolist() == list(tempo_map)
+        time_signatures = corpus_store.time_signatures(str(gp_path)).tolist()
+        measure_map = MeasureMap.from_song(gp_stream, tempo_map)
+        assert time_signatures == measure_map.time_signature_changes()
+
+    song = str(TEST_FOLDER_PATH / "progmetal.gp3")
+    assert corpus_store.metadata(song)["tracks"][1]["name"] == (
+        gp_serializer.load(song).tracks[1].name
+    )
+    events = corpus_store.events(song).events
+    selected_events = corpus_store.events(song, tracks=[1, 3], measures=(4, 9)).events
+    mask = np.isin(events["track"], [1, 3]) & (events["measure"] >= 4)
+    assert (selected_events == events[mask & (events["measure"] < 9)]).all()
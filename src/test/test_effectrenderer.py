@@ -0,0 +1,127 @@
+import io
+from pathlib import Path
+
+import guitarpro as gm
+import pytest
+
+from src.loading.midifile import QUARTER_TIME_IN_TICKS, MidiFile, MidiTrack
+from src.loading.music21midiwriter import TICKS_PER_QUARTER, Music21MidiWriter
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.effectrenderer import (
+    PITCH_BEND_CENTER,
+    EffectRenderer,
+    PitchBendWriter,
+    simplify,
+    staircase,
+)
+from src.pipeline.batchconvertor import BatchConvertor
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_simplify_and_staircase():
+    line = [(tick, 2.0 * tick) for tick in range(0, 101, 10)]
+    assert simplify(line, 0.1) == [(0, 0.0), (100, 200.0)]
+    peak = [(0, 0.0), (50, 100.0), (100, 0.0), (150, 1.0), (200, 0.0)]
+    assert simplify(peak, 5) == [(0, 0.0), (50, 100.0), (100, 0.0), (200, 0.0)]
+
+    # Steps no higher than the tolerance, no closer than the resolution
+    assert staircase([(0, 0.0), (100, 100.0), (200, 100.0)], 50, 10) == [
+        (0, 0),
+        (50, 50),
+        (100, 100),
+    ]
+    assert staircase([(0, 0.0), (100, 100.0)], 10, 25) == [
+        (0, 0),
+        (25, 25),
+        (50, 50),
+        (75, 75),
+    ]
+
+
+def test_render_bend_and_slide():
+    renderer = EffectRenderer(resolution=10, tolerance=32, bend_range=12)
+    gp_beat = gm.models.Beat(None)
+    gp_note = gm.models.Note(gp_beat, value=5, string=1)
+    gp_note.effect.bend = gm.models.BendEffect(
+        points=[gm.models.BendPoint(0, 0), gm.models.BendPoint(6, 4)]
+    )
+    events = renderer.render(gp_beat, gp_note, 0, 960)
+    # A full bend reaches two semitones halfway through the note
+    assert events[0] == (0, PITCH_BEND_CENTER)
+    assert events[-1] == (480, round(PITCH_BEND_CENTER * (1 + 2 / 12)))
+    assert len(events) < 48
+
+    gp_note.effect.bend = None
+    gp_note.effect.slides = [gm.SlideType.shiftSlideTo]
+    # Without a next note the slide stays at center
+    assert renderer.render(gp_beat, gp_note, 0, 960) == [(0, PITCH_BEND_CENTER)]
+    events = renderer.render(gp_beat, gp_note, 0, 960, slide_interval=-3)
+    # Slides down over the second half of the note
+    assert events[0] == (0, PITCH_BEND_CENTER)
+    assert events[1][0] > 480
+    assert min(value for _, value in events) < PITCH_BEND_CENTER
+
+
+def test_pitch_bend_writer():
+    midi_track = MidiTrack()
+    bends = PitchBendWriter(midi_track, 0)
+    bends.add_curve([(0, PITCH_BEND_CENTER), (10, 9000)], 100)
+    # Starts right where the previous one ends, so no return to center
+    bends.add_curve([(100, 9000), (110, 9500)], 200)
+    bends.add_curve([(300, 8000)], 400)
+    bends.flush()
+    assert midi_track.pitch_bends() == [
+        (10, 0, 9000),
+        (110, 0, 9500),
+        (200, 0, PITCH_BEND_CENTER),
+        (300, 0, 8000),
+        (400, 0, PITCH_BEND_CENTER),
+    ]
+
+
+def test_convertor_renders_effects():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    plain_file = GuitarProToMidiConvertor(gp_stream).apply()
+    effects_file = GuitarProToMidiConvertor(gp_stream, effects=EffectRenderer()).apply()
+    fp = io.BytesIO()
+    GuitarProToMidiConvertor(gp_stream, effects=EffectRenderer()).write(fp)
+    assert fp.getvalue() == effects_file.to_bytes()
+
+    effects_file = MidiFile.from_bytes(effects_file.to_bytes())
+    dense_file = GuitarProToMidiConvertor(
+        gp_stream, effects=EffectRenderer(resolution=1, tolerance=0)
+    ).apply()
+    n_bends = n_dense_bends = 0
+    for plain_track, effects_track, dense_track in zip(
+        plain_file.tracks, effects_file.tracks, dense_file.tracks
+    ):
+        assert effects_track.notes() == plain_track.notes()
+        pitch_bends = effects_track.pitch_bends()
+        # Every curve goes back to center
+        if pitch_bends:
+            assert pitch_bends[-1][2] == PITCH_BEND_CENTER
+        n_bends += len(pitch_bends)
+        n_dense_bends += len(dense_track.pitch_bends())
+    assert 0 < n_bends * 10 < n_dense_bends
+
+
+def test_music21_engine_renders_effects():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "slapbass.gp3")
+    plain_file = MidiFile.from_bytes(
+        Music21MidiWriter(GuitarProToMusic21Convertor(gp_stream).apply()).to_bytes()
+    )
+    m21_score = GuitarProToMusic21Convertor(gp_stream, effects=EffectRenderer()).apply()
+    effects_file = MidiFile.from_bytes(Music21MidiWriter(m21_score).to_bytes())
+    assert effects_file.tracks[1].notes() == plain_file.tracks[1].notes()
+    # The same curves as the midi engine, at the resolution of music21
+    midi_file = GuitarProToMidiConvertor(gp_stream, effects=EffectRenderer()).apply()
+    scale = TICKS_PER_QUARTER / QUARTER_TIME_IN_TICKS
+    assert effects_file.tracks[1].pitch_bends()[1:] == [
+        (round(tick * scale), 0, value)
+        for tick, _, value in midi_file.tracks[1].pitch_bends()
+    ]
+    with pytest.raises(ValueError):
+        BatchConvertor(Path("output"), effects=EffectRenderer())
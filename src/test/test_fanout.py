@@ -0,0 +1,90 @@
+import io
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from src.loading.serialization import Music21Serializer, PyGuitarProSerializer
+from src.pipeline.fanout import (
+    EventDumpSink,
+    FanOut,
+    MidiSink,
+    MusicXmlSink,
+    OutputSink,
+    publish,
+)
+from src.profiling.conversionstats import ConversionStats
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+from src.transforming.noteeventtable import NoteEventTable
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+class _FailingSink(OutputSink):
+    name = "failing"
+    extension = ".fail"
+
+    def dumps(self, views):
+        views.m21_score()
+        raise RuntimeError("sink failed")
+
+
+def test_fan_out():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    stats = ConversionStats("progmetal")
+    fan_out = FanOut([MusicXmlSink(), MidiSink(), EventDumpSink()], stats=stats)
+    targets = {name: io.BytesIO() for name in ("midi", "musicxml", "events")}
+    assert fan_out.run(gp_stream, targets) == {
+        "musicxml": None,
+        "midi": None,
+        "events": None,
+    }
+    # Both music21 sinks share one conversion
+    assert stats.counters["tracks"] == len(gp_stream.tracks)
+    m21_score = GuitarProToMusic21Convertor(gp_stream).apply()
+    expected_midi = Music21Serializer(midi_backend="fast").dumps(m21_score)
+    assert targets["midi"].getvalue() == expected_midi
+    assert targets["musicxml"].getvalue().startswith(b"<?xml")
+    events = json.loads(targets["events"].getvalue())
+    assert len(events["events"]["pitch"]) == len(NoteEventTable.from_song(gp_stream))
+    assert [track["name"] for track in events["tracks"]] == [
+        track.name for track in gp_stream.tracks
+    ]
+    with pytest.raises(ValueError):
+        fan_out.register(MidiSink(engine="midi"))
+
+
+def test_fan_out_isolates_failures(tmp_path):
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "slapbass.gp3")
+    fan_out = FanOut([_FailingSink(), MidiSink(engine="midi"), EventDumpSink()])
+    targets = fan_out.targets(tmp_path / "slapbass")
+    del targets["events"]
+    errors = fan_out.run(gp_stream, targets)
+    assert "RuntimeError: sink failed" in errors["failing"]
+    assert errors["midi"] is None
+    assert "events" not in errors
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["slapbass.mid"]
+
+
+def test_publish(tmp_path):
+    input_folder = tmp_path / "songs"
+    (input_folder / "bass").mkdir(parents=True)
+    shutil.copy(TEST_FOLDER_PATH / "slapbass.gp3", input_folder / "bass")
+    (input_folder / "broken.gp5").write_text("not a song")
+    output_folder = tmp_path / "output"
+    summary = publish([input_folder], output_folder, n_workers=2)
+    assert summary["total"] == 2
+    assert summary["failed"] == 1
+    assert sorted(summary["errors"][str(input_folder / "broken.gp5")]) == [
+        "events",
+        "midi",
+        "musicxml",
+        "tokens",
+    ]
+    assert sorted(path.name for path in (output_folder / "bass").iterdir()) == [
+        "slapbass.gp3.json",
+        "slapbass.gp3.mid",
+        "slapbass.gp3.musicxml",
+        "slapbass.gp3.tokens.npy",
+    ]
@@ -54,13 +54,9 @@ def test_create_new_m21_measure(gp_to_m21_convertor):
     gp_song = gp_to_m21_convertor.gp_stream
     gp_measure = gp_song.tracks[0].measures[0]
     gp_time_signature = gp_measure.timeSignature
-    is_repeat_open = gp_measure.header.isRepeatOpen
-    repeat_close = gp_measure.header.repeatClose
     assert type(gp_measure) == gm.models.Measure
     assert type(gp_time_signature) == gm.models.TimeSignature
-    m21_measure = gp_to_m21_convertor._create_m21_measure(
-        0, 0, gp_time_signature, is_repeat_open, repeat_close
-    )
+    m21_measure = gp_to_m21_convertor._create_m21_measure(0, 0)
     assert type(m21_measure) == m21.stream.Measure
     assert m21_measure.timeSignature.ratioString == "4/4"
     m21_tempo = m21_measure.recurse().getElementsByClass(m21.tempo.MetronomeMark)[0]
@@ -78,11 +74,10 @@ def test_create_new_m21_voice(gp_to_m21_convertor):
 
 def test_create_m21_note(gp_to_m21_convertor):
     gp_song = gp_to_m21_convertor.gp_stream
-    m21_voice = gp_song.tracks[0].measures[0].voices[0]
     gp_beat = gp_song.tracks[0].measures[0].voices[0].beats[0]
     gp_note = gp_beat.notes[0]
     assert type(gp_note) == gm.models.Note
-    m21_note = gp_to_m21_convertor._create_m21_note(0, gp_beat, gp_note, m21_voice)
+    m21_note = gp_to_m21_convertor._create_m21_note(0, gp_beat, gp_note)
     assert type(m21_note) == m21.note.Note
     assert m21_note.nameWithOctave == "E4"
     assert m21_note.quarterLength == 0.5
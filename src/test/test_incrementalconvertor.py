@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+
+import guitarpro as gm
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.pipeline.batchconvertor import BatchConvertor
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.incrementalconvertor import (
+    STATE_SUFFIX,
+    IncrementalMidiConvertor,
+    MeasureSummary,
+    load_state,
+    tie_segments,
+)
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_tie_segments():
+    summaries = [
+        MeasureSummary("", frozenset(), frozenset({1})),
+        MeasureSummary("", frozenset(), frozenset({2})),
+        # Continues the note of string 1 two measures back
+        MeasureSummary("", frozenset({1}), frozenset()),
+        MeasureSummary("", frozenset(), frozenset({1})),
+        MeasureSummary("", frozenset({3}), frozenset()),
+    ]
+    assert tie_segments(summaries) == [(0, 3), (3, 4), (4, 5)]
+    assert tie_segments([]) == []
+
+
+def test_incremental_conversion():
+    gp_path = TEST_FOLDER_PATH / "progmetal.gp3"
+    gp_serializer = PyGuitarProSerializer()
+    convertor = IncrementalMidiConvertor(gp_serializer.load(gp_path))
+    convertor.apply()
+    state = convertor.state
+
+    gp_stream = gp_serializer.load(gp_path)
+    gp_note = gp_stream.tracks[1].measures[10].voices[0].beats[0].notes[0]
+    gp_note.value += 2
+    convertor = IncrementalMidiConvertor(gp_stream, state)
+    midi_file = convertor.apply()
+    assert (
+        midi_file.to_bytes() == GuitarProToMidiConvertor(gp_stream).apply().to_bytes()
+    )
+    assert 0 < convertor.n_converted_measures < 5
+    assert convertor.n_reused_measures > 200
+
+    # A new measure changes the structure, so everything is converted again
+    gp_stream.newMeasure()
+    convertor = IncrementalMidiConvertor(gp_stream, state)
+    convertor.apply()
+    assert convertor.n_reused_measures == 0
+
+
+def test_batch_convertor_incremental(tmp_path):
+    gp_path = tmp_path / "song.gp3"
+    gp_serializer = PyGuitarProSerializer()
+    gp_stream = gp_serializer.load(TEST_FOLDER_PATH / "slapbass.gp3")
+    gp_serializer.dump(gp_stream, gp_path)
+    batch_convertor = BatchConvertor(
+        tmp_path / "output", engine="midi", incremental=True, collect_stats=True
+    )
+    output_path = tmp_path / "output" / "song.gp3.mid"
+    batch_convertor.run([gp_path])
+    assert load_state(Path(str(output_path) + STATE_SUFFIX)) is not None
+
+    gp_stream.tracks[0].measures[3].voices[0].beats[0].notes[0].velocity = 40
+    gp_serializer.dump(gp_stream, gp_path)
+    summary = batch_convertor.run([gp_path])
+    assert summary["succeeded"] == 1
+    with open(batch_convertor.manifest_path) as fp:
+        counters = json.loads(fp.readlines()[-1])["timings"]["stats"]["counters"]
+    assert counters["measures_converted"] == 1
+    assert counters["measures_reused"] == 10
+    expected_midi_file = GuitarProToMidiConvertor(gp_serializer.load(gp_path)).apply()
+    assert output_path.read_bytes() == expected_midi_file.to_bytes()
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.measuremap import MeasureMap
+from src.transforming.tempomap import TempoMap
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_measure_map_from_song():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(
+        TEST_FOLDER_PATH / "Metallica - Nothing else matters (7).gp3.gp2tokens2gp.gp5"
+    )
+    measure_map = MeasureMap.from_song(gp_file)
+    assert len(measure_map) == len(gp_file.measureHeaders)
+    assert measure_map[0].start == 0
+    assert measure_map[1].start == measure_map[0].end
+    assert measure_map.time_signature_changes()[:4] == [
+        (0, 3, 4),
+        (14400, 2, 4),
+        (16320, 7, 32),
+        (17160, 3, 8),
+    ]
+    assert measure_map[0].is_time_signature_change
+    assert not measure_map[1].is_time_signature_change
+    assert measure_map[51].is_repeat_open
+    assert measure_map[10].tempo_changes == [(25080, 70)]
+
+
+def test_measure_map_repeats():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(TEST_FOLDER_PATH / "progmetal.gp3")
+    measure_map = MeasureMap.from_song(gp_file)
+    assert measure_map[0].is_repeat_open
+    assert measure_map[3].repeat_close == 1
+    assert measure_map[7].repeat_alternative == 7
+
+
+def test_playback_order():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(TEST_FOLDER_PATH / "progmetal.gp3")
+    playback_order = MeasureMap.from_song(gp_file).playback_order()
+    # Endings 1-3 on measure 7 close the repeat, ending 4 on measure 8 leaves it
+    assert playback_order[:25] == (
+        [0, 1, 2, 3] * 2 + [4, 5, 6, 7] * 3 + [4, 5, 6, 8, 9]
+    )
+    gp_file = gp_serializer.load(TEST_FOLDER_PATH / "slapbass.gp3")
+    assert MeasureMap.from_song(gp_file).playback_order() == list(range(11))
+
+
+def test_unrolled():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(
+        TEST_FOLDER_PATH / "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5"
+    )
+    tempo_map = TempoMap.from_song(gp_file)
+    measure_map = MeasureMap.from_song(gp_file, tempo_map)
+    unrolled_measure_map, unrolled_tempo_map = measure_map.unrolled(tempo_map)
+    assert [measure.index for measure in unrolled_measure_map] == (
+        list(range(25)) + list(range(1, 35))
+    )
+    second_pass = unrolled_measure_map[25]
+    assert second_pass.start == measure_map[24].end
+    assert second_pass.shift == second_pass.start - measure_map[1].start
+    assert not any(
+        measure.is_repeat_open or measure.repeat_close > 0
+        for measure in unrolled_measure_map
+    )
+    assert list(unrolled_tempo_map) == list(tempo_map)
+
+    gp_file = gp_serializer.load(TEST_FOLDER_PATH / "slapbass.gp3")
+    measure_map = MeasureMap.from_song(gp_file)
+    assert measure_map.unrolled(tempo_map) == (measure_map, tempo_map)
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+from pytest import fixture
+import guitarpro as gm
+
+from src.loading.midifile import MidiFile
+from src.loading.serialization import Music21Serializer, PyGuitarProSerializer
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+@fixture
+def gp_file():
+    gp_serializer = PyGuitarProSerializer()
+    return gp_serializer.load(
+        TEST_FOLDER_PATH / "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5"
+    )
+
+
+def test_guitarpro_to_midi_convertor_init(gp_file):
+    gp_to_midi_convertor = GuitarProToMidiConvertor(gp_file)
+    assert gp_to_midi_convertor.metadata["tempo"] == 70
+    assert gp_to_midi_convertor.metadata["artist"] == "Antonio Carlos, Jobim"
+
+
+def test_apply(gp_file):
+    midi_file = GuitarProToMidiConvertor(gp_file).apply()
+    assert type(midi_file) == MidiFile
+    # Conductor track plus one track per GuitarPro track
+    assert len(midi_file.tracks) == len(gp_file.tracks) + 1
+    [(tempo_tick, bpm)] = midi_file.tracks[0].tempos()
+    assert tempo_tick == 0
+    assert round(bpm) == 70
+    assert midi_file.tracks[0].time_signatures() == [(0, 4, 4)]
+    notes = [
+        (note.start, note.duration, note.pitch) for note in midi_file.tracks[1].notes()
+    ]
+    assert (0, 480, 64) in notes
+
+
+def test_apply_matches_music21_convertor(gp_file, tmp_path):
+    midi_file = GuitarProToMidiConvertor(gp_file).apply()
+    m21_stream = GuitarProToMusic21Convertor(gp_file).apply()
+    save_path = tmp_path / "music21.mid"
+    Music21Serializer().dump(m21_stream, save_path)
+    with open(save_path, "rb") as fp:
+        m21_midi_file = MidiFile.read(fp)
+    scale = m21_midi_file.ticks_per_quarter / midi_file.ticks_per_quarter
+    expected_notes = [
+        (note.start / scale, note.duration / scale, note.pitch)
+        for note in m21_midi_file.tracks[1].notes()
+    ]
+    notes = [
+        (note.start, note.duration, note.pitch) for note in midi_file.tracks[1].notes()
+    ]
+    assert notes == expected_notes
+
+
+def test_cross_measure_tie_is_extended():
+    song = gm.Song()
+    track = song.tracks[0]
+    song.newMeasure()
+    song.measureHeaders[1].start = song.measureHeaders[0].end
+    for gp_measure, note_type in zip(
+        track.measures, (gm.NoteType.normal, gm.NoteType.tie)
+    ):
+        voice = gp_measure.voices[0]
+        beat = gm.Beat(
+            voice, duration=gm.Duration(value=1), status=gm.BeatStatus.normal
+        )
+        beat.start = gp_measure.start
+        beat.notes.append(gm.Note(beat, value=3, string=1, type=note_type))
+        voice.beats.append(beat)
+    midi_file = GuitarProToMidiConvertor(song).apply()
+    notes = midi_file.tracks[1].notes()
+    assert len(notes) == 1
+    assert notes[0].duration == 8 * 960
+    assert notes[0].pitch == 67
+
+
+def test_parallel_apply_matches_serial_apply():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(TEST_FOLDER_PATH / "progmetal.gp3")
+    serial_midi_file = GuitarProToMidiConvertor(gp_file).apply()
+    parallel_midi_file = GuitarProToMidiConvertor(gp_file, n_workers=3).apply()
+    assert len(parallel_midi_file.tracks) == 6
+    assert parallel_midi_file.to_bytes() == serial_midi_file.to_bytes()
+
+
+def test_unroll_repeats_matches_music21_convertor(gp_file, tmp_path):
+    midi_file = GuitarProToMidiConvertor(gp_file, unroll_repeats=True).apply()
+    notes = [
+        (note.start, note.duration, note.pitch) for note in midi_file.tracks[1].notes()
+    ]
+    default_notes = GuitarProToMidiConvertor(gp_file).apply().tracks[1].notes()
+    assert len(notes) > len(default_notes)
+    m21_stream = GuitarProToMusic21Convertor(gp_file, unroll_repeats=True).apply()
+    save_path = tmp_path / "music21.mid"
+    Music21Serializer().dump(m21_stream, save_path)
+    with open(save_path, "rb") as fp:
+        m21_midi_file = MidiFile.read(fp)
+    scale = m21_midi_file.ticks_per_quarter / midi_file.ticks_per_quarter
+    expected_notes = [
+        (note.start / scale, note.duration / scale, note.pitch)
+        for note in m21_midi_file.tracks[1].notes()
+    ]
+    assert notes == expected_notes
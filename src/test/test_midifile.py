@@ -0,0 +1,30 @@
+from src.loading.midifile import MidiFile, encode_variable_length
+
+
+def test_encode_variable_length():
+    assert encode_variable_length(0) == b"\x00"
+    assert encode_variable_length(0x7F) == b"\x7f"
+    assert encode_variable_length(0x80) == b"\x81\x00"
+    assert encode_variable_length(0x0FFFFFFF) == b"\xff\xff\xff\x7f"
+
+
+def test_midi_file_round_trip():
+    midi_file = MidiFile()
+    conductor_track = midi_file.add_track()
+    conductor_track.add_tempo(0, 120)
+    conductor_track.add_time_signature(0, 6, 8)
+    track = midi_file.add_track()
+    track.add_program_change(0, 0, 33)
+    track.add_note(0, 960, 60, 90, 0)
+    # Same pitch restarting exactly where the previous note ends
+    track.add_note(960, 480, 60, 80, 0)
+    loaded_midi_file = MidiFile.from_bytes(midi_file.to_bytes())
+    assert loaded_midi_file.ticks_per_quarter == 960
+    assert len(loaded_midi_file.tracks) == 2
+    assert loaded_midi_file.tracks[0].tempos() == [(0, 120.0)]
+    assert loaded_midi_file.tracks[0].time_signatures() == [(0, 6, 8)]
+    notes = loaded_midi_file.tracks[1].notes()
+    assert [(note.start, note.duration, note.velocity) for note in notes] == [
+        (0, 960, 90),
+        (960, 480, 80),
+    ]
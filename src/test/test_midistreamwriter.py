@@ -0,0 +1,134 @@
+import io
+from pathlib import Path
+
+import guitarpro as gm
+from pytest import raises
+
+from src.loading.midifile import MidiFile
+from src.loading.midistreamwriter import StreamingMidiTrack, StreamingMidiWriter
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+class NonSeekableFile(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def test_streaming_writer_matches_midi_file():
+    midi_file = MidiFile()
+    track = midi_file.add_track()
+    track.add_note(0, 960, 60, 90, 0)
+    track.add_note(480, 960, 64, 90, 0)
+
+    fp = io.BytesIO()
+    with StreamingMidiWriter(fp) as writer:
+        streaming_track = writer.begin_track()
+        streaming_track.add_note(0, 960, 60, 90, 0)
+        streaming_track.flush(480)
+        streaming_track.add_note(480, 960, 64, 90, 0)
+        writer.end_track()
+    assert fp.getvalue() == midi_file.to_bytes()
+
+
+def test_streaming_writer_rejects_late_events():
+    with StreamingMidiWriter(io.BytesIO()) as writer:
+        streaming_track = writer.begin_track()
+        streaming_track.add_note(0, 960, 60, 90, 0)
+        streaming_track.flush(960)
+        with raises(ValueError):
+            streaming_track.add_note(480, 960, 64, 90, 0)
+
+
+def test_convertor_write_matches_apply():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(
+        TEST_FOLDER_PATH / "Metallica - Nothing else matters (7).gp3.gp2tokens2gp.gp5"
+    )
+    midi_bytes = GuitarProToMidiConvertor(gp_file).apply().to_bytes()
+
+    fp = io.BytesIO()
+    GuitarProToMidiConvertor(gp_file).write(fp)
+    assert fp.getvalue() == midi_bytes
+
+    # Chunks are buffered per track when the file cannot seek back
+    non_seekable_fp = NonSeekableFile()
+    GuitarProToMidiConvertor(gp_file).write(non_seekable_fp)
+    assert bytes(non_seekable_fp.data) == midi_bytes
+
+
+def test_convertor_write_matches_apply_with_tie_after_rests():
+    gp_file = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "slapbass.gp3")
+    measures = gp_file.tracks[0].measures
+    gp_note = next(
+        gp_note
+        for gp_beat in reversed(measures[0].voices[0].beats)
+        for gp_note in gp_beat.notes
+        if gp_note.type == gm.NoteType.normal
+    )
+    # Rests only in measure 1, then a tie on the same string in measure 2
+    for gp_voice in measures[1].voices:
+        for gp_beat in gp_voice.beats:
+            gp_beat.notes = []
+    tie_beat = measures[2].voices[0].beats[0]
+    tie_note = gm.models.Note(
+        tie_beat, value=gp_note.value, string=gp_note.string, type=gm.NoteType.tie
+    )
+    tie_beat.notes = [tie_note]
+    midi_file = GuitarProToMidiConvertor(gp_file).apply()
+
+    fp = io.BytesIO()
+    GuitarProToMidiConvertor(gp_file).write(fp)
+    assert fp.getvalue() == midi_file.to_bytes()
+
+
+def _long_song(n_measures):
+    """One note on string 1, then quarter notes on string 2 in every measure."""
+    song = gm.Song()
+    track = song.tracks[0]
+    for idx_measure in range(1, n_measures):
+        song.newMeasure()
+        header = song.measureHeaders[idx_measure]
+        header.start = song.measureHeaders[idx_measure - 1].end
+    for idx_measure, gp_measure in enumerate(track.measures):
+        voice = gp_measure.voices[0]
+        for idx_beat in range(4):
+            beat = gm.Beat(
+                voice, duration=gm.Duration(value=4), status=gm.BeatStatus.normal
+            )
+            beat.start = gp_measure.start + idx_beat * 960
+            string = 1 if idx_measure == idx_beat == 0 else 2
+            beat.notes.append(
+                gm.Note(beat, value=idx_beat, string=string, type=gm.NoteType.normal)
+            )
+            voice.beats.append(beat)
+    return song
+
+
+def test_convertor_write_keeps_few_events_on_long_songs(monkeypatch):
+    pending_counts = []
+    flush = StreamingMidiTrack.flush
+
+    def counting_flush(self, until_tick=None):
+        pending_counts.append(len(self._heap))
+        flush(self, until_tick)
+
+    monkeypatch.setattr(StreamingMidiTrack, "flush", counting_flush)
+    max_pending = []
+    for n_measures in (10, 200):
+        gp_file = _long_song(n_measures)
+        pending_counts.clear()
+        fp = io.BytesIO()
+        GuitarProToMidiConvertor(gp_file).write(fp)
+        assert fp.getvalue() == GuitarProToMidiConvertor(gp_file).apply().to_bytes()
+        max_pending.append(max(pending_counts))
+    assert max_pending[0] == max_pending[1] < 20
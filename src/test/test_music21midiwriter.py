@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import music21 as m21
+import pytest
+
+from src.benchmarks.songgenerator import SongSpec, generate_song
+from src.loading.music21midiwriter import Music21MidiWriter, UnsupportedScoreError
+from src.loading.serialization import Music21Serializer, PyGuitarProSerializer
+from src.profiling.conversionstats import ConversionStats
+from src.transforming.guitarprotomusic21convertor import GuitarProToMusic21Convertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def _music21_midi_bytes(m21_score: m21.stream.Score, tmp_path: Path) -> bytes:
+    midi_path = tmp_path / "music21.mid"
+    m21_score.write("midi", midi_path, quantizePost=False)
+    return midi_path.read_bytes()
+
+
+def test_same_bytes_as_music21(tmp_path):
+    gp_file = PyGuitarProSerializer().load(
+        TEST_FOLDER_PATH / "Antonio Carlos, Jobim - Engano.gp4.gp2tokens2gp.gp5"
+    )
+    m21_score = GuitarProToMusic21Convertor(gp_file).apply()
+    assert Music21MidiWriter(m21_score).to_bytes() == _music21_midi_bytes(
+        m21_score, tmp_path
+    )
+
+
+def test_same_bytes_as_music21_with_repeats(tmp_path):
+    spec = SongSpec(
+        n_tracks=3,
+        n_measures=12,
+        n_voices=2,
+        tie_density=0.5,
+        tuplet_density=0.3,
+        n_tempo_changes=2,
+        n_time_signature_changes=2,
+    )
+    gp_stream = generate_song(spec)
+    # Percussion, and two tracks sharing a program
+    gp_stream.tracks[1].channel.channel = 9
+    gp_stream.tracks[2].channel.instrument = gp_stream.tracks[0].channel.instrument
+    # Nested repeats, the outer one played three times
+    measure_headers = gp_stream.measureHeaders
+    measure_headers[2].isRepeatOpen = True
+    measure_headers[4].isRepeatOpen = True
+    measure_headers[5].repeatClose = 2
+    measure_headers[7].repeatClose = 3
+    m21_score = GuitarProToMusic21Convertor(gp_stream).apply()
+    assert Music21MidiWriter(m21_score).to_bytes() == _music21_midi_bytes(
+        m21_score, tmp_path
+    )
+
+
+def test_write_parts_one_at_a_time(tmp_path):
+    gp_file = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    m21_score = GuitarProToMusic21Convertor(gp_file).apply()
+    expected_bytes = Music21MidiWriter(m21_score).to_bytes()
+    midi_writer = Music21MidiWriter()
+    for m21_part in m21_score.parts:
+        midi_writer.add_part(m21_part)
+    assert midi_writer.to_bytes() == expected_bytes
+
+    # Each part is written as it is converted, and its track released
+    convertor = GuitarProToMusic21Convertor(gp_file, low_memory=True)
+    serializer = Music21Serializer(midi_backend="fast")
+    serializer.dump_parts(
+        convertor.m21_score, convertor.iter_parts(), tmp_path / "parts.mid"
+    )
+    assert (tmp_path / "parts.mid").read_bytes() == expected_bytes
+    assert all(not track.measures for track in gp_file.tracks)
+    with pytest.raises(UnsupportedScoreError):
+        Music21MidiWriter().to_bytes()
+
+
+def test_unsupported_score():
+    gp_file = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "slapbass.gp3")
+    m21_score = GuitarProToMusic21Convertor(gp_file).apply()
+    m21_score.parts[0].measure(1).voices[0].insert(0, m21.dynamics.Dynamic("pp"))
+    with pytest.raises(UnsupportedScoreError):
+        Music21MidiWriter(m21_score).to_bytes()
+
+
+def test_serializer_fast_backend(tmp_path):
+    gp_file = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "slapbass.gp3")
+    m21_score = GuitarProToMusic21Convertor(gp_file).apply()
+    stats = ConversionStats()
+    serializer = Music21Serializer(stats=stats, midi_backend="fast")
+    serializer.dump(m21_score, tmp_path / "fast.mid")
+    assert (tmp_path / "fast.mid").read_bytes() == _music21_midi_bytes(
+        m21_score, tmp_path
+    )
+    # Dynamics are not supported, so music21 writes the file
+    m21_score.parts[0].measure(1).voices[0].insert(0, m21.dynamics.Dynamic("pp"))
+    serializer.dump(m21_score, tmp_path / "fallback.mid")
+    assert (tmp_path / "fallback.mid").read_bytes() == _music21_midi_bytes(
+        m21_score, tmp_path
+    )
+    assert stats.counters == {"midi_fallbacks": 1}
+    with pytest.raises(ValueError):
+        Music21Serializer(midi_backend="pretty_midi")
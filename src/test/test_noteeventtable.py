@@ -0,0 +1,121 @@
+from pathlib import Path
+
+import numpy as np
+from pytest import fixture
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+from src.transforming.measuremap import MeasureMap
+from src.transforming.noteeventtable import (
+    NOTE_EVENT_DTYPE,
+    NOTE_TYPE_NORMAL,
+    NOTE_TYPE_TIE,
+    NoteEventTable,
+)
+from src.transforming.tempomap import TempoMap
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+@fixture
+def gp_file():
+    gp_serializer = PyGuitarProSerializer()
+    return gp_serializer.load(TEST_FOLDER_PATH / "progmetal.gp3")
+
+
+def _create_table(rows):
+    events = np.zeros(len(rows), dtype=NOTE_EVENT_DTYPE)
+    for column in ("track", "string", "start", "duration", "pitch", "note_type"):
+        events[column] = [row[column] for row in rows]
+    return NoteEventTable(events)
+
+
+def test_from_song(gp_file):
+    note_event_table = NoteEventTable.from_song(gp_file)
+    assert len(note_event_table) == 2959
+    assert set(np.unique(note_event_table["track"])) == set(range(5))
+    assert note_event_table["start"].min() == 0
+    statistics = note_event_table.track_statistics()
+    assert statistics[0]["n_ties"] == 12
+    assert statistics[0]["n_rests"] == 20
+
+
+def test_merge_ties_matches_midi_convertor(gp_file):
+    merged_table = NoteEventTable.from_song(gp_file).merge_ties()
+    midi_file = GuitarProToMidiConvertor(gp_file).apply()
+    for idx_track in range(len(gp_file.tracks)):
+        track_events = merged_table.events[
+            (merged_table["track"] == idx_track) & merged_table.sounding
+        ]
+        notes = sorted(
+            zip(
+                track_events["start"].tolist(),
+                track_events["duration"].tolist(),
+                track_events["pitch"].tolist(),
+            )
+        )
+        expected_notes = [
+            (note.start, note.duration, note.pitch)
+            for note in midi_file.tracks[idx_track + 1].notes()
+        ]
+        assert notes == sorted(expected_notes)
+
+
+def test_unrolled_matches_midi_convertor(gp_file):
+    tempo_map = TempoMap.from_song(gp_file)
+    measure_map, _ = MeasureMap.from_song(gp_file, tempo_map).unrolled(tempo_map)
+    table = NoteEventTable.from_song(gp_file)
+    unrolled_table = table.unrolled(measure_map)
+    assert len(unrolled_table) > len(table)
+    merged_table = unrolled_table.merge_ties()
+    events = merged_table.events[merged_table.sounding]
+    midi_file = GuitarProToMidiConvertor(gp_file, unroll_repeats=True).apply()
+    expected_notes = [
+        (idx_track, note.start, note.duration, note.pitch)
+        for idx_track, midi_track in enumerate(midi_file.tracks[1:])
+        for note in midi_track.notes()
+    ]
+    notes = zip(
+        events["track"].tolist(),
+        events["start"].tolist(),
+        events["duration"].tolist(),
+        events["pitch"].tolist(),
+    )
+    assert sorted(notes) == sorted(expected_notes)
+
+
+def test_merge_ties_per_string():
+    note_event_table = _create_table(
+        [
+            dict(track=0, string=1, start=0, duration=960, pitch=64, note_type=1),
+            dict(track=0, string=2, start=0, duration=960, pitch=59, note_type=1),
+            dict(track=0, string=1, start=3840, duration=480, pitch=64, note_type=2),
+            dict(track=1, string=2, start=960, duration=960, pitch=59, note_type=2),
+        ]
+    )
+    merged_table = note_event_table.merge_ties()
+    assert merged_table["duration"].tolist() == [4320, 960, 960]
+    assert merged_table["note_type"].tolist() == [
+        NOTE_TYPE_NORMAL,
+        NOTE_TYPE_NORMAL,
+        NOTE_TYPE_TIE,
+    ]
+
+
+def test_transpose_and_quantization(gp_file):
+    note_event_table = NoteEventTable.from_song(gp_file)
+    transposed_table = note_event_table.transpose(2, tracks=[0])
+    is_first_track = (note_event_table["track"] == 0) & note_event_table.sounding
+    assert np.array_equal(
+        transposed_table["pitch"][is_first_track],
+        note_event_table["pitch"][is_first_track] + 2,
+    )
+    assert np.array_equal(
+        transposed_table["pitch"][~is_first_track],
+        note_event_table["pitch"][~is_first_track],
+    )
+    # Triplets are the only rows off the sixteenth grid
+    off_grid = ~note_event_table.is_quantized(240)
+    assert off_grid.any()
+    assert (note_event_table["tuplet_enters"][off_grid] == 3).all()
+    assert note_event_table.quantization_offsets(240).max() < 120
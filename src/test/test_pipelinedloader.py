@@ -0,0 +1,60 @@
+import shutil
+import time
+from pathlib import Path
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.pipeline.pipelinedloader import PipelinedLoader
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def _count_tracks(path, gp_stream):
+    return len(gp_stream.tracks)
+
+
+def test_pipelined_loader():
+    paths = sorted(TEST_FOLDER_PATH.glob("*.gp[345]"))
+    results = list(PipelinedLoader(paths, n_workers=2, n_readers=2, prefetch=1))
+    assert sorted(result.path for result in results) == paths
+    gp_serializer = PyGuitarProSerializer()
+    for result in results:
+        assert result.error is None
+        assert result.value == gp_serializer.load(result.path)
+
+
+def test_pipelined_loader_function_and_failures(tmp_path):
+    not_guitarpro_path = tmp_path / "song.gp5"
+    not_guitarpro_path.write_text("not a song")
+    paths = [
+        TEST_FOLDER_PATH / "slapbass.gp3",
+        tmp_path / "missing.gp5",
+        not_guitarpro_path,
+    ]
+    results = {
+        result.path: result
+        for result in PipelinedLoader(paths, function=_count_tracks, n_workers=2)
+    }
+    assert results[paths[0]].value == 1
+    assert "FileNotFoundError" in results[paths[1]].error
+    assert results[paths[2]].value is None
+    assert results[paths[2]].error is not None
+
+
+def test_pipelined_loader_backpressure(tmp_path):
+    gp_path = tmp_path / "song_0.gp3"
+    shutil.copy(TEST_FOLDER_PATH / "slapbass.gp3", gp_path)
+    pulled_paths = []
+
+    def paths():
+        for _ in range(50):
+            pulled_paths.append(gp_path)
+            yield gp_path
+
+    loader = PipelinedLoader(paths(), _count_tracks, n_workers=1, prefetch=2)
+    for result in loader:
+        assert result.value == 1
+        # Let the reader run ahead as far as it can
+        time.sleep(0.5)
+        # Two queued files, one waiting in the reader and the one parsed
+        assert len(pulled_paths) == 4
+        break
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import numpy as np
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.pipeline.roundtripverifier import (
+    ROUND_TRIP_DTYPE,
+    compare_notes,
+    verify_files,
+    verify_song,
+)
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def _notes(rows):
+    return np.array(rows, dtype=ROUND_TRIP_DTYPE)
+
+
+def test_compare_notes():
+    expected = _notes(
+        [
+            (0, 0, 960, 60),
+            (0, 0, 960, 60),
+            (0, 960, 1920, 64),
+            (0, 2880, 480, 67),
+            (0, 3360, 480, 69),
+            (1, 0, 480, 40),
+        ]
+    )
+    actual = _notes(
+        [
+            (0, 0, 960, 60),
+            (0, 0, 960, 60),
+            # The tie of the note is played again
+            (0, 960, 960, 64),
+            (0, 1920, 960, 64),
+            # Starts early, as after a missing rest
+            (0, 2400, 480, 67),
+            (1, 0, 480, 40),
+            (1, 480, 480, 45),
+        ]
+    )
+    report = compare_notes(expected, actual)
+    assert not report.ok
+    assert report.n_matched == 3
+    assert report.n_wrong_duration == 1
+    assert report.n_dropped_tie == 1
+    assert report.n_shifted == 1
+    assert report.n_missing == 1
+    assert report.n_extra == 1
+    assert report.examples["shifted"] == [[0, 2880, 480, 67, -480]]
+    assert report.examples["missing"] == [[0, 3360, 480, 69]]
+    assert compare_notes(expected, expected).ok
+
+
+def test_compare_notes_shifts_one_to_one():
+    expected = _notes([(0, 0, 480, 60), (0, 960, 480, 60)])
+    # A single note between the two missing ones
+    actual = _notes([(0, 600, 480, 60)])
+    report = compare_notes(expected, actual)
+    assert report.n_shifted == 1
+    assert report.n_missing == 1
+    assert report.n_extra == 0
+    assert report.examples["shifted"] == [[0, 960, 480, 60, -360]]
+    assert report.examples["missing"] == [[0, 0, 480, 60]]
+
+
+def test_verify_song():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    report = verify_song(gp_stream, unroll_repeats=True)
+    assert report.ok
+    assert report.n_matched == report.n_expected > 0
+
+
+def test_verify_song_with_repeats_by_default():
+    gp_stream = PyGuitarProSerializer().load(TEST_FOLDER_PATH / "progmetal.gp3")
+    for engine in ("music21", "midi"):
+        report = verify_song(gp_stream, engine=engine)
+        assert report.ok
+        assert report.n_matched == report.n_expected > 0
+
+
+def test_verify_files(tmp_path):
+    (tmp_path / "broken.gp5").write_text("not a song")
+    summary = verify_files([TEST_FOLDER_PATH, tmp_path], engine="midi", n_workers=2)
+    assert summary["total"] == 5
+    assert summary["passed"] == 4
+    assert summary["mismatched"] == 0
+    assert list(summary["errors"]) == [str(tmp_path / "broken.gp5")]
+    assert summary["totals"]["n_matched"] == summary["totals"]["n_expected"]
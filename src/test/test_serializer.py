@@ -1,3 +1,5 @@
+import io
+import mmap
 import os
 from pathlib import Path
 
@@ -80,3 +82,27 @@ def test_music21_serializer_dump():
     m21_serializer.dump(m21_stream=s, save_path=save_path)
     assert save_path.is_file() == True
     os.remove(save_path)
+
+
+def test_serializers_load_and_dump_in_memory():
+    test_folder_path = Path.home() / "GuitarPro-to-MIDI/src/test/test_files"
+    gp_path = test_folder_path / "slapbass.gp3"
+    gp_serializer = PyGuitarProSerializer()
+    gp_stream = gp_serializer.load(gp_path)
+    data = gp_path.read_bytes()
+    assert gp_serializer.load(data) == gp_stream
+    assert gp_serializer.load(io.BytesIO(data)) == gp_stream
+    with open(gp_path, "rb") as fp, mmap.mmap(
+        fp.fileno(), 0, access=mmap.ACCESS_READ
+    ) as gp_mmap:
+        assert gp_serializer.load(gp_mmap) == gp_stream
+    assert gp_serializer.load(gp_serializer.dumps(gp_stream)) == gp_stream
+
+    m21_serializer = Music21Serializer()
+    m21_stream = m21_serializer.load(
+        (test_folder_path / "SixStudiesC.mid").read_bytes()
+    )
+    assert type(m21_stream) == Score
+    midi_bytes = m21_serializer.dumps(m21_stream)
+    assert midi_bytes.startswith(b"MThd")
+    assert type(m21_serializer.load(midi_bytes)) == Score
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from pytest import approx, raises
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.tempomap import TempoMap
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_tempo_map_from_song():
+    gp_serializer = PyGuitarProSerializer()
+    gp_file = gp_serializer.load(
+        TEST_FOLDER_PATH / "Metallica - Nothing else matters (7).gp3.gp2tokens2gp.gp5"
+    )
+    tempo_map = TempoMap.from_song(gp_file)
+    # The mix table change on the first beat overrides the song tempo
+    assert list(tempo_map)[:3] == [(0, 60), (25080, 70), (41520, 80)]
+    assert tempo_map.bpm_at(25079) == 60
+    assert tempo_map.bpm_at(25080) == 70
+
+
+def test_tick_to_seconds():
+    tempo_map = TempoMap([0, 960 * 4], [60, 120])
+    assert tempo_map.tick_to_seconds(960) == approx(1.0)
+    assert tempo_map.tick_to_seconds(960 * 4) == approx(4.0)
+    assert tempo_map.tick_to_seconds(960 * 6) == approx(5.0)
+    assert tempo_map.seconds_to_tick(5.0) == approx(960 * 6)
+    assert tempo_map.seconds_to_tick(0.5) == approx(480)
+
+
+def test_changes_between():
+    tempo_map = TempoMap([0, 960, 1920], [60, 90, 120])
+    assert tempo_map.changes_between(0, 960) == [(0, 60)]
+    assert tempo_map.changes_between(960, 1921) == [(960, 90), (1920, 120)]
+    assert tempo_map.changes_between(961) == [(1920, 120)]
+
+
+def test_tempo_map_needs_initial_tempo():
+    with raises(ValueError):
+        TempoMap([960], [120])
@@ -0,0 +1,30 @@
+import logging
+
+from src.transforming.tieresolver import TieResolver
+
+
+def test_resolve_extends_held_note():
+    tie_resolver = TieResolver()
+    tie_resolver.hold(0, 1, 0, 960, "note")
+    held_note = tie_resolver.resolve(0, 1, 3840, 4800)
+    assert held_note.note == "note"
+    assert (held_note.start, held_note.end, held_note.duration) == (0, 4800, 4800)
+    assert tie_resolver.n_resolved == 1
+
+
+def test_tracks_do_not_share_strings():
+    tie_resolver = TieResolver()
+    tie_resolver.hold(0, 1, 0, 960, "note")
+    assert tie_resolver.resolve(1, 1, 960, 1920) is None
+    tie_resolver.release_track(0)
+    assert tie_resolver.resolve(0, 1, 960, 1920) is None
+    assert tie_resolver.n_unresolved == 2
+
+
+def test_log_messages_are_limited(caplog):
+    tie_resolver = TieResolver(logging.getLogger("ties"), max_log_messages=3)
+    with caplog.at_level(logging.WARNING, logger="ties"):
+        for tick in range(10):
+            tie_resolver.resolve(0, 1, tick, tick + 1)
+    assert len(caplog.records) == 4
+    assert "ignoring the rest" in caplog.records[-1].getMessage()
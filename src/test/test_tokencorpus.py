@@ -0,0 +1,32 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.pipeline.tokencorpus import TokenCorpus, build_token_corpus
+from src.transforming.tokenizer import GuitarProToTokensConvertor
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def test_build_token_corpus(tmp_path):
+    input_folder = tmp_path / "songs"
+    input_folder.mkdir()
+    for name in ("slapbass.gp3", "progmetal.gp3"):
+        shutil.copy(TEST_FOLDER_PATH / name, input_folder)
+    (input_folder / "broken.gp5").write_text("not a song")
+
+    corpus, failures = build_token_corpus([input_folder], n_workers=2)
+    assert list(failures) == [str(input_folder / "broken.gp5")]
+    assert len(corpus) == 2
+    corpus_path = tmp_path / "tokens.npz"
+    corpus.save(corpus_path)
+    loaded_corpus = TokenCorpus.load(corpus_path)
+    assert loaded_corpus.names == corpus.names
+    for idx_song, name in enumerate(loaded_corpus.names):
+        gp_stream = PyGuitarProSerializer().load(name)
+        assert np.array_equal(
+            loaded_corpus.sequence(idx_song),
+            GuitarProToTokensConvertor(gp_stream).apply(),
+        )
@@ -0,0 +1,80 @@
+import io
+from pathlib import Path
+
+import guitarpro as gm
+import numpy as np
+import pytest
+
+from src.loading.serialization import PyGuitarProSerializer
+from src.transforming.noteeventtable import NoteEventTable
+from src.transforming.tokenizer import (
+    VOCABULARY_SIZE,
+    GuitarProToTokensConvertor,
+    decode_songs,
+    decode_tokens,
+    encode_songs,
+    token,
+    token_name,
+)
+
+TEST_FOLDER_PATH = Path(__file__).parent / "test_files"
+
+
+def _load_songs():
+    gp_serializer = PyGuitarProSerializer()
+    return [
+        gp_serializer.load(path) for path in sorted(TEST_FOLDER_PATH.glob("*.gp[345]"))
+    ]
+
+
+def test_tokens_round_trip():
+    for gp_stream in _load_songs():
+        tokens = GuitarProToTokensConvertor(gp_stream).apply()
+        assert tokens.dtype == np.uint16
+        assert tokens.max() < VOCABULARY_SIZE
+        decoded_stream = decode_tokens(tokens)
+        assert np.array_equal(
+            GuitarProToTokensConvertor(decoded_stream).apply(), tokens
+        )
+        # Same notes, velocities aside
+        events = NoteEventTable.from_song(gp_stream).events
+        decoded_events = NoteEventTable.from_song(decoded_stream).events
+        columns = [name for name in events.dtype.names if name != "velocity"]
+        assert np.array_equal(events[columns], decoded_events[columns])
+        # Decoded songs can be written as GuitarPro files
+        fp = io.BytesIO()
+        gm.write(decoded_stream, fp)
+        written_stream = PyGuitarProSerializer().load(fp.getvalue())
+        assert np.array_equal(
+            GuitarProToTokensConvertor(written_stream).apply(), tokens
+        )
+
+
+def test_encode_songs():
+    songs = _load_songs()
+    tokens, offsets = encode_songs(songs)
+    assert len(offsets) == len(songs) + 1
+    assert offsets[-1] == len(tokens)
+    for idx_song, gp_stream in enumerate(songs):
+        assert np.array_equal(
+            tokens[offsets[idx_song] : offsets[idx_song + 1]],
+            GuitarProToTokensConvertor(gp_stream).apply(),
+        )
+    decoded_songs = decode_songs(tokens, offsets)
+    assert [len(gp_stream.tracks) for gp_stream in decoded_songs] == [
+        len(gp_stream.tracks) for gp_stream in songs
+    ]
+    empty_tokens, empty_offsets = encode_songs([])
+    assert len(empty_tokens) == 0 and list(empty_offsets) == [0]
+
+
+def test_vocabulary_and_malformed_tokens():
+    assert token_name(token("pitch", 64)) == "pitch_64"
+    assert token_name(token("bos")) == "bos"
+    with pytest.raises(ValueError):
+        token("pitch", 128)
+    tokens = GuitarProToTokensConvertor(_load_songs()[-1]).apply()
+    with pytest.raises(ValueError):
+        decode_tokens(tokens[:-1])
+    with pytest.raises(ValueError):
+        decode_tokens(tokens[1:])
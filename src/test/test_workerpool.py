@@ -0,0 +1,89 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.pipeline.workerpool import WorkerPool
+
+
+def _square(value):
+    return value * value
+
+
+def _get_pid(_):
+    return os.getpid()
+
+
+def _set_warm():
+    os.environ["WORKER_IS_WARM"] = "1"
+
+
+def _is_warm(_):
+    return os.environ.get("WORKER_IS_WARM"), os.getpid()
+
+
+def _misbehave(task):
+    if task == "raise":
+        raise ValueError("bad task")
+    if task == "hang":
+        time.sleep(60)
+    if task == "crash":
+        os._exit(3)
+    return task
+
+
+def test_imap_unordered():
+    with WorkerPool(_square, n_workers=2) as pool:
+        results = list(pool.imap_unordered(range(10)))
+    assert all(result.ok for result in results)
+    assert sorted(result.value for result in results) == [
+        value * value for value in range(10)
+    ]
+
+
+def test_failures_are_isolated():
+    tasks = ["ok_1", "raise", "hang", "crash", "ok_2"]
+    with WorkerPool(_misbehave, n_workers=2, timeout=2) as pool:
+        results = {result.task: result for result in pool.imap_unordered(tasks)}
+    assert results["ok_1"].ok and results["ok_1"].value == "ok_1"
+    assert results["ok_2"].ok and results["ok_2"].value == "ok_2"
+    assert "ValueError" in results["raise"].error
+    assert "Timed out" in results["hang"].error
+    assert "exit code 3" in results["crash"].error
+
+
+def test_workers_are_recycled():
+    with WorkerPool(_get_pid, n_workers=1, max_tasks_per_worker=2) as pool:
+        pids = [result.value for result in pool.imap_unordered([None] * 4)]
+    assert len(set(pids)) == 2
+
+
+def test_apply_from_threads():
+    tasks = ["ok_1", "raise", "hang", "crash", "ok_2", "ok_3"]
+    with WorkerPool(_misbehave, n_workers=2, timeout=2) as pool:
+        pool.start()
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            results = dict(zip(tasks, executor.map(pool.apply, tasks)))
+        assert pool.n_running_tasks == 0
+        # Two started up front, one replacing the worker that hung, one the crashed
+        assert pool.n_started_workers == 4
+    assert all(results[task].value == task for task in ("ok_1", "ok_2", "ok_3"))
+    assert "ValueError" in results["raise"].error
+    assert "Timed out" in results["hang"].error
+    assert "exit code 3" in results["crash"].error
+
+
+def test_apply_from_threads_without_fork():
+    with WorkerPool(
+        _is_warm,
+        n_workers=2,
+        max_tasks_per_worker=1,
+        start_method="spawn",
+        initializer=_set_warm,
+    ) as pool:
+        pool.start()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(pool.apply, range(4)))
+        # Every task retires its worker, which is replaced by a warm one
+        assert pool.n_started_workers == 6
+    assert [result.value[0] for result in results] == ["1"] * 4
+    assert len({result.value[1] for result in results}) == 4
@@ -0,0 +1,88 @@
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+import guitarpro as gm
+
+from src.transforming.measuremap import MeasureMap
+
+TrackKey = Union[int, str]
+
+
+class ConversionSpec(NamedTuple):
+    """The tracks and measures of a song to convert.
+
+    tracks picks tracks by index or by name, instruments by MIDI program,
+    and exclude_percussion drops the drum tracks; a track is converted when
+    it passes every filter given. measures is a (first, stop) range of
+    measure indexes, and ticks a (start, stop) range of song ticks that
+    selects the measures it overlaps. With repeats unrolled, both count in
+    playback order. Fields left to None select everything.
+    """
+
+    tracks: Optional[Tuple[TrackKey, ...]] = None
+    instruments: Optional[Tuple[int, ...]] = None
+    exclude_percussion: bool = False
+    measures: Optional[Tuple[int, int]] = None
+    ticks: Optional[Tuple[int, int]] = None
+
+    @property
+    def is_everything(self) -> bool:
+        return self == ConversionSpec()
+
+    def select_tracks(self, gp_stream: gm.models.Song) -> List[int]:
+        """Returns the indexes of the selected tracks, in song order."""
+        tracks = gp_stream.tracks
+        wanted = None
+        if self.tracks is not None:
+            names = {track.name: idx_track for idx_track, track in enumerate(tracks)}
+            wanted = set()
+            for key in self.tracks:
+                if isinstance(key, str):
+                    if key not in names:
+                        raise ValueError(f"No track named {key!r}")
+                    wanted.add(names[key])
+                elif 0 <= key < len(tracks):
+                    wanted.add(key)
+                else:
+                    raise ValueError(f"No track {key}, the song has {len(tracks)}")
+        return [
+            idx_track
+            for idx_track, track in enumerate(tracks)
+            if (wanted is None or idx_track in wanted)
+            and (
+                self.instruments is None or track.channel.instrument in self.instruments
+            )
+            and not (self.exclude_percussion and track.isPercussionTrack)
+        ]
+
+    def select_measures(self, measure_map: MeasureMap) -> Tuple[int, int]:
+        """Returns the (first, stop) range of the selected measure_map entries."""
+        n_measures = len(measure_map)
+        if self.measures is not None and self.ticks is not None:
+            raise ValueError("Select either measures or ticks, not both")
+        if self.measures is not None:
+            first, stop = self.measures
+            if not 0 <= first <= stop:
+                raise ValueError(f"Invalid measure range: {self.measures}")
+            return min(first, n_measures), min(stop, n_measures)
+        if self.ticks is not None:
+            start, stop = self.ticks
+            if not 0 <= start <= stop:
+                raise ValueError(f"Invalid tick range: {self.ticks}")
+            overlapping = [
+                idx_measure
+                for idx_measure, measure_info in enumerate(measure_map)
+                if measure_info.start < stop
+                and start < measure_info.start + measure_info.length
+            ]
+            if not overlapping:
+                return n_measures, n_measures
+            return overlapping[0], overlapping[-1] + 1
+        return 0, n_measures
+
+    def to_dict(self) -> dict:
+        """Returns the fields that select something, as JSON friendly values."""
+        return {
+            field: list(value) if isinstance(value, tuple) else value
+            for field, value in self._asdict().items()
+            if value != self._field_defaults[field]
+        }
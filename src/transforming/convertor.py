@@ -0,0 +1,26 @@
+from abc import ABC, abstractmethod
+from typing import Any
+
+import guitarpro as gm
+
+# Bump whenever a change to the convertors changes their output, so that
+# cached conversions made by older versions are not reused.
+CONVERTOR_VERSION = "0.4.0"
+
+
+class Convertor(ABC):
+    """Interface for concrete conversion methods of a PyGuitarPro stream."""
+
+    def __init__(self, gp_stream: gm.models.Song) -> None:
+        self.gp_stream = gp_stream
+        self.metadata = self._get_metadata()
+
+    def _get_metadata(self) -> dict:
+        title = str(self.gp_stream.title)
+        artist = str(self.gp_stream.artist)
+        tempo = self.gp_stream.tempo
+        return {"title": title, "artist": artist, "tempo": tempo}
+
+    @abstractmethod
+    def apply(self) -> Any:
+        pass
@@ -0,0 +1,319 @@
+import math
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import guitarpro as gm
+
+from src.loading.midifile import MidiTrack
+
+# Ticks between two samples of an effect curve, and between two pitch bends
+DEFAULT_RESOLUTION = 30
+# Largest error allowed when thinning a curve, in pitch bend units
+DEFAULT_TOLERANCE = 32
+# Semitones a full pitch bend reaches either way, set on the channels by RPN 0
+DEFAULT_BEND_RANGE = 12
+
+PITCH_BEND_CENTER = 8192
+MAX_PITCH_BEND = 16383
+# Bend and tremolo bar points are in quarter tones, at positions 0 to 12
+QUARTER_TONES_PER_SEMITONE = 2
+BEND_POSITIONS = gm.models.BendEffect.maxPosition
+
+# Depth of the vibrato either way in semitones, and its period in ticks
+VIBRATO_DEPTH = 0.25
+VIBRATO_PERIOD = 320
+# Last part of a note sliding to the next note or out of the note
+SLIDE_OUT_FRACTION = 0.5
+SLIDE_OUT_SEMITONES = 5
+# First part of a note sliding into it, from that many semitones away
+SLIDE_IN_FRACTION = 0.25
+SLIDE_IN_SEMITONES = 2
+
+# A curve sampled in ticks, in semitones or in pitch bend units
+Curve = List[Tuple[int, float]]
+# (start, end, pitch bend events) of the effects of a beat
+BeatCurve = Tuple[int, int, List[Tuple[int, int]]]
+
+
+def simplify(points: Sequence[Tuple[int, float]], tolerance: float) -> Curve:
+    """Drops the points of a polyline closer than tolerance to the simplified one.
+
+    Douglas-Peucker reduction on the vertical distance, so the simplified
+    curve never strays more than tolerance from a dropped point. The first
+    and last points are always kept.
+    """
+    if len(points) <= 2:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        first_tick, first_value = points[first]
+        last_tick, last_value = points[last]
+        slope = (last_value - first_value) / max(last_tick - first_tick, 1)
+        max_distance = -1.0
+        idx_farthest = first
+        for idx in range(first + 1, last):
+            tick, value = points[idx]
+            distance = abs(value - first_value - slope * (tick - first_tick))
+            if distance > max_distance:
+                max_distance = distance
+                idx_farthest = idx
+        if max_distance > tolerance:
+            keep[idx_farthest] = True
+            stack.append((first, idx_farthest))
+            stack.append((idx_farthest, last))
+    return [point for point, is_kept in zip(points, keep) if is_kept]
+
+
+def staircase(
+    points: Sequence[Tuple[int, float]], tolerance: float, resolution: int
+) -> List[Tuple[int, int]]:
+    """Returns the (tick, value) events playing a polyline as steps.
+
+    Each segment is split in steps no higher than tolerance and no closer
+    than resolution ticks, and events repeating the previous value are
+    dropped. The last point only ends the last segment.
+    """
+    events: List[Tuple[int, int]] = []
+    for (start, start_value), (end, end_value) in zip(points, points[1:]):
+        n_steps = max(
+            min(
+                math.ceil(abs(end_value - start_value) / max(tolerance, 1)),
+                (end - start) // max(resolution, 1),
+            ),
+            1,
+        )
+        for step in range(n_steps):
+            tick = start + (end - start) * step // n_steps
+            value = int(round(start_value + (end_value - start_value) * step / n_steps))
+            if not events or events[-1][1] != value:
+                events.append((tick, value))
+    return events
+
+
+class EffectRenderer(NamedTuple):
+    """Renders the bends, slides and vibrato of notes as pitch bend events.
+
+    Effects are sampled every resolution ticks, thinned within tolerance
+    and played as steps, so a curve costs a handful of events rather than
+    one per sample. Pitch bends reach bend_range semitones either way.
+    """
+
+    resolution: int = DEFAULT_RESOLUTION
+    tolerance: int = DEFAULT_TOLERANCE
+    bend_range: int = DEFAULT_BEND_RANGE
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+    @staticmethod
+    def has_effect(gp_beat: gm.models.Beat, gp_note: gm.models.Note) -> bool:
+        return bool(
+            gp_note.effect.bend is not None
+            or gp_note.effect.slides
+            or gp_note.effect.vibrato
+            or gp_beat.effect.tremoloBar is not None
+            or gp_beat.effect.vibrato
+        )
+
+    def render(
+        self,
+        gp_beat: gm.models.Beat,
+        gp_note: gm.models.Note,
+        start: int,
+        end: int,
+        slide_interval: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        """Returns the pitch bend events of the note effects, from start to end.
+
+        slide_interval is the semitones from the note to the next one, that
+        slides to the next note go to.
+        """
+        curve = self.curve(gp_beat, gp_note, start, end, slide_interval)
+        points = [(tick, self.to_pitch_bend(semitones)) for tick, semitones in curve]
+        return staircase(
+            simplify(points, self.tolerance), self.tolerance, self.resolution
+        )
+
+    def measure_curves(
+        self,
+        gp_measure: gm.models.Measure,
+        next_measure: Optional[gm.models.Measure] = None,
+    ) -> List[BeatCurve]:
+        """Returns the effect curves of a measure, in ticks from its start.
+
+        A channel bends all of its notes, so only the first note with
+        effects of a beat is rendered, and a curve stops where the next
+        one starts. Slides go to the note on the same string of the next
+        beat of the voice, in next_measure, the next one played, for the
+        last beat.
+        """
+        curves = []
+        for idx_voice, gp_voice in enumerate(gp_measure.voices):
+            for idx_beat, gp_beat in enumerate(gp_voice.beats):
+                gp_note = next(
+                    (
+                        gp_note
+                        for gp_note in gp_beat.notes
+                        if self.has_effect(gp_beat, gp_note)
+                    ),
+                    None,
+                )
+                if gp_note is None:
+                    continue
+                start = int(round(gp_beat.start - gp_measure.start))
+                end = start + int(round(gp_beat.duration.time))
+                if idx_beat + 1 < len(gp_voice.beats):
+                    next_beat = gp_voice.beats[idx_beat + 1]
+                elif next_measure is not None and idx_voice < len(next_measure.voices):
+                    next_beats = next_measure.voices[idx_voice].beats
+                    next_beat = next_beats[0] if next_beats else None
+                else:
+                    next_beat = None
+                slide_interval = None
+                if next_beat is not None:
+                    slide_interval = next(
+                        (
+                            next_note.realValue - gp_note.realValue
+                            for next_note in next_beat.notes
+                            if next_note.string == gp_note.string
+                        ),
+                        None,
+                    )
+                events = self.render(gp_beat, gp_note, start, end, slide_interval)
+                curves.append((start, end, events))
+        curves.sort(key=lambda curve: curve[0])
+        next_starts = [start for start, _, _ in curves[1:]] + [None]
+        return [
+            (start, end if next_start is None else min(end, next_start), events)
+            for (start, end, events), next_start in zip(curves, next_starts)
+        ]
+
+    def curve(
+        self,
+        gp_beat: gm.models.Beat,
+        gp_note: gm.models.Note,
+        start: int,
+        end: int,
+        slide_interval: Optional[int] = None,
+    ) -> Curve:
+        """Samples the pitch offset of the note effects, in semitones.
+
+        Samples are taken every resolution ticks and at every corner of the
+        bends and slides, from start to end included.
+        """
+        duration = max(end - start, 1)
+        shapes: List[Callable[[int], float]] = []
+        corners = {start, end}
+        for bend in (gp_note.effect.bend, gp_beat.effect.tremoloBar):
+            if bend is None or not bend.points:
+                continue
+            bend_points = [
+                (
+                    start + duration * point.position // BEND_POSITIONS,
+                    point.value / QUARTER_TONES_PER_SEMITONE,
+                )
+                for point in bend.points
+            ]
+            corners.update(tick for tick, _ in bend_points)
+            shapes.append(_polyline(bend_points))
+        for slide in gp_note.effect.slides:
+            slide_points = self._slide_points(slide, start, end, slide_interval)
+            if slide_points:
+                corners.update(tick for tick, _ in slide_points)
+                shapes.append(_polyline(slide_points))
+        if gp_note.effect.vibrato or gp_beat.effect.vibrato:
+            shapes.append(
+                lambda tick: VIBRATO_DEPTH
+                * math.sin(2 * math.pi * (tick - start) / VIBRATO_PERIOD)
+            )
+        ticks = sorted(corners.union(range(start, end, max(self.resolution, 1))))
+        return [(tick, sum(shape(tick) for shape in shapes)) for tick in ticks]
+
+    @staticmethod
+    def _slide_points(
+        slide: gm.models.SlideType,
+        start: int,
+        end: int,
+        slide_interval: Optional[int],
+    ) -> Curve:
+        slide_out_start = end - int((end - start) * SLIDE_OUT_FRACTION)
+        slide_in_end = start + int((end - start) * SLIDE_IN_FRACTION)
+        if slide in (gm.SlideType.shiftSlideTo, gm.SlideType.legatoSlideTo):
+            if slide_interval is None:
+                return []
+            return [(slide_out_start, 0.0), (end, float(slide_interval))]
+        if slide == gm.SlideType.outDownwards:
+            return [(slide_out_start, 0.0), (end, -SLIDE_OUT_SEMITONES)]
+        if slide == gm.SlideType.outUpwards:
+            return [(slide_out_start, 0.0), (end, SLIDE_OUT_SEMITONES)]
+        if slide == gm.SlideType.intoFromBelow:
+            return [(start, -SLIDE_IN_SEMITONES), (slide_in_end, 0.0)]
+        if slide == gm.SlideType.intoFromAbove:
+            return [(start, SLIDE_IN_SEMITONES), (slide_in_end, 0.0)]
+        return []
+
+    def to_pitch_bend(self, semitones: float) -> float:
+        value = PITCH_BEND_CENTER + semitones * PITCH_BEND_CENTER / self.bend_range
+        return min(max(value, 0.0), MAX_PITCH_BEND)
+
+
+def _polyline(points: Curve) -> Callable[[int], float]:
+    """Returns the linear interpolation of points, flat outside of them."""
+
+    def value_at(tick: int) -> float:
+        if tick <= points[0][0]:
+            return points[0][1]
+        for (start, start_value), (end, end_value) in zip(points, points[1:]):
+            if tick <= end:
+                if end == start:
+                    return end_value
+                return start_value + (end_value - start_value) * (tick - start) / (
+                    end - start
+                )
+        return points[-1][1]
+
+    return value_at
+
+
+class PitchBendWriter:
+    """Writes the pitch bend curves of a channel, one curve after the other.
+
+    Events repeating the current value are skipped, and the bend goes back
+    to center when a curve ends, unless the next curve starts right away.
+    Curves must be added in order of their start.
+    """
+
+    def __init__(self, midi_track: MidiTrack, channel: int) -> None:
+        self.midi_track = midi_track
+        self.channel = channel
+        self.n_events = 0
+        self._value = PITCH_BEND_CENTER
+        # Tick of the return to center still to write, if any
+        self._reset_tick: Optional[int] = None
+
+    def add_curve(self, events: List[Tuple[int, int]], end: int) -> None:
+        if not events:
+            return
+        if self._reset_tick is not None and self._reset_tick < events[0][0]:
+            self._add(self._reset_tick, PITCH_BEND_CENTER)
+        self._reset_tick = None
+        for tick, value in events:
+            if tick < end and value != self._value:
+                self._add(tick, value)
+        if self._value != PITCH_BEND_CENTER:
+            self._reset_tick = end
+
+    def flush(self, until_tick: Optional[int] = None) -> None:
+        """Writes the return to center if it is before until_tick."""
+        if self._reset_tick is not None and (
+            until_tick is None or self._reset_tick < until_tick
+        ):
+            self._add(self._reset_tick, PITCH_BEND_CENTER)
+            self._reset_tick = None
+
+    def _add(self, tick: int, value: int) -> None:
+        self.midi_track.add_pitch_bend(tick, self.channel, value)
+        self._value = value
+        self.n_events += 1
@@ -0,0 +1,339 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+import guitarpro as gm
+
+from src.loading.midifile import (
+    DEFAULT_PERCUSSION_CHANNEL,
+    QUARTER_TIME_IN_TICKS,
+    MidiFile,
+    MidiTrack,
+)
+from src.transforming.convertor import Convertor
+from src.transforming.effectrenderer import EffectRenderer, PitchBendWriter
+from src.transforming.measuremap import MeasureInfo, MeasureMap
+from src.transforming.tempomap import TempoMap
+from src.loading.midistreamwriter import StreamingMidiTrack, StreamingMidiWriter
+from src.transforming.tieresolver import HeldNote, TieResolver
+
+
+class GuitarProToMidiConvertor(Convertor):
+    """Converts a PyGuitarPro stream straight into MIDI events, without
+    building an intermediate Music21 Stream.
+
+    With n_workers, tracks are converted concurrently in a process pool and
+    merged in their original order, giving the same bytes as a serial run.
+    With unroll_repeats, repeats and alternate endings are played out by
+    shifting the ticks of the repeated measures. With effects, bends, slides
+    and vibrato are played as pitch bends.
+    """
+
+    def __init__(
+        self,
+        gp_stream: gm.models.Song,
+        logger: Optional[logging.Logger] = None,
+        n_workers: Optional[int] = None,
+        unroll_repeats: bool = False,
+        effects: Optional[EffectRenderer] = None,
+    ) -> None:
+        super().__init__(gp_stream)
+        self.logger = logger
+        # Converts tracks in that many processes when greater than one
+        self.n_workers = n_workers
+        self.unroll_repeats = unroll_repeats
+        # Renders note effects as pitch bends, ignored when None
+        self.effects = effects
+        self.midi_file = MidiFile(ticks_per_quarter=QUARTER_TIME_IN_TICKS)
+        # PyGuitarPro starts the first measure one quarter after zero
+        measure_headers = self.gp_stream.measureHeaders
+        self._song_start = measure_headers[0].start if measure_headers else 0
+        self.tempo_map = TempoMap.from_song(self.gp_stream)
+        self.measure_map = MeasureMap.from_song(self.gp_stream, self.tempo_map)
+        if unroll_repeats:
+            self.measure_map, self.tempo_map = self.measure_map.unrolled(self.tempo_map)
+        self.tie_resolver = TieResolver(logger)
+
+    def apply(self) -> MidiFile:
+        conductor_track = self.midi_file.add_track()
+        conductor_track.add_track_name(self.metadata["title"].split(".")[0])
+        self._add_time_signatures(conductor_track)
+        self._add_tempos(conductor_track)
+
+        n_tracks = len(self.gp_stream.tracks)
+        if self.n_workers is None or self.n_workers <= 1 or n_tracks <= 1:
+            midi_tracks = map(self._create_midi_track, range(n_tracks))
+            self.midi_file.tracks.extend(midi_tracks)
+        else:
+            # Tracks share nothing but the song, so each worker converts whole
+            # tracks, and map() keeps the original track order.
+            with ProcessPoolExecutor(
+                max_workers=min(self.n_workers, n_tracks),
+                initializer=_init_track_worker,
+                initargs=(self.gp_stream, self.unroll_repeats, self.effects),
+            ) as executor:
+                self.midi_file.tracks.extend(
+                    executor.map(_create_midi_track, range(n_tracks))
+                )
+        return self.midi_file
+
+    def write(self, fp: BinaryIO) -> None:
+        """Streams the MIDI file to fp, one measure at a time per track.
+
+        Only the events that are not final yet are kept in memory: those
+        from the end of the earliest note a tie may still extend. The
+        events written are the same as the ones of apply().
+        """
+        tracks = self.gp_stream.tracks
+        with StreamingMidiWriter(
+            fp, QUARTER_TIME_IN_TICKS, n_tracks=len(tracks) + 1
+        ) as writer:
+            conductor_track = writer.begin_track()
+            conductor_track.add_track_name(self.metadata["title"].split(".")[0])
+            self._add_time_signatures(conductor_track)
+            self._add_tempos(conductor_track)
+            writer.end_track()
+
+            channels = self._assign_channels()
+            for idx_track, track in enumerate(tracks):
+                midi_track = writer.begin_track()
+                midi_track.add_track_name(track.name)
+                channel = channels[idx_track]
+                if not track.isPercussionTrack:
+                    midi_track.add_program_change(0, channel, track.channel.instrument)
+                bends = self._create_bend_writer(track, midi_track, channel)
+                self._stream_track_notes(idx_track, track, midi_track, channel, bends)
+                writer.end_track()
+
+    def _stream_track_notes(
+        self,
+        idx_track: int,
+        track: gm.models.Track,
+        midi_track: StreamingMidiTrack,
+        channel: int,
+        bends: Optional[PitchBendWriter] = None,
+    ) -> None:
+        """Same note logic as _collect_track_notes, flushed measure by measure.
+
+        The note off of a note waits until a tie can no longer extend it,
+        at most one measure after it ends, so the events kept in memory stay
+        bounded whatever the length of the song. The note index is used as
+        event order, to write events in the same order as apply(). Pitch
+        bends of the effects are written by bends.
+        """
+        n_notes = 0
+        previous_start = 0
+        for measure_info, gp_measure, next_measure in _with_next(
+            self._played_measures(track)
+        ):
+            measure_start = measure_info.start
+            for held_note in self.tie_resolver.release_ended_before(
+                idx_track, previous_start
+            ):
+                self._add_held_note_off(midi_track, held_note, channel)
+            # A held note can still be extended by a tie, even after rests,
+            # so nothing is flushed past the end of the earliest one
+            open_ends = [
+                held_note.end for held_note in self.tie_resolver.held_notes(idx_track)
+            ]
+            flush_tick = min([measure_start] + open_ends)
+            previous_start = measure_start
+            if bends is not None:
+                bends.flush(flush_tick)
+            midi_track.flush(flush_tick)
+
+            for gp_voice in gp_measure.voices:
+                for gp_beat in gp_voice.beats:
+                    start = self._to_song_tick(gp_beat.start) + measure_info.shift
+                    end = start + int(round(gp_beat.duration.time))
+                    for gp_note in gp_beat.notes:
+                        note_type = gp_note.type.value
+                        if note_type == 2:
+                            held_note = self.tie_resolver.resolve(
+                                idx_track, gp_note.string, start, end
+                            )
+                            if held_note is not None:
+                                continue
+                        if note_type not in (1, 2, 3):
+                            continue
+                        pitch = gp_note.realValue
+                        midi_track.add_note_on(
+                            start, pitch, gp_note.velocity, channel, order=n_notes
+                        )
+                        if note_type == 1:
+                            replaced_note = self.tie_resolver.hold(
+                                idx_track, gp_note.string, start, end, (pitch, n_notes)
+                            )
+                            if replaced_note is not None:
+                                self._add_held_note_off(
+                                    midi_track, replaced_note, channel
+                                )
+                        else:
+                            midi_track.add_note_off(end, pitch, channel, order=n_notes)
+                        n_notes += 1
+            if bends is not None:
+                self._add_measure_bends(bends, measure_info, gp_measure, next_measure)
+        for held_note in self.tie_resolver.release_track(idx_track):
+            self._add_held_note_off(midi_track, held_note, channel)
+        if bends is not None:
+            bends.flush()
+
+    @staticmethod
+    def _add_held_note_off(
+        midi_track: StreamingMidiTrack, held_note: HeldNote, channel: int
+    ) -> None:
+        pitch, order = held_note.note
+        midi_track.add_note_off(held_note.end, pitch, channel, order=order)
+
+    def _create_midi_track(self, idx_track: int) -> MidiTrack:
+        track = self.gp_stream.tracks[idx_track]
+        channel = self._assign_channels()[idx_track]
+        midi_track = MidiTrack()
+        midi_track.add_track_name(track.name)
+        if not track.isPercussionTrack:
+            midi_track.add_program_change(0, channel, track.channel.instrument)
+        for start, duration, pitch, velocity in self._collect_track_notes(
+            idx_track, track
+        ):
+            midi_track.add_note(start, duration, pitch, velocity, channel)
+        bends = self._create_bend_writer(track, midi_track, channel)
+        if bends is not None:
+            for measure_info, gp_measure, next_measure in _with_next(
+                self._played_measures(track)
+            ):
+                self._add_measure_bends(bends, measure_info, gp_measure, next_measure)
+            bends.flush()
+        return midi_track
+
+    def _create_bend_writer(
+        self, track: gm.models.Track, midi_track: MidiTrack, channel: int
+    ) -> Optional[PitchBendWriter]:
+        """Sets the bend range of the channel when effects are rendered."""
+        if self.effects is None or track.isPercussionTrack:
+            return None
+        midi_track.add_bend_range(0, channel, self.effects.bend_range)
+        return PitchBendWriter(midi_track, channel)
+
+    def _add_measure_bends(
+        self,
+        bends: PitchBendWriter,
+        measure_info: MeasureInfo,
+        gp_measure: gm.models.Measure,
+        next_measure: Optional[gm.models.Measure],
+    ) -> None:
+        """Adds the pitch bends of the effects of the notes of a measure."""
+        measure_start = measure_info.start
+        for start, end, events in self.effects.measure_curves(gp_measure, next_measure):
+            bends.add_curve(
+                [(measure_start + tick, value) for tick, value in events],
+                measure_start + end,
+            )
+
+    def _played_measures(
+        self, track: gm.models.Track
+    ) -> Iterator[Tuple[MeasureInfo, gm.models.Measure]]:
+        """Yields the measures of track in playback order, with their info."""
+        for measure_info in self.measure_map:
+            if measure_info.index >= len(track.measures):
+                return
+            yield measure_info, track.measures[measure_info.index]
+
+    def _to_song_tick(self, gp_tick) -> int:
+        return int(round(gp_tick - self._song_start))
+
+    def _assign_channels(self) -> List[int]:
+        """Gives each track its own channel, skipping the percussion one."""
+        channels = []
+        next_channel = 0
+        for track in self.gp_stream.tracks:
+            if track.isPercussionTrack:
+                channels.append(DEFAULT_PERCUSSION_CHANNEL)
+                continue
+            if next_channel == DEFAULT_PERCUSSION_CHANNEL:
+                next_channel += 1
+            channels.append(next_channel % 16)
+            next_channel = (next_channel + 1) % 16
+        return channels
+
+    def _add_time_signatures(self, conductor_track: MidiTrack) -> None:
+        for tick, numerator, denominator in self.measure_map.time_signature_changes():
+            conductor_track.add_time_signature(tick, numerator, denominator)
+
+    def _add_tempos(self, conductor_track: MidiTrack) -> None:
+        for tick, bpm in self.tempo_map:
+            conductor_track.add_tempo(tick, bpm)
+
+    def _collect_track_notes(
+        self, idx_track: int, track: gm.models.Track
+    ) -> List[Tuple[int, int, int, int]]:
+        """Returns [start, duration, pitch, velocity] of every sounding note.
+
+        A tie note extends the last note played on the same string up to
+        its own end, whether that note is in the same measure or not, as
+        long as that note ends in the measure before the tie or later.
+        """
+        return self._collect_notes(idx_track, self._played_measures(track))
+
+    def _collect_notes(
+        self,
+        idx_track: int,
+        played_measures: Iterable[Tuple[MeasureInfo, gm.models.Measure]],
+    ) -> List[Tuple[int, int, int, int]]:
+        """Same as _collect_track_notes, over some measures of the track."""
+        notes: List[List[int]] = []
+        previous_start = 0
+        for measure_info, gp_measure in played_measures:
+            self.tie_resolver.release_ended_before(idx_track, previous_start)
+            previous_start = measure_info.start
+            for gp_voice in gp_measure.voices:
+                for gp_beat in gp_voice.beats:
+                    start = self._to_song_tick(gp_beat.start) + measure_info.shift
+                    end = start + int(round(gp_beat.duration.time))
+                    for gp_note in gp_beat.notes:
+                        note_type = gp_note.type.value
+                        if note_type == 2:
+                            held_note = self.tie_resolver.resolve(
+                                idx_track, gp_note.string, start, end
+                            )
+                            if held_note is not None:
+                                held_note.note[1] = held_note.duration
+                                continue
+                        if note_type not in (1, 2, 3):
+                            continue
+                        note = [start, end - start, gp_note.realValue, gp_note.velocity]
+                        notes.append(note)
+                        if note_type == 1:
+                            self.tie_resolver.hold(
+                                idx_track, gp_note.string, start, end, note
+                            )
+        self.tie_resolver.release_track(idx_track)
+        return [tuple(note) for note in notes]
+
+
+def _with_next(
+    played_measures: Iterable[Tuple[MeasureInfo, gm.models.Measure]],
+) -> Iterator[Tuple[MeasureInfo, gm.models.Measure, Optional[gm.models.Measure]]]:
+    """Yields the played measures with the measure played after each one."""
+    played_measures = list(played_measures)
+    next_measures = [gp_measure for _, gp_measure in played_measures[1:]] + [None]
+    for (measure_info, gp_measure), next_measure in zip(played_measures, next_measures):
+        yield measure_info, gp_measure, next_measure
+
+
+# Convertor of the song shared by the tracks converted in a worker process
+_worker_convertor: Optional[GuitarProToMidiConvertor] = None
+
+
+def _init_track_worker(
+    gp_stream: gm.models.Song,
+    unroll_repeats: bool,
+    effects: Optional[EffectRenderer] = None,
+) -> None:
+    global _worker_convertor
+    _worker_convertor = GuitarProToMidiConvertor(
+        gp_stream, unroll_repeats=unroll_repeats, effects=effects
+    )
+
+
+def _create_midi_track(idx_track: int) -> MidiTrack:
+    return _worker_convertor._create_midi_track(idx_track)
@@ -1,31 +1,110 @@
-from typing import Union
+import copy
+import logging
+from functools import lru_cache
+from typing import Iterator, Optional, Set, Tuple, Union
 
 import guitarpro as gm
 import music21 as m21
 
+from src.profiling.conversionstats import ConversionStats, timer
+from src.transforming.conversionspec import ConversionSpec
+from src.transforming.convertor import Convertor
+from src.transforming.effectrenderer import EffectRenderer
+from src.transforming.measuremap import MeasureMap
+from src.transforming.tempomap import TempoMap
+from src.transforming.tieresolver import TieResolver
 
 QUARTER_TIME_IN_TICKS = 960
 
 
-class GuitarProToMusic21Convertor:
-    """Converts a PyGuitarPro stream into a Music21 Stream"""
+@lru_cache(maxsize=64)
+def _m21_time_signature_template(
+    numerator: int, denominator: int, is_dotted_denominator: bool
+) -> m21.meter.TimeSignature:
+    """Builds a time signature once; callers insert copies of it.
 
-    def __init__(self, gp_stream: gm.models.Song) -> None:
-        self.gp_stream = gp_stream
-        self.metadata = self._get_metadata()
+    A music21 object can only appear once in a stream, so the template is
+    never inserted itself. Copying it is cheaper than parsing it again.
+    """
+    m21_denominator = denominator * 1.5 if is_dotted_denominator else denominator
+    m21_time_signature = m21.meter.TimeSignature(f"{numerator}/{m21_denominator}")
+    m21_time_signature.priority = -1
+    return m21_time_signature
+
+
+@lru_cache(maxsize=128)
+def _m21_duration_type(gp_duration_value: int, is_dotted: bool) -> Tuple[str, int]:
+    """Returns the music21 type name and number of dots of a GuitarPro duration."""
+    return m21.duration.typeFromNumDict[float(gp_duration_value)], int(is_dotted)
+
+
+class GuitarProToMusic21Convertor(Convertor):
+    """Converts a PyGuitarPro stream into a Music21 Stream
+
+    With unroll_repeats, repeats and alternate endings are written out in
+    playback order instead of as repeat barlines. A spec restricts the
+    conversion to some tracks and measures; the score then starts at the
+    first selected measure, with the tempo and time signature in effect
+    there, and ties entering the selection start their notes at it.
+
+    iter_parts converts one track at a time. With low_memory, the measures
+    of each track are released from the song once its part is done, so the
+    song cannot be converted again.
+    """
+
+    def __init__(
+        self,
+        gp_stream: gm.models.Song,
+        logger: Optional[logging.Logger] = None,
+        show_score: bool = False,
+        stats: Optional[ConversionStats] = None,
+        unroll_repeats: bool = False,
+        spec: Optional[ConversionSpec] = None,
+        low_memory: bool = False,
+        effects: Optional[EffectRenderer] = None,
+    ) -> None:
+        super().__init__(gp_stream)
+        self.logger = logger
+        self.show_score = show_score
+        # Timers and counters of the conversion, only recorded when given
+        self.stats = stats
+        self.unroll_repeats = unroll_repeats
+        self.spec = spec if spec is not None else ConversionSpec()
+        self.low_memory = low_memory
+        # Renders bends, slides and vibrato for the fast MIDI writer, when given
+        self.effects = effects
         self.m21_score = self._create_new_m21_score()
-        # Dictionary to keep track of last note on each string
-        self._last_normal_notes = {}
-        # Create a global metronome for the song
-        self.metronome = m21.tempo.MetronomeMark(number=self.metadata["tempo"])
+        # Keeps track of the last note on each string of each track
+        self.tie_resolver = TieResolver(logger)
+        with timer(stats, "setup"):
+            # Tempo changes of the whole song, inserted measure by measure
+            self.tempo_map = TempoMap.from_song(self.gp_stream)
+            # Time signatures, repeats and tempo changes, read once for all tracks
+            self.measure_map = MeasureMap.from_song(self.gp_stream, self.tempo_map)
+            if unroll_repeats:
+                self.measure_map, self.tempo_map = self.measure_map.unrolled(
+                    self.tempo_map
+                )
+        self.selected_tracks = self.spec.select_tracks(self.gp_stream)
+        self.first_measure, self.stop_measure = self.spec.select_measures(
+            self.measure_map
+        )
+        # Measures whose repeat barlines are written
+        self._repeat_opens, self._repeat_closes = self._selected_repeats()
+        # Create a global metronome with the tempo where the selection starts
+        start_tick = (
+            self.measure_map[self.first_measure].start
+            if self.first_measure < self.stop_measure
+            else 0
+        )
+        self.metronome = m21.tempo.MetronomeMark(
+            number=self.tempo_map.bpm_at(start_tick)
+        )
+        # Strings of the track being converted whose ties continue a note
+        # played before the selection
+        self._entering_ties: Set[int] = set()
         self._time_signature = m21.meter.TimeSignature()
 
-    def _get_metadata(self) -> dict:
-        title = str(self.gp_stream.title)
-        artist = str(self.gp_stream.artist)
-        tempo = self.gp_stream.tempo
-        return {"title": title, "artist": artist, "tempo": tempo}
-
     @property
     def time_signature(self) -> m21.meter.TimeSignature:
         return self._time_signature
@@ -35,121 +114,249 @@ class GuitarProToMusic21Convertor:
         self._time_signature = m21_time_signature
 
     def apply(self) -> m21.stream.Score:
+        for m21_part in self.iter_parts():
+            self.m21_score.append(m21_part)
+        if self.show_score:
+            self.m21_score.show("text")
+        return self.m21_score
+
+    def iter_parts(self) -> Iterator[m21.stream.Part]:
+        """Converts the selected tracks, yielding the part of each in turn.
+
+        Parts are not added to the score, so a consumer dropping each part
+        before the next one holds a single part at a time.
+        """
+        stats = self.stats
         tracks = self.gp_stream.tracks
-        # Loop over each track of the song object
-        for idx_track, track in enumerate(tracks):
-            # Create part and append it to score
-            instrument_id = track.channel.instrument  # Midi instrument id
-            track_name = track.name
-            is_percussion = track.isPercussionTrack
-            m21_part = self._create_m21_part(
-                idx_track, instrument_id, track_name, is_percussion
+        # Loop over each selected track of the song object
+        for idx_track in self.selected_tracks:
+            with timer(stats, "tracks", idx_track):
+                m21_part = self._convert_track(idx_track, tracks[idx_track])
+            yield m21_part
+            del m21_part
+            if self.low_memory:
+                # The part is done, so the track is not needed anymore
+                tracks[idx_track].measures = []
+        if stats is not None:
+            stats.count("tracks", len(self.selected_tracks))
+            stats.count("tempo_changes", len(self.tempo_map) - 1)
+
+    def _convert_track(self, idx_track: int, track: gm.models.Track) -> m21.stream.Part:
+        stats = self.stats
+        # Create the part of the track
+        instrument_id = track.channel.instrument  # Midi instrument id
+        track_name = track.name
+        is_percussion = track.isPercussionTrack
+        m21_part = self._create_m21_part(
+            idx_track, instrument_id, track_name, is_percussion
+        )
+        # Drums are not bent
+        renders_effects = self.effects is not None and not is_percussion
+        if renders_effects:
+            m21_part.editorial.pitchBendRange = self.effects.bend_range
+        n_resolved = self.tie_resolver.n_resolved
+        n_unresolved = self.tie_resolver.n_unresolved
+        self._entering_ties = self._find_entering_ties(track)
+        # Loop over measures, in playback order when repeats are unrolled
+        for idx_measure in range(self.first_measure, self.stop_measure):
+            measure_info = self.measure_map[idx_measure]
+            if measure_info.index >= len(track.measures):
+                break
+            gp_measure = track.measures[measure_info.index]
+            # Create measure and append it to part
+            with timer(stats, "measures", idx_track):
+                m21_measure = self._create_m21_measure(idx_track, idx_measure)
+            m21_part.append(m21_measure)
+            with timer(stats, "notes", idx_track):
+                self._fill_m21_measure(idx_track, idx_measure, gp_measure, m21_measure)
+            if renders_effects:
+                self._add_pitch_bends(track, idx_measure, gp_measure, m21_measure)
+            if stats is not None:
+                self._count_measure(idx_track, gp_measure)
+        self.tie_resolver.release_track(idx_track)
+        self._entering_ties = set()
+        if stats is not None:
+            stats.count(
+                "ties_resolved", self.tie_resolver.n_resolved - n_resolved, idx_track
             )
-            self.m21_score.append(m21_part)
-            # Loop over measure
-            for idx_measure, gp_measure in enumerate(track.measures):
-                # Create measure and append it to part
-                # Get time signature of measure
-                gp_time_signature = gp_measure.timeSignature
-                # Check for repetitions
-                is_repeat_open = gp_measure.header.isRepeatOpen
-                repeat_close = gp_measure.header.repeatClose
-                m21_measure = self._create_m21_measure(
-                    idx_track,
-                    idx_measure,
-                    gp_time_signature,
-                    is_repeat_open,
-                    repeat_close,
+            stats.count(
+                "ties_dropped", self.tie_resolver.n_unresolved - n_unresolved, idx_track
+            )
+        return m21_part
+
+    def _selected_repeats(self) -> Tuple[Set[int], Set[int]]:
+        """Returns the measures whose repeat opens and closes are written.
+
+        Every mark is written when the whole song is selected. Otherwise a
+        repeat is only written when the selection holds both its open and
+        its close, as a repeat cut through cannot be played. As when
+        unrolling, a close goes back to the last open, or to the first
+        measure for the first close without one.
+        """
+        n_measures = len(self.measure_map)
+        all_measures = set(range(n_measures))
+        if self.first_measure == 0 and self.stop_measure == n_measures:
+            return all_measures, all_measures
+        opens = set()
+        closes = set()
+        # Open of the repeat a close goes back to, None when there is none
+        repeat_start: Optional[int] = 0
+        for idx_measure, measure_info in enumerate(self.measure_map):
+            if measure_info.is_repeat_open:
+                repeat_start = idx_measure
+            if measure_info.repeat_close > 0:
+                if (
+                    repeat_start is not None
+                    and self.first_measure <= repeat_start
+                    and idx_measure < self.stop_measure
+                ):
+                    opens.add(repeat_start)
+                    closes.add(idx_measure)
+                repeat_start = None
+        return opens, closes
+
+    def _add_pitch_bends(
+        self,
+        track: gm.models.Track,
+        idx_measure: int,
+        gp_measure: gm.models.Measure,
+        m21_measure: m21.stream.Measure,
+    ) -> None:
+        """Keeps the effect curves of a measure for the fast MIDI writer.
+
+        music21 has no pitch bend curves, so they are kept in the editorial
+        of the measure, in quarter lengths from its start, and ignored by
+        the other writers.
+        """
+        next_measure = None
+        if idx_measure + 1 < len(self.measure_map):
+            next_index = self.measure_map[idx_measure + 1].index
+            if next_index < len(track.measures):
+                next_measure = track.measures[next_index]
+        curves = self.effects.measure_curves(gp_measure, next_measure)
+        if curves:
+            m21_measure.editorial.pitchBends = [
+                (
+                    start / QUARTER_TIME_IN_TICKS,
+                    end / QUARTER_TIME_IN_TICKS,
+                    [(tick / QUARTER_TIME_IN_TICKS, value) for tick, value in events],
                 )
-                m21_part.append(m21_measure)
-                # Loop over voices
-                for idx_voice, gp_voice in enumerate(gp_measure.voices):
-                    if gp_voice.isEmpty:
-                        continue
-                    # Create voice
-                    m21_voice = self._create_m21_voice(idx_voice)
-                    # Append voice to measure
-                    m21_measure.insert(0, m21_voice)
-                    # Loop over beats and notes
-                    for idx_beat, gp_beat in enumerate(gp_voice.beats):
-                        # Update the previous_beat_duration for the next beat
-                        offset = gp_beat.startInMeasure / QUARTER_TIME_IN_TICKS
-                        if len(gp_beat.notes) == 0:
-                            if gp_beat.duration.isDotted:
-                                m21_dots = 1
-                            else:
-                                m21_dots = 0
-                            m21_duration_name = m21.duration.typeFromNumDict[
-                                float(gp_beat.duration.value)
-                            ]
-                            m21_rest = m21.note.Rest(
-                                type=m21_duration_name, dots=m21_dots
+                for start, end, events in curves
+            ]
+
+    def _find_entering_ties(self, track: gm.models.Track) -> Set[int]:
+        """Returns the strings with a normal note before the first selected measure.
+
+        A tie on one of them before any normal note of the selection
+        continues a note left out of it.
+        """
+        strings = set()
+        n_strings = len(track.strings)
+        for measure_info in self.measure_map[: self.first_measure]:
+            if measure_info.index >= len(track.measures):
+                break
+            for gp_voice in track.measures[measure_info.index].voices:
+                for gp_beat in gp_voice.beats:
+                    for gp_note in gp_beat.notes:
+                        if gp_note.type.value == 1:
+                            strings.add(gp_note.string)
+            if len(strings) == n_strings:
+                break
+        return strings
+
+    def _fill_m21_measure(
+        self,
+        idx_track: int,
+        idx_measure: int,
+        gp_measure: gm.models.Measure,
+        m21_measure: m21.stream.Measure,
+    ) -> None:
+        """Converts the voices, beats and notes of a measure."""
+        measure_start = self.measure_map[idx_measure].start
+        # Loop over voices
+        for idx_voice, gp_voice in enumerate(gp_measure.voices):
+            if gp_voice.isEmpty:
+                continue
+            # Create voice
+            m21_voice = self._create_m21_voice(idx_voice)
+            # Append voice to measure
+            m21_measure.insert(0, m21_voice)
+            # Loop over beats and notes
+            for idx_beat, gp_beat in enumerate(gp_voice.beats):
+                # Update the previous_beat_duration for the next beat
+                offset = gp_beat.startInMeasure / QUARTER_TIME_IN_TICKS
+                if len(gp_beat.notes) == 0:
+                    m21_duration_name, m21_dots = _m21_duration_type(
+                        gp_beat.duration.value, gp_beat.duration.isDotted
+                    )
+                    m21_rest = m21.note.Rest(type=m21_duration_name, dots=m21_dots)
+                    m21_rest.offset = offset
+                    m21_voice.insert(offset, m21_rest)
+                else:
+                    for gp_note in gp_beat.notes:
+                        m21_note = self._create_m21_note(
+                            idx_beat,
+                            gp_beat,
+                            gp_note,
+                        )
+                        m21_note.offset = offset
+                        tick = measure_start + gp_beat.startInMeasure
+                        end = tick + gp_beat.duration.time
+                        # Update last active note on string
+                        if gp_note.type.value == 1:
+                            self._entering_ties.discard(gp_note.string)
+                            self.tie_resolver.hold(
+                                idx_track, gp_note.string, tick, end, m21_note
+                            )
+                        # A tie continuing a note from before the selection
+                        # starts the note, which later ties extend
+                        elif (
+                            gp_note.type.value == 2
+                            and gp_note.string in self._entering_ties
+                        ):
+                            self._entering_ties.discard(gp_note.string)
+                            m21_note.tie = m21.tie.Tie("stop")
+                            self.tie_resolver.hold(
+                                idx_track, gp_note.string, tick, end, m21_note
+                            )
+                        # If note is of type tie, extend the last active note
+                        elif gp_note.type.value == 2:
+                            held_note = self.tie_resolver.resolve(
+                                idx_track, gp_note.string, tick, end
                             )
-                            m21_rest.offset = offset
-                            m21_voice.insert(offset, m21_rest)
-                        else:
-                            for gp_note in gp_beat.notes:
-                                m21_note = self._create_m21_note(
-                                    idx_beat,
-                                    gp_beat,
-                                    gp_note,
-                                    m21_measure,
+                            if held_note is not None:
+                                last_normal_note = held_note.note
+                                last_normal_note.tie = m21.tie.Tie(
+                                    "continue"
+                                    if last_normal_note.tie is not None
+                                    and last_normal_note.tie.type == "stop"
+                                    else "start"
                                 )
-                                m21_note.offset = offset
-                                # Update last active note on string
-                                if gp_note.type.value == 1:
-                                    self._last_normal_notes = (
-                                        self._update_string_last_normal_note(
-                                            gp_note, m21_note, idx_measure
-                                        )
-                                    )
-                                # If note is of type tie, find the last active note on _last_normal_notes dict.
-                                elif gp_note.type.value == 2:
-                                    string_number = gp_note.string
-                                    if string_number in self._last_normal_notes:
-                                        last_normal_note = self._last_normal_notes[
-                                            string_number
-                                        ]["m21_note"]
-                                        last_normal_measure = self._last_normal_notes[
-                                            string_number
-                                        ]["measure"]
-                                        m21_note.pitch = last_normal_note.pitch
-                                        print(
-                                            f"Measure {idx_measure} Note: {m21_note.fullName}"
-                                        )
-                                        if idx_measure == last_normal_measure:
-                                            offset_difference = (
-                                                m21_note.offset
-                                                - last_normal_note.offset
-                                            )
-                                            # Calculate remaining
-                                            remaining_duration = (
-                                                offset_difference
-                                                - last_normal_note.duration.quarterLength
-                                            )
-                                        else:
-                                            # TODO Substract last_normal_note duration from measure duration
-                                            remaining_duration = 0
-                                        last_normal_note.tie = m21.tie.Tie("start")
-                                        last_normal_note.duration.quarterLength += (
-                                            remaining_duration
-                                            + m21_note.duration.quarterLength
-                                        )
-                                        print(
-                                            f"Last normal duration {last_normal_note.fullName}"
-                                        )
-                                        print(
-                                            f"Duration: {last_normal_note.duration.quarterLength}"
-                                        )
-                                        continue
-                                # Insert note into current voice
-                                m21_voice.insert(offset, m21_note)
-                        if (len(gp_voice.beats) - 1) == idx_beat:
-                            remaining_rests = self._calculate_remaining_rests(gp_beat)
-                            if remaining_rests != None:
-                                m21_voice.append(remaining_rests)
-        self.m21_score.show("text")
-        return self.m21_score
+                                last_normal_note.duration.quarterLength = (
+                                    held_note.duration / QUARTER_TIME_IN_TICKS
+                                )
+                                continue
+                        # Insert note into current voice
+                        m21_voice.insert(offset, m21_note)
+                if (len(gp_voice.beats) - 1) == idx_beat:
+                    remaining_rests = self._calculate_remaining_rests(gp_beat)
+                    if remaining_rests != None:
+                        m21_voice.append(remaining_rests)
+                        if self.stats is not None:
+                            self.stats.count("filler_rests", idx_track=idx_track)
+
+    def _count_measure(self, idx_track: int, gp_measure: gm.models.Measure) -> None:
+        stats = self.stats
+        stats.count("measures", idx_track=idx_track)
+        for gp_voice in gp_measure.voices:
+            if gp_voice.isEmpty:
+                continue
+            stats.count("voices", idx_track=idx_track)
+            stats.count("beats", len(gp_voice.beats), idx_track)
+            n_notes = sum(len(gp_beat.notes) for gp_beat in gp_voice.beats)
+            n_rests = sum(not gp_beat.notes for gp_beat in gp_voice.beats)
+            stats.count("notes", n_notes, idx_track)
+            stats.count("rests", n_rests, idx_track)
 
     def _create_new_m21_score(self):
         new_empty_score = m21.stream.Score()
@@ -174,47 +381,37 @@ class GuitarProToMusic21Convertor:
         return m21_part
 
     def _create_m21_measure(
-        self,
-        idx_part: int,
-        idx_measure: int,
-        gp_time_signature: gm.models.TimeSignature,
-        is_repeat_open: bool,
-        repeat_close: int,
+        self, idx_part: int, idx_measure: int
     ) -> m21.stream.Measure:
         # Create a new m21_measure
         m21_measure = m21.stream.Measure(id=f"part_{idx_part}_measure_{idx_measure}")
+        measure_info = self.measure_map[idx_measure]
+        is_first = idx_measure == self.first_measure
 
-        m21_numerator = gp_time_signature.numerator
-        m21_denominator = gp_time_signature.denominator.value
-        if gp_time_signature.denominator.isDotted:
-            m21_denominator *= 1.5
-        if m21_numerator == 0:
-            m21_numerator = 1
-        elif m21_denominator == 0:
-            m21_numerator = 1
-        m21_time_signature = m21.meter.TimeSignature(
-            f"{m21_numerator}/{m21_denominator}"
-        )
-        m21_time_signature.priority = -1
-
-        if idx_measure == 0:
+        if is_first:
             m21_measure.append(self.metronome)
-            m21_measure.timeSignature = m21_time_signature
-            self.time_signature = m21_time_signature
-        # If time signature is different from last time signature, insert ts to measure
-        elif (
-            self.time_signature.numerator != m21_numerator
-            or self.time_signature.denominator != m21_denominator
-        ):
+        # Insert the time signature if it is different from the last one
+        if is_first or measure_info.is_time_signature_change:
+            m21_time_signature = copy.deepcopy(
+                _m21_time_signature_template(*measure_info.time_signature)
+            )
             m21_measure.timeSignature = m21_time_signature
             self.time_signature = m21_time_signature
 
+        # Add the tempo changes that fall inside the measure, the one where
+        # the selection starts being the metronome
+        for tick, bpm in measure_info.tempo_changes:
+            if is_first and tick == measure_info.start:
+                continue
+            offset = (tick - measure_info.start) / QUARTER_TIME_IN_TICKS
+            m21_measure.insert(offset, m21.tempo.MetronomeMark(number=bpm))
+
         # Add repetition if necessary
-        if is_repeat_open:
+        if measure_info.is_repeat_open and idx_measure in self._repeat_opens:
             m21_measure.leftBarline = m21.bar.Repeat(direction="start")
-        if repeat_close > 0:
+        if measure_info.repeat_close > 0 and idx_measure in self._repeat_closes:
             m21_measure.rightBarline = m21.bar.Repeat(
-                direction="end", times=repeat_close
+                direction="end", times=measure_info.repeat_close
             )
 
         return m21_measure
@@ -228,29 +425,11 @@ class GuitarProToMusic21Convertor:
         idx_beat: int,
         gp_beat: gm.models.Beat,
         gp_note: gm.models.Note,
-        m21_measure: m21.stream.Measure,
     ) -> m21.note.Note:
-        # Retrieve the duration of the beat
-        gp_duration = gp_beat.duration.value
-        m21_duration_name = m21.duration.typeFromNumDict[float(gp_duration)]
-
-        # Check tempo changes
-        if gp_beat.effect.mixTableChange != None:
-            if gp_beat.effect.mixTableChange.tempo != None:
-                if gp_beat.effect.mixTableChange.tempo.value != None:
-                    new_metronome = m21.tempo.MetronomeMark(
-                        number=gp_beat.effect.mixTableChange.tempo.value
-                    )
-                    for el in m21_measure.recurse():
-                        if "MetronomeMark" in el.classes:
-                            el.activeSite.remove(el)
-                    m21_measure.insert(0, new_metronome)
-
-        # Add dot if necessary
-        if gp_beat.duration.isDotted:
-            m21_dots = 1
-        else:
-            m21_dots = 0
+        # Retrieve the duration of the beat, dotted if necessary
+        m21_duration_name, m21_dots = _m21_duration_type(
+            gp_beat.duration.value, gp_beat.duration.isDotted
+        )
 
         # Check if type of note is normal or tie note
         if (
@@ -264,7 +443,8 @@ class GuitarProToMusic21Convertor:
                 pitch=midi_value, type=m21_duration_name, dots=m21_dots
             )
         else:
-            print(f"Else {gp_note}")
+            if self.logger is not None:
+                self.logger.debug("Converting note of type %s to rest", gp_note.type)
             m21_note = m21.note.Rest(type=m21_duration_name)
 
         # Add tuplets if neccesary
@@ -277,33 +457,6 @@ class GuitarProToMusic21Convertor:
 
         return m21_note
 
-    def _update_string_last_normal_note(
-        self, gp_note: gm.models.Note, m21_note: m21.note.Note, measure_number: int
-    ) -> dict:
-        """Update and returns a dictionary containing the following information for each string:
-        - The associated m21_note
-        - The realValue of that string
-        - Tha value of the string
-        """
-        # Get the string number
-        string_number = gp_note.string
-        # Get the real value
-        midi_value = gp_note.realValue
-        # Create the dictionary if it does not exist yet
-        if self._last_normal_notes is None:
-            self._last_normal_notes = {}
-
-        # Update the dictionary
-        self._last_normal_notes[string_number] = {
-            "m21_note": m21_note,
-            "midi_value": midi_value,
-            "string_value": string_number,
-            "measure": measure_number,
-        }
-
-        # Return the dictionary
-        return self._last_normal_notes
-
     @staticmethod
     def _calculate_measure_duration_in_ticks(
         time_signature: m21.meter.TimeSignature,
@@ -334,9 +487,10 @@ class GuitarProToMusic21Convertor:
         return remaining_rest
 
 
-gp_file = gm.parse(
-    "/home/juancopi81/GuitarPro-to-MIDI/src/test/test_files/slapbass.gp3"
-)
-gp_to_m21_convertor = GuitarProToMusic21Convertor(gp_file)
-m21_stream = gp_to_m21_convertor.apply()
-m21_stream.write("mid", "slap_1.mid", quantizePost=False)
+if __name__ == "__main__":
+    gp_file = gm.parse(
+        "/home/juancopi81/GuitarPro-to-MIDI/src/test/test_files/slapbass.gp3"
+    )
+    gp_to_m21_convertor = GuitarProToMusic21Convertor(gp_file)
+    m21_stream = gp_to_m21_convertor.apply()
+    m21_stream.write("mid", "slap_1.mid", quantizePost=False)
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import guitarpro as gm
+
+from src.loading.midifile import MidiFile
+from src.transforming.convertor import CONVERTOR_VERSION
+from src.transforming.guitarprotomidiconvertor import GuitarProToMidiConvertor
+
+# Bump whenever the fingerprints or the layout of the state change
+STATE_VERSION = 1
+# Appended to the output path to name the state kept next to it
+STATE_SUFFIX = ".state.json"
+
+
+class MeasureSummary(NamedTuple):
+    """What the conversion of a measure of a track depends on.
+
+    fingerprint covers the beats and notes as read by the MIDI convertor.
+    tie_strings are the strings with tie notes, and held_strings the ones
+    with normal notes, which ties can continue.
+    """
+
+    fingerprint: str
+    tie_strings: FrozenSet[int]
+    held_strings: FrozenSet[int]
+
+
+def _digest(values: tuple) -> str:
+    return hashlib.blake2b(repr(values).encode(), digest_size=16).hexdigest()
+
+
+def summarize_measure(gp_measure: gm.models.Measure, shift: int = 0) -> MeasureSummary:
+    tie_strings = set()
+    held_strings = set()
+    voices = []
+    for gp_voice in gp_measure.voices:
+        beats = []
+        for gp_beat in gp_voice.beats:
+            notes = []
+            for gp_note in gp_beat.notes:
+                note_type = gp_note.type.value
+                if note_type == 1:
+                    held_strings.add(gp_note.string)
+                elif note_type == 2:
+                    tie_strings.add(gp_note.string)
+                notes.append(
+                    (note_type, gp_note.realValue, gp_note.velocity, gp_note.string)
+                )
+            beats.append((gp_beat.start, gp_beat.duration.time, tuple(notes)))
+        voices.append(tuple(beats))
+    return MeasureSummary(
+        _digest((shift, tuple(voices))), frozenset(tie_strings), frozenset(held_strings)
+    )
+
+
+def tie_segments(summaries: List[MeasureSummary]) -> List[Tuple[int, int]]:
+    """Splits measures into (start, stop) runs that no tie crosses.
+
+    A tie may continue the last normal note of its string however far back
+    it is, so a measure with a tie is kept with every measure up to the
+    previous one with a normal note on that string. Runs convert on their
+    own to the same notes as the whole track.
+    """
+    n_measures = len(summaries)
+    # Number of ties spanning the boundary before each measure
+    n_spanning = [0] * (n_measures + 1)
+    last_held: Dict[int, int] = {}
+    for idx_measure, summary in enumerate(summaries):
+        for string in summary.tie_strings:
+            idx_held = last_held.get(string)
+            if idx_held is not None:
+                n_spanning[idx_held + 1] += 1
+                n_spanning[idx_measure + 1] -= 1
+        for string in summary.held_strings:
+            last_held[string] = idx_measure
+
+    segments = []
+    segment_start = 0
+    n_open_ties = 0
+    for idx_measure in range(1, n_measures):
+        n_open_ties += n_spanning[idx_measure]
+        if n_open_ties == 0:
+            segments.append((segment_start, idx_measure))
+            segment_start = idx_measure
+    if n_measures:
+        segments.append((segment_start, n_measures))
+    return segments
+
+
+def load_state(state_path: Path) -> Optional[dict]:
+    """Returns the state saved at state_path, or None if there is none to use."""
+    try:
+        with open(state_path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state: dict, state_path: Path) -> None:
+    # Written aside and moved, so a run never leaves half a state behind
+    temporary_path = Path(str(state_path) + ".tmp")
+    with open(temporary_path, "w") as fp:
+        json.dump(state, fp)
+    os.replace(temporary_path, state_path)
+
+
+class IncrementalMidiConvertor(GuitarProToMidiConvertor):
+    """Converts a song like GuitarProToMidiConvertor, reusing a previous run.
+
+    previous_state is the state an earlier apply() left in self.state. Each
+    track is split into runs of measures that no tie crosses, and only the
+    runs with a measure whose fingerprint changed are converted again, the
+    notes of the others coming from the state. The output is the same as a
+    full conversion. Any change to the tracks or the measure headers
+    converts the whole song.
+    """
+
+    def __init__(
+        self,
+        gp_stream: gm.models.Song,
+        previous_state: Optional[dict] = None,
+        logger: Optional[logging.Logger] = None,
+        unroll_repeats: bool = False,
+    ) -> None:
+        super().__init__(gp_stream, logger, unroll_repeats=unroll_repeats)
+        self.structure = self._structure_fingerprint()
+        self.previous_state = None
+        if (
+            previous_state is not None
+            and previous_state.get("version") == STATE_VERSION
+            and previous_state.get("convertor_version") == CONVERTOR_VERSION
+            and previous_state.get("structure") == self.structure
+        ):
+            self.previous_state = previous_state
+        self.state: Optional[dict] = None
+        self.n_converted_measures = 0
+        self.n_reused_measures = 0
+
+    def _structure_fingerprint(self) -> str:
+        measure_headers = tuple(
+            (
+                header.start,
+                header.length,
+                header.timeSignature.numerator,
+                header.timeSignature.denominator.value,
+                header.timeSignature.denominator.isDotted,
+                header.isRepeatOpen,
+                header.repeatClose,
+                header.repeatAlternative,
+            )
+            for header in self.gp_stream.measureHeaders
+        )
+        tracks = tuple(
+            (
+                track.name,
+                track.channel.instrument,
+                track.isPercussionTrack,
+                len(track.measures),
+            )
+            for track in self.gp_stream.tracks
+        )
+        return _digest((self.unroll_repeats, measure_headers, tracks))
+
+    def apply(self) -> MidiFile:
+        self.state = {
+            "version": STATE_VERSION,
+            "convertor_version": CONVERTOR_VERSION,
+            "structure": self.structure,
+            "tracks": [None] * len(self.gp_stream.tracks),
+        }
+        return super().apply()
+
+    def _collect_track_notes(
+        self, idx_track: int, track: gm.models.Track
+    ) -> List[Tuple[int, int, int, int]]:
+        played_measures = list(self._played_measures(track))
+        summaries = [
+            summarize_measure(gp_measure, measure_info.shift)
+            for measure_info, gp_measure in played_measures
+        ]
+        segments = tie_segments(summaries)
+        fingerprints = [summary.fingerprint for summary in summaries]
+
+        previous_notes = {}
+        previous_fingerprints = []
+        if self.previous_state is not None:
+            previous_track = self.previous_state["tracks"][idx_track]
+            previous_fingerprints = previous_track["fingerprints"]
+            previous_notes = {
+                tuple(segment): notes
+                for segment, notes in zip(
+                    previous_track["segments"], previous_track["notes"]
+                )
+            }
+
+        notes = []
+        segment_notes = []
+        for start, stop in segments:
+            flat_notes = previous_notes.get((start, stop))
+            if (
+                flat_notes is None
+                or previous_fingerprints[start:stop] != fingerprints[start:stop]
+            ):
+                converted_notes = self._collect_notes(
+                    idx_track, played_measures[start:stop]
+                )
+                flat_notes = [value for note in converted_notes for value in note]
+                self.n_converted_measures += stop - start
+            else:
+                self.n_reused_measures += stop - start
+            notes.extend(zip(*[iter(flat_notes)] * 4))
+            segment_notes.append(flat_notes)
+
+        self.state["tracks"][idx_track] = {
+            "fingerprints": fingerprints,
+            "segments": [list(segment) for segment in segments],
+            "notes": segment_notes,
+        }
+        return notes
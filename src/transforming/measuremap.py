@@ -0,0 +1,241 @@
+from typing import Iterator, List, Optional, Tuple
+
+import guitarpro as gm
+
+from src.transforming.tempomap import TempoMap
+
+
+class MeasureInfo:
+    """What every track needs to know about a measure, in song ticks."""
+
+    __slots__ = (
+        "index",
+        "start",
+        "length",
+        "numerator",
+        "denominator",
+        "is_dotted_denominator",
+        "is_time_signature_change",
+        "is_repeat_open",
+        "repeat_close",
+        "repeat_alternative",
+        "tempo_changes",
+        "shift",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        start: int,
+        length: int,
+        numerator: int,
+        denominator: int,
+        is_dotted_denominator: bool,
+        is_time_signature_change: bool,
+        is_repeat_open: bool,
+        repeat_close: int,
+        repeat_alternative: int,
+        tempo_changes: List[Tuple[int, float]],
+        shift: int = 0,
+    ) -> None:
+        self.index = index
+        self.start = start
+        self.length = length
+        self.numerator = numerator
+        self.denominator = denominator
+        self.is_dotted_denominator = is_dotted_denominator
+        self.is_time_signature_change = is_time_signature_change
+        self.is_repeat_open = is_repeat_open
+        self.repeat_close = repeat_close
+        self.repeat_alternative = repeat_alternative
+        self.tempo_changes = tempo_changes
+        # Added to the song ticks of the measure when it is played elsewhere
+        self.shift = shift
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+    @property
+    def time_signature(self) -> Tuple[int, int, bool]:
+        return self.numerator, self.denominator, self.is_dotted_denominator
+
+
+class MeasureMap:
+    """Measure headers of a song, read once and shared by every track.
+
+    Time signatures fall back to 1 beat and quarter notes when the file
+    leaves them empty, and is_time_signature_change marks the measures
+    whose time signature differs from the previous one. unrolled() gives
+    the measures in the order they are played, repeats included.
+    """
+
+    def __init__(self, measures: List[MeasureInfo]) -> None:
+        self.measures = measures
+
+    @classmethod
+    def from_song(
+        cls, gp_stream: gm.models.Song, tempo_map: Optional[TempoMap] = None
+    ) -> "MeasureMap":
+        if tempo_map is None:
+            tempo_map = TempoMap.from_song(gp_stream)
+        measure_headers = gp_stream.measureHeaders
+        song_start = measure_headers[0].start if measure_headers else 0
+        measures = []
+        last_time_signature = None
+        for idx_measure, header in enumerate(measure_headers):
+            start = int(round(header.start - song_start))
+            length = int(round(header.length))
+            time_signature = (
+                header.timeSignature.numerator or 1,
+                header.timeSignature.denominator.value or 4,
+                bool(header.timeSignature.denominator.isDotted),
+            )
+            measures.append(
+                MeasureInfo(
+                    idx_measure,
+                    start,
+                    length,
+                    *time_signature,
+                    time_signature != last_time_signature,
+                    header.isRepeatOpen,
+                    header.repeatClose,
+                    header.repeatAlternative,
+                    tempo_map.changes_between(start, start + length),
+                )
+            )
+            last_time_signature = time_signature
+        return cls(measures)
+
+    def __len__(self) -> int:
+        return len(self.measures)
+
+    def __getitem__(self, idx_measure: int) -> MeasureInfo:
+        return self.measures[idx_measure]
+
+    def __iter__(self) -> Iterator[MeasureInfo]:
+        return iter(self.measures)
+
+    def time_signature_changes(self) -> List[Tuple[int, int, int]]:
+        """Returns (tick, numerator, denominator) where the time signature changes."""
+        changes = []
+        for measure in self.measures:
+            # MIDI has no dotted denominators, so only numerator and denominator count
+            if changes and changes[-1][1:] == (measure.numerator, measure.denominator):
+                continue
+            changes.append((measure.start, measure.numerator, measure.denominator))
+        return changes
+
+    @property
+    def has_repeats(self) -> bool:
+        return any(
+            measure.is_repeat_open
+            or measure.repeat_close > 0
+            or measure.repeat_alternative
+            for measure in self.measures
+        )
+
+    def playback_order(self) -> List[int]:
+        """Returns the indexes of the measures in the order they are played.
+
+        A closing repeat goes back to the last opening repeat, or to the
+        first measure, repeat_close more times. Alternate endings are
+        skipped on the passes missing from their bitmask, and a closing
+        repeat on an alternate ending always goes back, as in GuitarPro.
+        """
+        if not self.has_repeats:
+            return list(range(len(self.measures)))
+        order = []
+        idx_measure = 0
+        repeat_start = 0
+        is_repeat_open = True
+        n_pass = 0
+        alternative = 0
+        last_idx_measure = -1
+        while idx_measure < len(self.measures):
+            measure = self.measures[idx_measure]
+            if measure.is_repeat_open:
+                repeat_start = idx_measure
+                is_repeat_open = True
+                # A new repeat, not the way back to the current one
+                if idx_measure > last_idx_measure:
+                    n_pass = 0
+                    alternative = 0
+            else:
+                if not alternative:
+                    alternative = measure.repeat_alternative
+                if is_repeat_open and alternative and not alternative & (1 << n_pass):
+                    if measure.repeat_close > 0:
+                        alternative = 0
+                    idx_measure += 1
+                    continue
+            last_idx_measure = max(last_idx_measure, idx_measure)
+            order.append(idx_measure)
+            if is_repeat_open and measure.repeat_close > 0:
+                if n_pass < measure.repeat_close or alternative:
+                    n_pass += 1
+                    idx_measure = repeat_start
+                else:
+                    n_pass = 0
+                    is_repeat_open = False
+                    idx_measure += 1
+                alternative = 0
+                continue
+            idx_measure += 1
+        return order
+
+    def unrolled(self, tempo_map: TempoMap) -> Tuple["MeasureMap", TempoMap]:
+        """Returns the measures and tempos in playback order, ticks included.
+
+        Each measure keeps the index of the measure it plays, and its shift
+        moves the song ticks of that measure to where it is played. Repeat
+        marks are dropped, as they are already played out. Without repeats,
+        the maps are returned as they are.
+        """
+        order = self.playback_order()
+        if not order or order == list(range(len(self.measures))):
+            return self, tempo_map
+
+        ticks: List[int] = []
+        bpms: List[float] = []
+        start = 0
+        starts = []
+        for idx_measure in order:
+            measure = self.measures[idx_measure]
+            shift = start - measure.start
+            # The tempo may change when playback jumps back
+            changes = [(start, tempo_map.bpm_at(measure.start))] + [
+                (tick + shift, bpm) for tick, bpm in measure.tempo_changes
+            ]
+            for tick, bpm in changes:
+                if bpms and bpms[-1] == bpm:
+                    continue
+                if ticks and ticks[-1] == tick:
+                    bpms[-1] = bpm
+                    continue
+                ticks.append(tick)
+                bpms.append(bpm)
+            starts.append(start)
+            start += measure.length
+        unrolled_tempo_map = TempoMap(ticks, bpms, tempo_map.ticks_per_quarter)
+
+        measures = []
+        last_time_signature = None
+        for idx_measure, start in zip(order, starts):
+            measure = self.measures[idx_measure]
+            measures.append(
+                MeasureInfo(
+                    idx_measure,
+                    start,
+                    measure.length,
+                    *measure.time_signature,
+                    measure.time_signature != last_time_signature,
+                    False,
+                    -1,
+                    0,
+                    unrolled_tempo_map.changes_between(start, start + measure.length),
+                    start - measure.start,
+                )
+            )
+            last_time_signature = measure.time_signature
+        return MeasureMap(measures), unrolled_tempo_map
@@ -0,0 +1,219 @@
+from typing import Dict, Optional, Sequence
+
+import guitarpro as gm
+import numpy as np
+
+from src.transforming.measuremap import MeasureMap
+
+QUARTER_TIME_IN_TICKS = 960
+
+# Same values as gm.models.NoteType
+NOTE_TYPE_REST = 0
+NOTE_TYPE_NORMAL = 1
+NOTE_TYPE_TIE = 2
+NOTE_TYPE_DEAD = 3
+
+NOTE_EVENT_DTYPE = np.dtype(
+    [
+        ("track", np.uint16),
+        ("measure", np.uint32),
+        ("voice", np.uint8),
+        ("start", np.int64),
+        ("duration", np.int32),
+        ("pitch", np.int16),
+        ("string", np.int8),
+        ("fret", np.int16),
+        ("velocity", np.uint8),
+        ("note_type", np.uint8),
+        ("tuplet_enters", np.uint8),
+        ("tuplet_times", np.uint8),
+    ]
+)
+
+
+class NoteEventTable:
+    """Flat, columnar view of the notes and rests of a song.
+
+    Every note of a beat is one row of a NumPy structured array, and a beat
+    without notes is a single rest row with pitch -1 and string 0. Starts
+    are absolute ticks counted from the first measure, so rows of all
+    tracks can be sorted, filtered and transformed with array operations.
+    """
+
+    def __init__(self, events: np.ndarray) -> None:
+        if events.dtype != NOTE_EVENT_DTYPE:
+            raise ValueError("events must use NOTE_EVENT_DTYPE")
+        self.events = events
+
+    @classmethod
+    def from_song(cls, gp_stream: gm.models.Song) -> "NoteEventTable":
+        measure_headers = gp_stream.measureHeaders
+        song_start = measure_headers[0].start if measure_headers else 0
+        rows = []
+        for idx_track, track in enumerate(gp_stream.tracks):
+            for idx_measure, gp_measure in enumerate(track.measures):
+                for idx_voice, gp_voice in enumerate(gp_measure.voices):
+                    for gp_beat in gp_voice.beats:
+                        start = int(round(gp_beat.start - song_start))
+                        gp_duration = gp_beat.duration
+                        duration = int(round(gp_duration.time))
+                        tuplet = (gp_duration.tuplet.enters, gp_duration.tuplet.times)
+                        if not gp_beat.notes:
+                            rows.append(
+                                (idx_track, idx_measure, idx_voice, start, duration)
+                                + (-1, 0, 0, 0, NOTE_TYPE_REST)
+                                + tuplet
+                            )
+                            continue
+                        for gp_note in gp_beat.notes:
+                            rows.append(
+                                (idx_track, idx_measure, idx_voice, start, duration)
+                                + (
+                                    gp_note.realValue,
+                                    gp_note.string,
+                                    gp_note.value,
+                                    gp_note.velocity,
+                                    gp_note.type.value,
+                                )
+                                + tuplet
+                            )
+        return cls(np.array(rows, dtype=NOTE_EVENT_DTYPE))
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.events[column]
+
+    @property
+    def nbytes(self) -> int:
+        return self.events.nbytes
+
+    @property
+    def end(self) -> np.ndarray:
+        return self.events["start"] + self.events["duration"]
+
+    @property
+    def sounding(self) -> np.ndarray:
+        """Mask of the rows that produce a sound."""
+        return self.events["note_type"] != NOTE_TYPE_REST
+
+    def sorted(self) -> "NoteEventTable":
+        """Returns the rows sorted by start, then track, then pitch."""
+        order = np.lexsort(
+            (self.events["pitch"], self.events["track"], self.events["start"])
+        )
+        return NoteEventTable(self.events[order])
+
+    def unrolled(self, measure_map: MeasureMap) -> "NoteEventTable":
+        """Returns the rows in playback order, repeated measures copied.
+
+        measure_map is an unrolled MeasureMap of the song: the rows of each
+        measure it plays are copied, their start moved by the measure shift.
+        """
+        events = self.events[np.argsort(self.events["measure"], kind="stable")]
+        n_measures = max(
+            len(measure_map), int(events["measure"].max()) + 1 if len(events) else 0
+        )
+        counts = np.bincount(events["measure"], minlength=n_measures)
+        first_rows = np.cumsum(counts) - counts
+        played = np.array([measure.index for measure in measure_map], dtype=np.int64)
+        shifts = np.array([measure.shift for measure in measure_map], dtype=np.int64)
+        played_counts = counts[played]
+        # Row i of played measure k is events[first_rows[k] + i]
+        played_first_rows = np.cumsum(played_counts) - played_counts
+        rows = np.repeat(first_rows[played] - played_first_rows, played_counts)
+        rows += np.arange(len(rows))
+        unrolled_events = events[rows]
+        unrolled_events["start"] += np.repeat(shifts, played_counts)
+        return NoteEventTable(unrolled_events)
+
+    def select_tracks(self, tracks: Sequence[int]) -> "NoteEventTable":
+        return NoteEventTable(self.events[np.isin(self.events["track"], tracks)])
+
+    def transpose(
+        self, semitones: int, tracks: Optional[Sequence[int]] = None
+    ) -> "NoteEventTable":
+        """Shifts the pitch of sounding notes, clipped to the MIDI range."""
+        events = self.events.copy()
+        mask = self.sounding
+        if tracks is not None:
+            mask &= np.isin(events["track"], tracks)
+        events["pitch"][mask] = np.clip(events["pitch"][mask] + semitones, 0, 127)
+        return NoteEventTable(events)
+
+    def merge_ties(self) -> "NoteEventTable":
+        """Folds tie notes into the note they continue.
+
+        A tie extends the latest earlier normal note on the same track and
+        string up to its own end, and is dropped. Ties with no note to
+        continue are kept as notes.
+        """
+        events = self.events
+        candidates = np.flatnonzero(
+            np.isin(events["note_type"], (NOTE_TYPE_NORMAL, NOTE_TYPE_TIE))
+        )
+        if len(candidates) == 0:
+            return NoteEventTable(events.copy())
+        candidate_events = events[candidates]
+        order = np.lexsort(
+            (
+                candidate_events["note_type"] == NOTE_TYPE_TIE,
+                candidate_events["start"],
+                candidate_events["string"],
+                candidate_events["track"],
+            )
+        )
+        rows = candidates[order]
+        track, string = events["track"][rows], events["string"][rows]
+        is_normal = events["note_type"][rows] == NOTE_TYPE_NORMAL
+
+        positions = np.arange(len(rows))
+        group_change = np.ones(len(rows), dtype=bool)
+        group_change[1:] = (track[1:] != track[:-1]) | (string[1:] != string[:-1])
+        group_start = np.maximum.accumulate(np.where(group_change, positions, 0))
+        last_normal = np.maximum.accumulate(np.where(is_normal, positions, -1))
+        is_resolved_tie = ~is_normal & (last_normal >= group_start)
+
+        ends = events["start"] + events["duration"]
+        anchors = rows[last_normal[is_resolved_tie]]
+        new_ends = ends.copy()
+        np.maximum.at(new_ends, anchors, ends[rows[is_resolved_tie]])
+
+        merged_events = events.copy()
+        merged_events["duration"] = new_ends - events["start"]
+        keep = np.ones(len(events), dtype=bool)
+        keep[rows[is_resolved_tie]] = False
+        return NoteEventTable(merged_events[keep])
+
+    def quantization_offsets(
+        self, grid: int = QUARTER_TIME_IN_TICKS // 4
+    ) -> np.ndarray:
+        """Returns the distance in ticks of every start to the nearest grid line."""
+        remainder = self.events["start"] % grid
+        return np.minimum(remainder, grid - remainder)
+
+    def is_quantized(self, grid: int = QUARTER_TIME_IN_TICKS // 4) -> np.ndarray:
+        """Mask of the rows whose start and end both fall on the grid."""
+        return (self.events["start"] % grid == 0) & (self.end % grid == 0)
+
+    def track_statistics(self) -> Dict[int, dict]:
+        """Returns counts, pitch range and sounding length of every track."""
+        statistics = {}
+        events = self.events
+        for idx_track in np.unique(events["track"]):
+            track_events = events[events["track"] == idx_track]
+            note_types = np.bincount(track_events["note_type"], minlength=4)
+            notes = track_events[track_events["note_type"] != NOTE_TYPE_REST]
+            statistics[int(idx_track)] = {
+                "n_events": len(track_events),
+                "n_notes": int(note_types[NOTE_TYPE_NORMAL]),
+                "n_ties": int(note_types[NOTE_TYPE_TIE]),
+                "n_dead_notes": int(note_types[NOTE_TYPE_DEAD]),
+                "n_rests": int(note_types[NOTE_TYPE_REST]),
+                "min_pitch": int(notes["pitch"].min()) if len(notes) else None,
+                "max_pitch": int(notes["pitch"].max()) if len(notes) else None,
+                "mean_pitch": float(notes["pitch"].mean()) if len(notes) else None,
+                "sounding_ticks": int(notes["duration"].sum()),
+            }
+        return statistics
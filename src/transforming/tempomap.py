@@ -0,0 +1,101 @@
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Tuple
+
+import guitarpro as gm
+
+QUARTER_TIME_IN_TICKS = 960
+
+
+class TempoMap:
+    """Tempo changes of a song, built once and queried by tick.
+
+    Ticks are counted from the start of the first measure, at
+    QUARTER_TIME_IN_TICKS per quarter note. Lookups use binary search over
+    the sorted changes, and the time elapsed at each change is precomputed
+    so that tick to seconds conversions are O(log n).
+    """
+
+    def __init__(
+        self,
+        ticks: List[int],
+        bpms: List[float],
+        ticks_per_quarter: int = QUARTER_TIME_IN_TICKS,
+    ) -> None:
+        if not ticks or ticks[0] != 0:
+            raise ValueError("A tempo map needs a tempo at tick 0")
+        if len(ticks) != len(bpms):
+            raise ValueError("ticks and bpms must have the same length")
+        self.ticks = ticks
+        self.bpms = bpms
+        self.ticks_per_quarter = ticks_per_quarter
+        self._seconds = [0.0]
+        for idx in range(1, len(ticks)):
+            self._seconds.append(
+                self._seconds[-1]
+                + self._ticks_to_seconds(ticks[idx] - ticks[idx - 1], bpms[idx - 1])
+            )
+
+    @classmethod
+    def from_song(cls, gp_stream: gm.models.Song) -> "TempoMap":
+        """Collects the song tempo and the tempo changes of every beat.
+
+        When tracks disagree on the tempo of a tick, the first track wins.
+        Changes that keep the current tempo are dropped.
+        """
+        measure_headers = gp_stream.measureHeaders
+        song_start = measure_headers[0].start if measure_headers else 0
+        changes = {}
+        for track in gp_stream.tracks:
+            for gp_measure in track.measures:
+                for gp_voice in gp_measure.voices:
+                    for gp_beat in gp_voice.beats:
+                        mix_table_change = gp_beat.effect.mixTableChange
+                        if (
+                            mix_table_change is None
+                            or mix_table_change.tempo is None
+                            or not mix_table_change.tempo.value
+                        ):
+                            continue
+                        tick = int(round(gp_beat.start - song_start))
+                        changes.setdefault(tick, mix_table_change.tempo.value)
+        changes.setdefault(0, gp_stream.tempo)
+
+        ticks, bpms = [], []
+        for tick in sorted(changes):
+            if bpms and bpms[-1] == changes[tick]:
+                continue
+            ticks.append(tick)
+            bpms.append(changes[tick])
+        return cls(ticks, bpms)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        return iter(zip(self.ticks, self.bpms))
+
+    def _ticks_to_seconds(self, ticks: float, bpm: float) -> float:
+        return ticks * 60 / (bpm * self.ticks_per_quarter)
+
+    def bpm_at(self, tick: int) -> float:
+        """Returns the tempo in effect at tick."""
+        return self.bpms[max(bisect_right(self.ticks, tick) - 1, 0)]
+
+    def changes_between(
+        self, start: int, end: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """Returns the (tick, bpm) changes with start <= tick < end."""
+        first = bisect_right(self.ticks, start - 1)
+        last = len(self.ticks) if end is None else bisect_right(self.ticks, end - 1)
+        return list(zip(self.ticks[first:last], self.bpms[first:last]))
+
+    def tick_to_seconds(self, tick: float) -> float:
+        idx = max(bisect_right(self.ticks, tick) - 1, 0)
+        return self._seconds[idx] + self._ticks_to_seconds(
+            tick - self.ticks[idx], self.bpms[idx]
+        )
+
+    def seconds_to_tick(self, seconds: float) -> float:
+        idx = max(bisect_right(self._seconds, seconds) - 1, 0)
+        elapsed = seconds - self._seconds[idx]
+        return self.ticks[idx] + elapsed * self.bpms[idx] * self.ticks_per_quarter / 60
@@ -0,0 +1,107 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_MAX_LOG_MESSAGES = 20
+
+
+class HeldNote:
+    """The last note played on a string, with its span in ticks."""
+
+    __slots__ = ("start", "end", "note")
+
+    def __init__(self, start: int, end: int, note: Any) -> None:
+        self.start = start
+        self.end = end
+        self.note = note
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+
+class TieResolver:
+    """Continues GuitarPro tie notes from the last note of their string.
+
+    State is kept per (track, string) in absolute ticks, so a tie resolves
+    in O(1) whether the note it continues is in the same measure or not.
+    Unresolved ties are reported through an optional logger, limited to
+    max_log_messages messages per resolver.
+    """
+
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        max_log_messages: int = DEFAULT_MAX_LOG_MESSAGES,
+    ) -> None:
+        self.logger = logger
+        self.max_log_messages = max_log_messages
+        self.n_resolved = 0
+        self.n_unresolved = 0
+        self._n_log_messages = 0
+        self._held_notes: Dict[Tuple[int, int], HeldNote] = {}
+
+    def hold(
+        self, idx_track: int, string: int, start: int, end: int, note: Any
+    ) -> Optional[HeldNote]:
+        """Registers note as the last note played on the string.
+
+        Returns the note it replaces, which can no longer be extended.
+        """
+        key = (idx_track, string)
+        replaced_note = self._held_notes.get(key)
+        self._held_notes[key] = HeldNote(start, end, note)
+        return replaced_note
+
+    def resolve(
+        self, idx_track: int, string: int, start: int, end: int
+    ) -> Optional[HeldNote]:
+        """Extends the note held on the string up to end and returns it.
+
+        Returns None when nothing was played on the string before.
+        """
+        held_note = self._held_notes.get((idx_track, string))
+        if held_note is None:
+            self.n_unresolved += 1
+            self._log(
+                "Tie note at tick %s on track %s, string %s has no note to continue",
+                start,
+                idx_track,
+                string,
+            )
+            return None
+        held_note.end = max(held_note.end, end)
+        self.n_resolved += 1
+        return held_note
+
+    def held_notes(self, idx_track: int) -> List[HeldNote]:
+        return [
+            held_note
+            for (held_track, _), held_note in self._held_notes.items()
+            if held_track == idx_track
+        ]
+
+    def release_ended_before(self, idx_track: int, tick: int) -> List[HeldNote]:
+        """Drops and returns the notes of a track that end before tick.
+
+        Bounds how far back a tie can reach, and the notes kept held.
+        """
+        keys = [
+            key
+            for key, held_note in self._held_notes.items()
+            if key[0] == idx_track and held_note.end < tick
+        ]
+        return [self._held_notes.pop(key) for key in keys]
+
+    def release_track(self, idx_track: int) -> List[HeldNote]:
+        """Drops and returns the state of a track once it has been converted."""
+        keys = [key for key in self._held_notes if key[0] == idx_track]
+        return [self._held_notes.pop(key) for key in keys]
+
+    def _log(self, message: str, *args: Any) -> None:
+        if self.logger is None or self._n_log_messages > self.max_log_messages:
+            return
+        self._n_log_messages += 1
+        if self._n_log_messages > self.max_log_messages:
+            self.logger.warning("Too many tie messages, ignoring the rest")
+        else:
+            self.logger.warning(message, *args)
@@ -0,0 +1,386 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import guitarpro as gm
+import numpy as np
+
+from src.transforming.convertor import Convertor
+
+QUARTER_TIME_IN_TICKS = 960
+TOKEN_DTYPE = np.uint16
+# Version of the Songs decoded, which PyGuitarPro can write back
+DECODED_VERSION = (5, 1, 0)
+PERCUSSION_CHANNEL = 9
+
+# Tokens standing for themselves, "pad" being 0
+SPECIAL_TOKENS = (
+    "pad",
+    "bos",
+    "eos",
+    "track",
+    "percussion",
+    "bar",
+    "repeat_open",
+    "rest",
+    "tie",
+    "dead",
+)
+MIN_TEMPO, MAX_TEMPO = 20, 400
+# Numerator 0 shows up in empty closing measures of converted files
+MAX_NUMERATOR = 32
+MAX_REPEAT_CLOSE = 32
+MAX_TRACKS = 64
+MAX_VOICES = gm.models.Measure.maxVoices
+MAX_STRINGS = 12
+DURATION_VALUES = (1, 2, 4, 8, 16, 32, 64)
+TUPLETS = (
+    (1, 1),
+    (3, 2),
+    (5, 4),
+    (6, 4),
+    (7, 4),
+    (9, 8),
+    (10, 8),
+    (11, 8),
+    (12, 8),
+    (13, 8),
+)
+# (value, is dotted, tuplet enters, tuplet times) of each duration token
+DURATIONS = tuple(
+    (value, is_dotted, enters, times)
+    for value in DURATION_VALUES
+    for is_dotted in (False, True)
+    for enters, times in TUPLETS
+)
+DURATION_INDEXES = {duration: index for index, duration in enumerate(DURATIONS)}
+DENOMINATOR_INDEXES = {value: index for index, value in enumerate(DURATION_VALUES)}
+# (kind, first value, number of values) of the tokens carrying a value
+TOKEN_RANGES = (
+    ("instrument", 0, 128),
+    ("tuning", 0, 128),
+    ("tempo", MIN_TEMPO, MAX_TEMPO - MIN_TEMPO + 1),
+    ("numerator", 0, MAX_NUMERATOR + 1),
+    ("denominator", 0, len(DURATION_VALUES)),
+    ("repeat_close", 1, MAX_REPEAT_CLOSE),
+    ("alternative", 1, 255),
+    ("track_index", 0, MAX_TRACKS),
+    ("voice", 0, MAX_VOICES),
+    ("duration", 0, len(DURATIONS)),
+    ("pitch", 0, 128),
+    ("string", 1, MAX_STRINGS),
+)
+
+
+def _build_vocabulary() -> Tuple[Dict[str, int], Dict[str, tuple], list]:
+    """Numbers the special tokens, then the tokens of each range."""
+    special_ids = {}
+    ranges = {}
+    entries = []
+    for kind in SPECIAL_TOKENS:
+        special_ids[kind] = len(entries)
+        entries.append((kind, None))
+    for kind, first, count in TOKEN_RANGES:
+        ranges[kind] = (len(entries), first, count)
+        entries.extend((kind, first + index) for index in range(count))
+    return special_ids, ranges, entries
+
+
+# Ids of the special tokens, (first id, first value, count) of the ranges
+# and (kind, value) of every id
+SPECIAL_IDS, _RANGES, VOCABULARY = _build_vocabulary()
+VOCABULARY_SIZE = len(VOCABULARY)
+
+
+def token(kind: str, value: Optional[int] = None) -> int:
+    """Returns the id of a special token, or of a token of kind with value."""
+    if value is None:
+        return SPECIAL_IDS[kind]
+    offset, first, count = _RANGES[kind]
+    if not first <= value < first + count:
+        raise ValueError(f"Cannot encode {kind} {value}")
+    return offset + value - first
+
+
+def token_name(token_id: int) -> str:
+    kind, value = VOCABULARY[token_id]
+    return kind if value is None else f"{kind}_{value}"
+
+
+class GuitarProToTokensConvertor(Convertor):
+    """Encodes a PyGuitarPro stream as a sequence of token ids.
+
+    The sequence starts with the song tempo and a header per track with
+    its instrument and the tuning of its strings. Then comes each measure:
+    a bar, the time signature when it changes and the repeat marks, then
+    for each track with beats, its index and the beats of each voice. A
+    beat is an optional tempo change, a duration, then a rest or its
+    notes; a note is an optional tie or dead flag, its pitch and its
+    string, the fret being the pitch less the tuning of the string.
+
+    Names, velocities and effects are not encoded. Values outside of the
+    vocabulary raise ValueError.
+    """
+
+    def apply(self) -> np.ndarray:
+        gp_stream = self.gp_stream
+        tokens = [SPECIAL_IDS["bos"], token("tempo", gp_stream.tempo)]
+        if len(gp_stream.tracks) > MAX_TRACKS:
+            raise ValueError(f"Cannot encode more than {MAX_TRACKS} tracks")
+        for track in gp_stream.tracks:
+            tokens.append(SPECIAL_IDS["track"])
+            tokens.append(token("instrument", track.channel.instrument))
+            if track.isPercussionTrack:
+                tokens.append(SPECIAL_IDS["percussion"])
+            if len(track.strings) > MAX_STRINGS:
+                raise ValueError(f"Cannot encode more than {MAX_STRINGS} strings")
+            tokens.extend(token("tuning", string.value) for string in track.strings)
+
+        time_signature = None
+        for idx_measure, header in enumerate(gp_stream.measureHeaders):
+            tokens.append(SPECIAL_IDS["bar"])
+            numerator = header.timeSignature.numerator
+            denominator = header.timeSignature.denominator.value
+            if (numerator, denominator) != time_signature:
+                time_signature = (numerator, denominator)
+                tokens.append(token("numerator", numerator))
+                if denominator not in DENOMINATOR_INDEXES:
+                    raise ValueError(f"Cannot encode denominator {denominator}")
+                tokens.append(token("denominator", DENOMINATOR_INDEXES[denominator]))
+            if header.isRepeatOpen:
+                tokens.append(SPECIAL_IDS["repeat_open"])
+            if header.repeatAlternative:
+                tokens.append(token("alternative", header.repeatAlternative))
+            if header.repeatClose > 0:
+                tokens.append(token("repeat_close", header.repeatClose))
+            for idx_track, track in enumerate(gp_stream.tracks):
+                if idx_measure < len(track.measures):
+                    self._encode_measure(tokens, idx_track, track.measures[idx_measure])
+        tokens.append(SPECIAL_IDS["eos"])
+        return np.array(tokens, dtype=TOKEN_DTYPE)
+
+    @staticmethod
+    def _encode_measure(
+        tokens: List[int], idx_track: int, gp_measure: gm.models.Measure
+    ) -> None:
+        append = tokens.append
+        voice_offset = _RANGES["voice"][0]
+        duration_offset = _RANGES["duration"][0]
+        pitch_offset = _RANGES["pitch"][0]
+        string_offset = _RANGES["string"][0] - 1
+        rest, tie, dead = (SPECIAL_IDS[kind] for kind in ("rest", "tie", "dead"))
+        has_beats = False
+        for idx_voice, gp_voice in enumerate(gp_measure.voices[:MAX_VOICES]):
+            if not gp_voice.beats:
+                continue
+            if not has_beats:
+                append(token("track_index", idx_track))
+                has_beats = True
+            append(voice_offset + idx_voice)
+            for gp_beat in gp_voice.beats:
+                mix_table_change = gp_beat.effect.mixTableChange
+                if (
+                    mix_table_change is not None
+                    and mix_table_change.tempo is not None
+                    and mix_table_change.tempo.value
+                ):
+                    append(token("tempo", mix_table_change.tempo.value))
+                duration = gp_beat.duration
+                key = (
+                    duration.value,
+                    duration.isDotted,
+                    duration.tuplet.enters,
+                    duration.tuplet.times,
+                )
+                if key not in DURATION_INDEXES:
+                    raise ValueError(f"Cannot encode duration {duration}")
+                append(duration_offset + DURATION_INDEXES[key])
+                if not gp_beat.notes:
+                    append(rest)
+                    continue
+                for gp_note in gp_beat.notes:
+                    note_type = gp_note.type.value
+                    if note_type == 2:
+                        append(tie)
+                    elif note_type == 3:
+                        append(dead)
+                    pitch = gp_note.realValue
+                    if not 0 <= pitch < 128 or not 1 <= gp_note.string <= MAX_STRINGS:
+                        raise ValueError(f"Cannot encode note {gp_note}")
+                    append(pitch_offset + pitch)
+                    append(string_offset + gp_note.string)
+
+
+class _TokenReader:
+    """Reads tokens in order, checking they follow the encoder's grammar."""
+
+    def __init__(self, tokens: Sequence[int]) -> None:
+        self.entries = [VOCABULARY[token_id] for token_id in tokens]
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        if self.position < len(self.entries):
+            return self.entries[self.position][0]
+        return None
+
+    def accept(self, kind: str) -> bool:
+        if self.peek() != kind:
+            return False
+        self.position += 1
+        return True
+
+    def read(self, kind: str) -> Optional[int]:
+        if self.peek() != kind:
+            raise ValueError(
+                f"Expected {kind} at token {self.position}, got {self.peek()}"
+            )
+        value = self.entries[self.position][1]
+        self.position += 1
+        return value
+
+
+def decode_tokens(tokens: Sequence[int]) -> gm.models.Song:
+    """Builds the Song a GuitarProToTokensConvertor sequence encodes.
+
+    Tracks are named after their number and notes get the default
+    velocity. Malformed sequences raise ValueError.
+    """
+    reader = _TokenReader(tokens)
+    reader.read("bos")
+    gp_stream = gm.models.Song(versionTuple=DECODED_VERSION, tempo=reader.read("tempo"))
+    gp_stream.tracks = []
+    gp_stream.measureHeaders = []
+    next_channel = 0
+    while reader.accept("track"):
+        instrument = reader.read("instrument")
+        is_percussion = reader.accept("percussion")
+        tunings = []
+        while reader.peek() == "tuning":
+            tunings.append(reader.read("tuning"))
+        if is_percussion:
+            channel = PERCUSSION_CHANNEL
+        else:
+            channel = next_channel
+            next_channel += 2 if next_channel + 1 == PERCUSSION_CHANNEL else 1
+        number = len(gp_stream.tracks) + 1
+        track = gm.models.Track(
+            gp_stream,
+            number=number,
+            name=f"Track {number}",
+            isPercussionTrack=is_percussion,
+            strings=[
+                gm.models.GuitarString(idx_string + 1, tuning)
+                for idx_string, tuning in enumerate(tunings)
+            ],
+            channel=gm.models.MidiChannel(
+                channel=channel, effectChannel=channel, instrument=instrument
+            ),
+        )
+        track.measures = []
+        gp_stream.tracks.append(track)
+
+    start = QUARTER_TIME_IN_TICKS
+    numerator, denominator = 4, 4
+    while reader.accept("bar"):
+        if reader.peek() == "numerator":
+            numerator = reader.read("numerator")
+            denominator = DURATION_VALUES[reader.read("denominator")]
+        header = gm.models.MeasureHeader(
+            number=len(gp_stream.measureHeaders) + 1,
+            start=start,
+            timeSignature=gm.models.TimeSignature(
+                numerator, gm.models.Duration(denominator)
+            ),
+            isRepeatOpen=reader.accept("repeat_open"),
+        )
+        if reader.peek() == "alternative":
+            header.repeatAlternative = reader.read("alternative")
+        if reader.peek() == "repeat_close":
+            header.repeatClose = reader.read("repeat_close")
+        gp_stream.measureHeaders.append(header)
+        measures = []
+        for track in gp_stream.tracks:
+            gp_measure = gm.models.Measure(track, header)
+            track.measures.append(gp_measure)
+            measures.append(gp_measure)
+        while reader.peek() == "track_index":
+            idx_track = reader.read("track_index")
+            if idx_track >= len(measures):
+                raise ValueError(f"Track {idx_track} was not declared")
+            while reader.peek() == "voice":
+                gp_voice = measures[idx_track].voices[reader.read("voice")]
+                _decode_beats(reader, gp_voice, start)
+        start += header.length
+    reader.read("eos")
+    if reader.peek() is not None:
+        raise ValueError(f"Tokens after the end of the song at {reader.position}")
+    return gp_stream
+
+
+def _decode_beats(reader: _TokenReader, gp_voice: gm.models.Voice, start: int) -> None:
+    strings = gp_voice.measure.track.strings
+    while reader.peek() in ("tempo", "duration"):
+        tempo = reader.read("tempo") if reader.peek() == "tempo" else None
+        value, is_dotted, enters, times = DURATIONS[reader.read("duration")]
+        gp_beat = gm.models.Beat(
+            gp_voice,
+            duration=gm.models.Duration(
+                value, is_dotted, gm.models.Tuplet(enters, times)
+            ),
+            start=start,
+            status=gm.models.BeatStatus.normal,
+        )
+        if tempo is not None:
+            gp_beat.effect.mixTableChange = gm.models.MixTableChange(
+                tempo=gm.models.MixTableItem(tempo)
+            )
+        if reader.accept("rest"):
+            gp_beat.status = gm.models.BeatStatus.rest
+        while reader.peek() in ("tie", "dead", "pitch"):
+            note_type = gm.models.NoteType.normal
+            if reader.accept("tie"):
+                note_type = gm.models.NoteType.tie
+            elif reader.accept("dead"):
+                note_type = gm.models.NoteType.dead
+            pitch = reader.read("pitch")
+            string = reader.read("string")
+            if string > len(strings) or pitch < strings[string - 1].value:
+                raise ValueError(f"Pitch {pitch} cannot be played on string {string}")
+            gp_beat.notes.append(
+                gm.models.Note(
+                    gp_beat,
+                    value=pitch - strings[string - 1].value,
+                    string=string,
+                    type=note_type,
+                )
+            )
+        if gp_beat.status == gm.models.BeatStatus.normal and not gp_beat.notes:
+            raise ValueError(f"Beat without notes nor rest at token {reader.position}")
+        gp_voice.beats.append(gp_beat)
+        start += gp_beat.duration.time
+
+
+def encode_songs(songs: Sequence[gm.models.Song]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encodes songs into one flat array of tokens.
+
+    Returns the tokens and the offsets where each song starts, with a last
+    offset at the end, so that song i is tokens[offsets[i]:offsets[i + 1]].
+    """
+    return concatenate_tokens(
+        [GuitarProToTokensConvertor(gp_stream).apply() for gp_stream in songs]
+    )
+
+
+def concatenate_tokens(
+    sequences: Sequence[np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+    if not sequences:
+        return np.zeros(0, dtype=TOKEN_DTYPE), offsets
+    return np.concatenate(sequences).astype(TOKEN_DTYPE, copy=False), offsets
+
+
+def decode_songs(tokens: np.ndarray, offsets: np.ndarray) -> List[gm.models.Song]:
+    return [
+        decode_tokens(tokens[start:stop].tolist())
+        for start, stop in zip(offsets[:-1], offsets[1:])
+    ]